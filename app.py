@@ -1,11 +1,31 @@
+import asyncio
+import secrets
 from fasthtml.common import *
-from backend import (search_serials,
-                    bronze_paths_for_serial,
-                    zip_csv_from_parquets,
-                    filter_bronze_by_testtype,
-                    search_teststand)
+from backend import (search_serials_async,
+                    bronze_groups_async,
+                    bronze_page_async,
+                    stream_zip_async,
+                    open_merged_async,
+                    preview_bronze_async,
+                    query_async,
+                    bronze_file_stats_async,
+                    search_teststand_async,
+                    cache_stats,
+                    SEARCH_FLIGHTS,
+                    INVALIDATIONS)
+from export import EXPORT_FORMATS, MERGED_FORMATS, LabelConflict
 from fastapi import Response
-app, rt = fast_app()
+from fastapi.responses import JSONResponse, StreamingResponse
+from db_pool import pool_stats
+from executors import ExecutorBusy, executor_stats
+from singleflight import LatestOnly, Superseded
+from preview import PREVIEW_ROWS, PreviewError
+from query import QUERY_ROWS, QueryLimitExceeded, QuerySpec, split_list
+from urllib.parse import urlencode
+from selection import SELECTIONS, SERIAL_IDS, FILE_IDS, Selection, StaleId
+# The listener starts with the server, not on import: anything that imports app.py
+# (tests, tools, a worker re-importing the main module) gets no background thread
+app, rt = fast_app(on_startup=[INVALIDATIONS.start], on_shutdown=[INVALIDATIONS.stop])
 
 # ---------- Utilities ----------
 
@@ -25,6 +45,25 @@ def parse_selected(csv: str) -> list[str]:
 def csv_selected(lst: list[str]) -> str:
     return ",".join(lst)
 
+async def matches_or_empty(search, query: str, **kwargs) -> list[str]:
+    # Lookups that only refresh a list: a failure shows as no matches
+    if not query:
+        return []
+    try:
+        return await search(prefix=query, **kwargs)
+    except Exception:
+        return []
+
+# One autocomplete lookup per page and box; a newer keystroke cancels the older lookup.
+# Keyed by page, not session: tabs share the session cookie but not their result lists.
+SEARCH_LATEST = LatestOnly("search")
+
+def current_selection(session) -> Selection:
+    # Selected serials/stands/files live server-side; the session cookie only carries the token
+    sel = SELECTIONS.get_or_create(session.get("sel"))
+    session["sel"] = sel.token
+    return sel
+
 # ---------- Left list renderer (multi-select) ----------
 def render_stand_list(all_matches: list[str], selected_order: list[str], oob: bool = False):
     sel_set = set(selected_order)
@@ -45,8 +84,8 @@ def render_stand_list(all_matches: list[str], selected_order: list[str], oob: bo
                 Button(
                     s,
                     style=btn_style(s),
-                    hx_get=f"/api/toggle_stand?stand={s}",
-                    hx_include="#test-stand, #stand-selected, #serial, #selected, #pselected, #module-current, #test-type",
+                    hx_get=f"/api/toggle_stand?{urlencode({'stand': s})}",
+                    hx_include="#test-stand, #serial, #module-current, #test-type",
                     hx_target="#stand-results",
                     hx_swap="innerHTML",
                 )
@@ -88,9 +127,9 @@ def render_serial_list(all_matches: list[str], selected_order: list[str], oob: b
                 Button(
                     s,
                     style=btn_style(s),
-                    # Toggle selection; include current filter and selected-state
-                    hx_get=f"/api/toggle?serial={s}",
-                    hx_include="#serial, #selected, #pselected, #module-current, #test-type, #stand-selected",
+                    # Toggle selection by serial ID; include current filter
+                    hx_get=f"/api/toggle?s={SERIAL_IDS.id(s)}",
+                    hx_include="#serial, #module-current, #test-type",
                     hx_target="#bronze-col",
                     hx_swap="outerHTML",
                 )
@@ -111,17 +150,102 @@ TEST_TYPES = {
     "DVT": [],  
 }
 
+# Paths per "page" inside an expanded serial group
+BRONZE_PAGE_SIZE = 100
+
+# Shared by every bronze group/item, so fragments carry class names instead of style strings
+BRONZE_CSS = """
+.bronze-panel{display:block; width:100%; max-width:560px;}
+.bronze-head{display:flex; justify-content:space-between; align-items:center; margin-bottom:10px; gap:12px; flex-wrap:wrap;}
+.bronze-title{font-weight:600;}
+.bronze-controls{display:flex; justify-content:flex-start; align-items:center; margin-bottom:10px; gap:8px; flex-wrap:wrap;}
+.bronze-dl{padding:8px 10px; border-radius:10px; border:1px solid rgba(255,255,255,.35); background:transparent; color:#fff; cursor:pointer;}
+.bronze-dl:disabled{opacity:.6; cursor:not-allowed;}
+.bronze-dl option{color:#111;}
+.bronze-box{background:rgba(255,255,255,.08); border:1px solid rgba(255,255,255,.22); padding:10px; border-radius:12px; color:#fff;}
+.bronze-group{text-align:left;}
+.bronze-group > summary{font-weight:600; margin:4px 0 6px 0; cursor:pointer;}
+.bronze-list{list-style:none; padding:0; margin:0; display:flex; flex-direction:column; gap:6px;}
+.bronze-list > li{display:flex; align-items:center; gap:6px; flex-wrap:wrap;}
+.bronze-preview{font-size:12px; color:inherit; opacity:.75; white-space:nowrap;}
+.bronze-stats{flex-basis:100%; font-size:11px; opacity:.7; margin-top:-4px;}
+.bronze-item{width:100%; text-align:left; background:transparent; color:inherit; padding:0; border:none; cursor:pointer;}
+.bronze-item.sel{background:#fde047; color:#111; padding:4px 6px; border-radius:6px;}
+.bronze-more{background:transparent; color:inherit; border:1px dashed rgba(255,255,255,.35); border-radius:6px; padding:4px 8px; cursor:pointer;}
+.bronze-muted{opacity:.85;}
+"""
+
+def normalize_module_types(module: str, test_type: str) -> tuple[str, list[str]]:
+    module = (module or "MAT").upper()
+    if module not in TEST_TYPES:
+        module = "MAT"
+    return module, [t for t in parse_selected(test_type) if t in TEST_TYPES.get(module, [])]
+
+def render_bronze_item(p: str, selected_files: dict[str, None]):
+    return Button(
+        Code(str(p).removeprefix("parquets\\")),
+        cls="bronze-item sel" if str(p) in selected_files else "bronze-item",
+        hx_get=f"/api/toggle_parquet?f={FILE_IDS.id(str(p))}",
+        hx_target="this",
+        hx_swap="outerHTML",
+    )
+
+def _format_bytes(n: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+def render_bronze_stats(stats: tuple | None):
+    # (row_count, byte_size, column_count, first_ts, last_ts) from the catalog, recorded at ingest
+    if not stats:
+        return ""
+    rows, size, columns, first_ts, last_ts = stats
+    parts = []
+    if rows is not None:
+        parts.append(f"{rows:,} rows")
+    if columns:
+        parts.append(f"{columns} columns")
+    if size is not None:
+        parts.append(_format_bytes(size))
+    if first_ts:
+        parts.append(f"{str(first_ts)[:19]} → {str(last_ts)[:19]}")
+    return Span(" · ".join(parts), cls="bronze-stats") if parts else ""
+
+# Download formats offered in the panel: keys of export.EXPORT_FORMATS (zip, one entry
+# per file) or "merged." + a key of export.MERGED_FORMATS (one combined file)
+EXPORT_CHOICES = [
+    ("csv", "CSV"),
+    ("csv.gz", "CSV (gzip)"),
+    ("csv.zst", "CSV (zstd)"),
+    ("parquet", "Parquet (original files)"),
+    ("arrow", "Arrow IPC / Feather"),
+    ("merged.parquet", "Merged into one Parquet"),
+    ("merged.csv", "Merged into one CSV"),
+]
+
+def render_download_selected(sel: Selection, oob: bool = False):
+    btn = Button(
+        "Download selected",
+        type="submit",
+        name="scope",
+        value="files",
+        disabled=not sel.files,
+        cls="bronze-dl",
+        id="download-selected",
+    )
+    if oob:
+        btn.attrs["hx-swap-oob"] = "true"
+    return btn
+
 def render_bronze_panel(
-    selected_order: list[str],
-    psel: list[str],
+    sel: Selection | None,
     module: str = "MAT",
     test_types: list[str] | None = None,
 ):
-    if not selected_order:
+    if sel is None or not sel.serials:
         # Hide panel (same styling as before)
         return Div(
-            # Keep parquet selection state around as hidden input
-            Input(type="hidden", id="pselected", name="pselected", value=""),
             Div("Select a serial to view Bronze file paths.", style="opacity:.8;"),
             id="bronze-col",
             style="display:none; width:100%; max-width:560px;",
@@ -137,135 +261,50 @@ def render_bronze_panel(
     if test_types is not None:
         test_types = [t for t in (test_types or []) if t in allowed_types]
 
-    # None / [] => no filtering
-    active_types = test_types if test_types else None
-
-    sel_paths = set(psel or [])
     # Sorted by serial number for display (requirement)
-    for_display = sorted(selected_order, key=lambda s: s)
-
-    # Fetch per-serial paths
-    groups = []
-    all_paths: list[str] = []
-    for s in for_display:
-        try:
-            paths = bronze_paths_for_serial(s, limit=500)
-            #apply parquet metadata filter if test types are active
-            if active_types:
-                paths = filter_bronze_by_testtype(paths, active_types)
-        except Exception as e:
-            paths = [f"(DB error: {e})"]
-
-        # Collect non-error paths for the "Download all" button
-        for p in paths:
-            if not str(p).startswith("(DB error"):
-                all_paths.append(str(p))
-
-        items = []
-        for p in paths:
-            p_str = str(p)
-            p_str = p_str.removeprefix("parquets\\")
-            if p_str.startswith("(DB error"):
-                items.append(Li(Code(p_str)))
-                continue
-
-            base_style = (
-                "width:100%; text-align:left; background:transparent; color:inherit;"
-                "padding:0; border:none; cursor:pointer;"
-            )
-            if p_str in sel_paths:
-                base_style += " background:#fde047; color:#111; padding:4px 6px; border-radius:6px;"
-
-            items.append(
-                Li(
-                    Button(
-                        Code(p_str),
-                        style=base_style,
-                        hx_get=f"/api/toggle_parquet?path={p_str}",
-                        hx_include="#serial, #selected, #pselected, #module-current, #test-type",
-                        hx_target="#bronze-col",
-                        hx_swap="outerHTML",
-                    )
-                )
-            )
-
-        groups.append(
-            Div(
-                Div(s, style="font-weight:600; margin:4px 0 6px 0;"),
-                (Div("No bronze paths found.", style="opacity:.85;")
-                 if not paths else
-                 Ul(
-                     *items,
-                     style=(
-                         "list-style:none; padding:0; margin:0; display:flex; "
-                         "flex-direction:column; gap:6px;"
-                     ),
-                 )),
-                style="text-align:left;"
-            )
+    for_display = sorted(sel.serial_labels(), key=lambda s: s)
+
+    # Only collapsed headers here; each group fetches its first page when opened,
+    # so the fragment size depends on the number of serials, not their files
+    groups = [
+        Details(
+            Summary(s),
+            Div("Loading…", cls="bronze-muted"),
+            cls="bronze-group",
+            hx_get=f"/api/bronze_group?s={SERIAL_IDS.id(s)}",
+            hx_trigger="toggle once",
+            hx_include="#module-current, #test-type",
+            hx_target="find div",
+            hx_swap="outerHTML",
         )
-
-    # Download buttons
-    controls = Div(
-        # Download ALL parquets in view as CSVs (zipped)
-        Form(
-            Input(type="hidden", name="paths", value=",".join(all_paths)),
-            Button(
-                "Download all CSVs",
-                type="submit",
-                style=(
-                    "padding:8px 10px; border-radius:10px; border:1px solid rgba(255,255,255,.35); "
-                    "background:transparent; color:#fff; cursor:pointer; margin-right:8px;"
-                ),
-            ),
-            method="get",
-            action="/download/csv_zip",
-            target="_blank",
-        ),
-        # Download ONLY selected parquets as CSVs (zipped)
-        Form(
-            Input(type="hidden", name="paths", value=",".join(psel or [])),
-            Button(
-                "Download selected CSVs",
-                type="submit",
-                disabled=(len(psel or []) == 0),
-                style=(
-                    "padding:8px 10px; border-radius:10px; border:1px solid rgba(255,255,255,.35); "
-                    "background:transparent; color:#fff; cursor:pointer;"
-                    + ("" if psel else " opacity:.6; cursor:not-allowed;")
-                ),
-            ),
-            method="get",
-            action="/download/csv_zip",
-            target="_blank",
-        ),
-        style=(
-            "display:flex; justify-content:flex-start; align-items:center; margin-bottom:10px; "
-            "gap:8px; flex-wrap:wrap;"
-        ),
+        for s in for_display
+    ]
+
+    # Download buttons: the clicked button sets the scope (all files in view, or only
+    # the selected ones), the dropdown the format; paths are resolved server-side
+    controls = Form(
+        Input(type="hidden", name="sel", value=sel.token),
+        Input(type="hidden", name="module", value=module),
+        Input(type="hidden", name="test_type", value=csv_selected(test_types or [])),
+        Select(*[Option(label, value=fmt) for fmt, label in EXPORT_CHOICES], name="fmt", cls="bronze-dl"),
+        Button("Download all", type="submit", name="scope", value="all", cls="bronze-dl"),
+        render_download_selected(sel),
+        cls="bronze-controls",
+        method="get",
+        action="/download/csv_zip",
+        target="_blank",
     )
 
     # Keep original container styling
     return Div(
         Div(
-            Div(f"Bronze files for {len(selected_order)} selected", style="font-weight:600;"),
+            Div(f"Bronze files for {len(sel.serials)} selected", cls="bronze-title"),
             controls,
-            style=(
-                "display:flex; justify-content:space-between; align-items:center; "
-                "margin-bottom:10px; gap:12px; flex-wrap:wrap;"
-            ),
+            cls="bronze-head",
         ),
-        Div(
-            *groups,
-            style=(
-                "background:rgba(255,255,255,.08); border:1px solid rgba(255,255,255,.22); "
-                "padding:10px; border-radius:12px; color:#fff;"
-            )
-        ),
-        # Hidden state for selected parquet paths
-        Input(type="hidden", id="pselected", name="pselected", value=",".join(psel or [])),
+        Div(*groups, cls="bronze-box"),
         id="bronze-col",
-        style="display:block; width:100%; max-width:560px;",
+        cls="bronze-panel",
         hx_swap_oob="true",
     )
 
@@ -297,7 +336,7 @@ def render_module_panel(current_module: str = "MAT", selected_types: list[str] |
             type="button",
             style=base,
             hx_get=f"/api/module_select?module={label}",
-            hx_include="#test-type, #selected, #pselected, #serial",
+            hx_include="#test-type, #serial",
             hx_target="#module-testtype-panel",
             hx_swap="outerHTML",
         )
@@ -316,7 +355,7 @@ def render_module_panel(current_module: str = "MAT", selected_types: list[str] |
             type="button",
             style=base,
             hx_get=f"/api/testtype_toggle?tt={tt}",
-            hx_include="#module-current, #test-type, #selected, #pselected, #serial",
+            hx_include="#module-current, #test-type, #serial",
             hx_target="#module-testtype-panel",
             hx_swap="outerHTML",
         )
@@ -358,26 +397,40 @@ def nav_links():
             "opacity:.9;"
         ),
     )
-# ---------- Page ----------
-def page():
-    layout_style = Style(
-        """
-        :root{--grid: minmax(320px,560px); --justify:center;}
-        #columns{
+def render_layout_style(two_columns: bool, oob: bool = False):
+    # One column until a serial is selected, then the bronze panel gets the second
+    grid = ("minmax(320px,300px) minmax(320px,300px); --justify:start;" if two_columns
+            else "minmax(320px,560px); --justify:center;")
+    style = Style(
+        f"""
+        :root{{--grid: {grid}}}
+        #columns{{
             display:grid; gap:16px; grid-template-columns: var(--grid);
             justify-items: var(--justify);
-        }
+        }}
         """,
-        id="layout-state"
+        id="layout-state",
     )
+    if oob:
+        style.attrs["hx-swap-oob"] = "true"
+    return style
+
+# ---------- Page ----------
+def page(selection: Selection):
+    # The selection lives server-side per session, so the page starts from it, not empty
+    stands = selection.stand_names()
+    serials = selection.serial_labels()
+    module = "MAT"
     return Div(
-        layout_style,
+        render_layout_style(bool(serials)),
+        Style(BRONZE_CSS),
         nav_links(),
         Div(
             H1("Filter Data", style="margin:0 0 12px 0; font-size:36px;"),
             Div(
                 # LEFT column: test stand + serial
                 Div(
+                    Input(type="hidden", id="page-id", name="page_id", value=secrets.token_hex(8)),
                     Input(
                         id="test-stand",
                         name="test_stand",
@@ -389,9 +442,11 @@ def page():
                         ),
                         hx_get="/api/teststands",
                         hx_trigger="keyup changed delay:200ms",
+                        # Abort this input's previous request when a newer one fires
+                        hx_sync="this:replace",
                         hx_target="#stand-results",
                         hx_swap="innerHTML",
-                        hx_include="#stand-selected, #selected, #pselected, #module-current, #test-type",
+                        hx_include="#module-current, #test-type, #page-id",
                     ),
                     Input(
                         id="serial",
@@ -404,17 +459,18 @@ def page():
                         ),
                         hx_get="/api/serials", 
                         hx_trigger="keyup changed delay:200ms",
+                        hx_sync="this:replace",
                         hx_target="#results", 
                         hx_swap="innerHTML",
-                        # Include selection state while typing so selected items stay at top
-                        hx_include="#stand-selected, #selected, #pselected, #module-current, #test-type",
+                        # Selection lives server-side, so selected items stay at top without sending it
+                        hx_include="#module-current, #test-type, #page-id",
                     ),
                     style="display:flex; flex-direction:column; gap:10px; width:100%;",
                 ),
 
                 # RIGHT column: module + test-type toggle buttons
                 Div(
-                    render_module_panel("MAT", ["Stability", "Final"]),
+                    render_module_panel(module, TEST_TYPES[module]),
                     style="display:flex; flex-direction:column; gap:10px; width:100%;",
                 ),
 
@@ -425,15 +481,13 @@ def page():
                 ),
             ),
 
-            # Hidden state for selected serial numbers (CSV)
-            Input(type="hidden", id="selected", name="selected", value=""),
-            Input(type="hidden", id="stand-selected", name="stand_selected", value=""),
-
             Div(
                 # LEFT column (serial list)
                 Div(
                     Div(
+                        render_stand_list(stands, stands) if stands else
                         Div("Start typing to see stands…", id="stand-results", style="opacity:.85;"),
+                        render_serial_list(serials, serials) if serials else
                         Div("Start typing to see matches…", id="results", style="opacity:.85;"),
                         style=(
                             "display:grid; grid-template-columns:repeat(2, minmax(0, 1fr)); "
@@ -442,8 +496,8 @@ def page():
                     ),
                 ),
                 
-                # RIGHT column (bronze list) hidden initially (unchanged styling)
-                render_bronze_panel([], []),
+                # RIGHT column (bronze list) hidden until a serial is selected (unchanged styling)
+                render_bronze_panel(selection, module, TEST_TYPES[module]),
                 id="columns",
                 style="text-align:center;"
             ),
@@ -458,15 +512,16 @@ def page():
     )
 
 @rt("/")
-def home():
-    return page()
+def home(session):
+    return page(current_selection(session))
 
 # ---------- Search: keep selected at top even if filter hides them ----------
 @rt("/api/serials")
-def api_serials(selected: str = "", q: str = "", stand_selected: str = ""):
+async def api_serials(session, q: str = "", page_id: str = ""):
     q = (q or "").strip()
-    sel = parse_selected(selected)
-    stand_sel = parse_selected(stand_selected)
+    selection = current_selection(session)
+    sel = selection.serial_labels()
+    stand_sel = selection.stand_names()
 
     if not q:
         # Show only selected if nothing typed? Keep original behavior:
@@ -474,7 +529,13 @@ def api_serials(selected: str = "", q: str = "", stand_selected: str = ""):
         serials = []
     else:
         try:
-            serials = search_serials(prefix=q, limit=50, test_stands=stand_sel or None)
+            serials = await SEARCH_LATEST.run(
+                (selection.token, page_id, "serials"),
+                search_serials_async(prefix=q, limit=50, test_stands=stand_sel or None),
+            )
+        except Superseded:
+            # A newer request from this page owns #results; leave it alone
+            return Response(status_code=204)
         except Exception as e:
             return Div(f"DB error: {e}", style="opacity:.85;", id="results")
 
@@ -486,15 +547,21 @@ def api_serials(selected: str = "", q: str = "", stand_selected: str = ""):
     return render_serial_list(union, selected_order=sel, oob=False)
 
 @rt("/api/teststands")
-def api_teststands(stand_selected: str = "", test_stand: str = ""):
+async def api_teststands(session, test_stand: str = "", page_id: str = ""):
     tq = (test_stand or "").strip()
-    sel_stands = parse_selected(stand_selected)
+    selection = current_selection(session)
+    sel_stands = selection.stand_names()
 
     if not tq:
         stands = []
     else:
         try:
-            stands = search_teststand(prefix=tq, limit=50)
+            stands = await SEARCH_LATEST.run(
+                (selection.token, page_id, "stands"),
+                search_teststand_async(prefix=tq, limit=50),
+            )
+        except Superseded:
+            return Response(status_code=204)
         except Exception as e:
             return Div(f"DB error: {e}", style="opacity:.85;", id="stand-results")
 
@@ -505,198 +572,175 @@ def api_teststands(stand_selected: str = "", test_stand: str = ""):
     return render_stand_list(union, selected_order=sel_stands, oob=False)
 
 @rt("/api/toggle_stand")
-def api_toggle_stand(
+async def api_toggle_stand(
+    session,
     stand: str = "",
-    stand_selected: str = "",
-    selected: str = "",
-    pselected: str = "",
     test_stand: str = "",
     q: str = "",
-    module: str = "MAT",
-    test_type: str = "",
 ):
     st = (stand or "").strip()
-    stand_sel = parse_selected(stand_selected)
-    sel = parse_selected(selected)
-    psel = parse_selected(pselected)
+    selection = current_selection(session)
 
-    # Toggle stand in selection (move newly-added to the front)
+    # Toggle stand in selection (newly-added shows first)
     if st:
-        if st in stand_sel:
-            stand_sel = [x for x in stand_sel if x != st]
-        else:
-            stand_sel = [st] + [x for x in stand_sel if x != st]
+        selection.toggle_stand(st)
+    stand_sel = selection.stand_names()
+    sel = selection.serial_labels()
 
-    # Recompute stand list based on current stand search text
+    # Recompute the stand list (current stand search text) and the serial list
+    # (respecting selected stands) concurrently; they don't depend on each other
     tq = (test_stand or "").strip()
-    try:
-        stand_matches = search_teststand(prefix=tq, limit=50) if tq else []
-    except Exception:
-        stand_matches = []
+    q = (q or "").strip()
+    stand_matches, serial_matches = await asyncio.gather(
+        matches_or_empty(search_teststand_async, tq, limit=50),
+        matches_or_empty(search_serials_async, q, limit=50, test_stands=stand_sel or None),
+    )
 
     stand_union = stand_sel + [x for x in stand_matches if x not in set(stand_sel)]
     stand_list = render_stand_list(stand_union, selected_order=stand_sel, oob=True)
 
-    # Keep stand selection state in a hidden input (OOB)
-    stand_selected_input = Input(
-        type="hidden",
-        id="stand-selected",
-        name="stand_selected",
-        value=csv_selected(stand_sel),
-        hx_swap_oob="true",
-    )
-
-    # Recompute serial list respecting selected stands
-    q = (q or "").strip()
-    try:
-        serial_matches = (
-            search_serials(prefix=q, limit=50, test_stands=stand_sel or None) if q else []
-        )
-    except Exception:
-        serial_matches = []
-
     serial_union = sel + [x for x in serial_matches if x not in set(sel)]
     serial_list = render_serial_list(serial_union, selected_order=sel, oob=True)
 
     # We don't touch the bronze panel or layout here (serial selection not changed)
-    return Div(stand_selected_input, stand_list, serial_list)
+    return Div(stand_list, serial_list)
 
 
 
 # ---------- Toggle selection + update both panels ----------
+def stale_page_response():
+    # The page carries IDs from an earlier server process (or evicted since); htmx reloads it
+    return Response(content="This page is out of date; reload it.", media_type="text/plain",
+                    status_code=409, headers={"HX-Refresh": "true"})
+
 @rt("/api/toggle_parquet")
-def api_toggle_parquet(path: str = "", selected: str = "", pselected: str = "", module: str = "MAT", test_type: str = ""):
-    p = (path or "").strip()
-    sel = parse_selected(selected)
-    psel = parse_selected(pselected)
-
-    if p:
-        if p in psel:
-            psel = [x for x in psel if x != p]
-        else:
-            psel = [p] + [x for x in psel if x != p]
+async def api_toggle_parquet(session, f: str = ""):
+    try:
+        path = FILE_IDS.value(f)
+    except StaleId:
+        return stale_page_response()
+    if path is None:
+        return Response(content="Unknown file.", media_type="text/plain", status_code=404)
+    selection = current_selection(session)
+    selection.toggle_file(path)
+
+    # Swap just the clicked item; the download form goes out-of-band
+    return (
+        render_bronze_item(path, selection.files),
+        render_download_selected(selection, oob=True),
+    )
 
-    module = (module or "MAT").upper()
-    if module not in TEST_TYPES:
-        module = "MAT"
-    types = [t for t in parse_selected(test_type) if t in TEST_TYPES.get(module, [])]
 
-    right_panel = render_bronze_panel(sel, psel, module, types)
-    return right_panel
+@rt("/api/bronze_group")
+async def api_bronze_group(session, s: str = "", page: int = 0, module: str = "MAT", test_type: str = ""):
+    try:
+        serial = SERIAL_IDS.value(s) or ""
+    except StaleId:
+        return stale_page_response()
+    module, types = normalize_module_types(module, test_type)
+    page = max(0, page)
+    try:
+        paths, more = await bronze_page_async(serial, types or None, page * BRONZE_PAGE_SIZE, BRONZE_PAGE_SIZE)
+    except Exception as e:
+        return Div(Code(f"(DB error: {e})"), cls="bronze-muted")
+    if not paths and page == 0:
+        return Div("No bronze paths found.", cls="bronze-muted")
+
+    try:
+        stats = await bronze_file_stats_async(paths)
+    except Exception:
+        # Details are optional; the list still works without them
+        stats = {}
+
+    selected_files = current_selection(session).files
+    items = [
+        Li(
+            render_bronze_item(p, selected_files),
+            A("preview", href=f"/preview?f={FILE_IDS.id(str(p))}", target="_blank", cls="bronze-preview"),
+            render_bronze_stats(stats.get(str(p))),
+        )
+        for p in paths
+    ]
+    if more:
+        # Replaces itself with the next page
+        items.append(Li(Button(
+            "Show more",
+            cls="bronze-more",
+            hx_get=f"/api/bronze_group?s={s}&page={page + 1}",
+            hx_include="#module-current, #test-type",
+            hx_target="closest li",
+            hx_swap="outerHTML",
+        )))
+    if page == 0:
+        return Ul(*items, cls="bronze-list")
+    return tuple(items)
 
 
 @rt("/api/toggle")
-def api_toggle(
-    serial: str = "",
-    selected: str = "",
-    pselected: str = "",
-    stand_selected: str = "",
+async def api_toggle(
+    session,
+    s: str = "",
     q: str = "",
     module: str = "MAT",
     test_type: str = "",
 ):
-    s = (serial or "").strip()
-    sel = parse_selected(selected)
-    psel = parse_selected(pselected)
-    stand_sel = parse_selected(stand_selected)
-
-    # Toggle s in the selection list; newly-added goes to the front (move-to-top)
-    if s:
-        if s in sel:
-            sel = [x for x in sel if x != s]
-        else:
-            sel = [s] + [x for x in sel if x != s]
+    selection = current_selection(session)
+
+    # Toggle the serial; newly-added shows first (move-to-top)
+    try:
+        label = SERIAL_IDS.value(s)
+    except StaleId:
+        return stale_page_response()
+    if label is not None:
+        selection.toggle_serial(label)
+    sel = selection.serial_labels()
+    stand_sel = selection.stand_names()
 
     # Recompute left list content based on current filter `q`
     q = (q or "").strip()
-    try:
-        matches = search_serials(prefix=q, limit=50, test_stands=stand_sel or None) if q else []
-    except Exception:
-        matches = []
+    matches = await matches_or_empty(search_serials_async, q, limit=50, test_stands=stand_sel or None)
 
     union = sel + [x for x in matches if x not in set(sel)]
     left_list = render_serial_list(union, selected_order=sel, oob=True)
 
-    # Update hidden selected state (OOB)
-    selected_input = Input(
-        type="hidden",
-        id="selected",
-        name="selected",
-        value=csv_selected(sel),
-        hx_swap_oob="true",
-    )
-
     #normalize module + test types and pass into render_bronze_panel
-    module = (module or "MAT").upper()
-    if module not in TEST_TYPES:
-        module = "MAT"
-    types = [t for t in parse_selected(test_type) if t in TEST_TYPES.get(module, [])]
+    module, types = normalize_module_types(module, test_type)
 
     # Update right panel (OOB), grouped + sorted by serial number, filtered by module/types
-    right_panel = render_bronze_panel(sel, psel, module, types)
+    right_panel = render_bronze_panel(selection, module, types)
 
     # Switch layout between one/two columns (same styles as before)
-    style_block = (
-        Style(
-            """
-            :root{--grid: minmax(320px,300px) minmax(320px,300px); --justify:start;}
-            #columns{
-                display:grid; gap:16px; grid-template-columns: var(--grid);
-                justify-items: var(--justify);
-            }
-            """,
-            id="layout-state",
-            hx_swap_oob="true",
-        )
-        if sel
-        else Style(
-            """
-            :root{--grid: minmax(320px,560px); --justify:center;}
-            #columns{
-                display:grid; gap:16px; grid-template-columns: var(--grid);
-                justify-items: var(--justify);
-            }
-            """,
-            id="layout-state",
-            hx_swap_oob="true",
-        )
-    )
+    style_block = render_layout_style(bool(sel), oob=True)
 
     # Return only OOB fragments so the columns themselves never reflow
-    return Div(selected_input, right_panel, style_block, left_list)
+    return Div(right_panel, style_block, left_list)
 
 
 @rt("/api/module_select")
-def api_module_select(
+async def api_module_select(
+    session,
     module: str = "MAT",
-    selected: str = "",
-    pselected: str = "",
-    test_type: str = "",
 ):
     module = (module or "MAT").upper()
     if module not in TEST_TYPES:
         module = "MAT"
 
-    sel = parse_selected(selected)
-    psel = parse_selected(pselected)
-
     # When changing module, default to "all" test types for that module
     selected_types = TEST_TYPES.get(module, [])
 
     module_panel = render_module_panel(module, selected_types)
-    right_panel = render_bronze_panel(sel, psel, module, selected_types)
+    right_panel = render_bronze_panel(current_selection(session), module, selected_types)
 
     # hx-target is #module-testtype-panel; bronze panel updates via hx-swap-oob
     return Div(module_panel, right_panel)
 
 
 @rt("/api/testtype_toggle")
-def api_testtype_toggle(
+async def api_testtype_toggle(
+    session,
     tt: str = "",
     module: str = "MAT",
     test_type: str = "",
-    selected: str = "",
-    pselected: str = "",
 ):
     module = (module or "MAT").upper()
     if module not in TEST_TYPES:
@@ -712,34 +756,191 @@ def api_testtype_toggle(
         else:
             current_selected.append(tt)
 
-    sel = parse_selected(selected)
-    psel = parse_selected(pselected)
-
     module_panel = render_module_panel(module, current_selected)
-    right_panel = render_bronze_panel(sel, psel, module, current_selected)
+    right_panel = render_bronze_panel(current_selection(session), module, current_selected)
 
     return Div(module_panel, right_panel)
 
 @rt("/download/csv_zip")
-def download_csv_zip(paths: str = ""):
-    path_list = parse_selected(paths)
-    data = zip_csv_from_parquets(path_list)
+async def download_csv_zip(sel: str = "", scope: str = "files", fmt: str = "csv", module: str = "MAT", test_type: str = ""):
+    merged = fmt.removeprefix("merged.") if fmt.startswith("merged.") else None
+    if (fmt not in EXPORT_FORMATS) if merged is None else (merged not in MERGED_FORMATS):
+        return Response(content=f"Unknown format: {fmt}", media_type="text/plain", status_code=400)
+    selection = SELECTIONS.get(sel)
+    if selection is None:
+        return Response(
+            content="Selection expired; reload the page and select again.",
+            media_type="text/plain",
+            status_code=404,
+        )
 
-    if not data:
+    if scope == "all":
+        # Every file of the selected serials under the current test-type filter
+        _, types = normalize_module_types(module, test_type)
+        try:
+            groups = await bronze_groups_async(sorted(selection.serial_labels()), types or None, limit=None)
+        except Exception as e:
+            return Response(content=f"DB error: {e}", media_type="text/plain", status_code=500)
+        path_list = list(dict.fromkeys(str(p) for ps in groups.values() for p in ps))
+    else:
+        path_list = selection.file_paths()
+
+    if not path_list:
         return Response(
             content="No files to download.",
             media_type="text/plain",
             status_code=404,
         )
 
-    return Response(
-        content=data,
+    if merged is not None:
+        suffix, media_type = MERGED_FORMATS[merged]
+        try:
+            body = await open_merged_async(path_list, merged)
+        except LabelConflict as e:
+            return Response(content=str(e), media_type="text/plain", status_code=422)
+        if body is None:
+            return Response(
+                content="None of the selected files could be read, so there is nothing to merge.",
+                media_type="text/plain",
+                status_code=422,
+            )
+        return StreamingResponse(
+            body,
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="bronze_merged{suffix}"'},
+        )
+
+    # Entries are zipped as they are converted, so the first bytes go out immediately
+    return StreamingResponse(
+        stream_zip_async(path_list, fmt),
         media_type="application/zip",
-        headers={"Content-Disposition": 'attachment; filename="bronze_files_csv.zip"'},
+        headers={"Content-Disposition": f'attachment; filename="bronze_files_{fmt.replace(".", "_")}.zip"'},
+    )
+
+# ---------- Bronze preview ----------
+PREVIEW_CSS = """
+.preview{font-family:system-ui,-apple-system,Segoe UI,Roboto,Helvetica,Arial,sans-serif; padding:16px;}
+.preview form{display:flex; gap:8px; flex-wrap:wrap; margin:8px 0 12px 0;}
+.preview input{padding:6px 8px; border:1px solid #ccc; border-radius:6px;}
+.preview table{border-collapse:collapse; font-size:13px;}
+.preview th, .preview td{border:1px solid #ddd; padding:3px 6px; text-align:left; white-space:nowrap;}
+.preview .muted{opacity:.7;}
+"""
+
+def preview_path(f: str) -> tuple[str | None, str | None, int]:
+    try:
+        path = FILE_IDS.value(f)
+    except StaleId:
+        return None, "This link is from before the server restarted; open the preview again from the file list.", 409
+    if path is None:
+        return None, "Unknown file.", 404
+    return path, None, 200
+
+async def load_preview(f: str, columns: str, where: str, offset: int, limit: int) -> tuple[dict | None, str | None, int]:
+    path, error, status = preview_path(f)
+    if error:
+        return None, error, status
+    try:
+        return await preview_bronze_async(path, parse_selected(columns), where, offset, limit), None, 200
+    except PreviewError as e:
+        return None, str(e), 400
+    except Exception as e:
+        return None, f"Could not read {path}: {e}", 500
+
+@rt("/api/preview")
+async def api_preview(f: str = "", columns: str = "", where: str = "", offset: int = 0, limit: int = PREVIEW_ROWS):
+    data, error, status = await load_preview(f, columns, where, offset, limit)
+    if error:
+        return JSONResponse({"error": error}, status_code=status)
+    return JSONResponse(data)
+
+@rt("/preview")
+async def preview_page(f: str = "", columns: str = "", where: str = "", offset: int = 0, limit: int = PREVIEW_ROWS):
+    data, error, _ = await load_preview(f, columns, where, offset, limit)
+    form = Form(
+        Input(type="hidden", name="f", value=f),
+        Input(name="columns", value=columns, placeholder="columns (comma-separated)"),
+        Input(name="where", value=where, placeholder="filter, e.g. time >= 10 and time < 20", size=40),
+        Input(name="offset", value=offset, type="number", min=0),
+        Input(name="limit", value=limit, type="number", min=1),
+        Button("Preview", type="submit"),
+        method="get",
+        action="/preview",
     )
+    if error:
+        body = Div(error, cls="muted")
+    else:
+        body = Div(
+            Div(f"{data['row_count']} rows, {data['matched_rows']} matching; showing "
+                f"{len(data['rows'])} from row {data['offset']}", cls="muted"),
+            Details(Summary(f"Schema ({len(data['schema'])} columns)"),
+                    Ul(*[Li(Code(name), f" {dtype}") for name, dtype in data["schema"].items()])),
+            Table(
+                Thead(Tr(*[Th(c) for c in data["columns"]])),
+                Tbody(*[Tr(*[Td("" if v is None else str(v)) for v in row]) for row in data["rows"]]),
+            ),
+        )
+    name = (preview_path(f)[0] or "").rsplit("\\", 1)[-1]
+    return Title(f"Preview {name}"), Div(Style(PREVIEW_CSS), H3(name), form, body, cls="preview")
+
+# ---------- Cross-file query ----------
+# /api/query?stands=STAND_A&test_type=Final&where=temp > 85&group_by=serial_number&agg=max(temp),count()
+# Without serials/stands parameters the session's selected serials and stands are used.
+@rt("/api/query")
+async def api_query(
+    session,
+    serials: str = "",
+    stands: str = "",
+    module: str = "MAT",
+    test_type: str = "",
+    where: str = "",
+    columns: str = "",
+    group_by: str = "",
+    agg: str = "",
+    sort: str = "",
+    limit: int = QUERY_ROWS,
+):
+    serial_list, stand_list = parse_selected(serials), parse_selected(stands)
+    if not serial_list and not stand_list:
+        selection = current_selection(session)
+        serial_list, stand_list = selection.serial_labels(), selection.stand_names()
+    if not serial_list and not stand_list:
+        return JSONResponse({"error": "Select serials or test stands to query."}, status_code=400)
+
+    _, types = normalize_module_types(module, test_type)
+    spec = QuerySpec(
+        where=where,
+        columns=split_list(columns),
+        group_by=split_list(group_by),
+        aggs=split_list(agg),
+        sort=split_list(sort),
+        limit=limit,
+    )
+    try:
+        return JSONResponse(await query_async(serial_list, stand_list, types or None, spec))
+    except PreviewError as e:
+        # Includes QueryError: bad filter, column or aggregation
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except QueryLimitExceeded as e:
+        return JSONResponse({"error": str(e)}, status_code=422)
+    except ExecutorBusy as e:
+        return JSONResponse({"error": str(e)}, status_code=503)
+    except Exception as e:
+        return JSONResponse({"error": f"Query failed: {e}"}, status_code=500)
+
+@rt("/api/stats")
+def api_stats():
+    return JSONResponse({
+        "pools": pool_stats(),
+        "executors": executor_stats(),
+        **cache_stats(),
+        "selections": SELECTIONS.stats(),
+        "search_requests": {"coalesced": SEARCH_FLIGHTS.stats(), "per_client": SEARCH_LATEST.stats()},
+    })
 
 import app_modules
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=False)
+    # Prefer `python serve.py`: query workers re-import the main module, and that should not be app.py
+    import serve
+    serve.main()
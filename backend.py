@@ -1,25 +1,105 @@
 # backend.py
-from typing import List
+from typing import AsyncIterator, Iterator, List
 from db import search_serial_numbers_contains as _db_search_serials, search_test_stands_contains as _db_search_teststand
 from db import bronze_paths_for_serial as _db_bronze
 import db
-from pathlib import Path
-import io
-import zipfile
-import polars as pl
+from search_index import CatalogSearchIndex
+from cache import RefinementCache
+from invalidation import InvalidationListener
+import export as _export
+from export import CompactedLocation
+from executors import BoundedExecutor, register_executor
+from singleflight import SingleFlight
+from preview import PREVIEW_ROWS, preview_bronze
+from query import QuerySpec, prune_sources, run_query, stats_columns
+
+# Substring index over dbo.SilverFiles; kept current by polling row_ver deltas
+SEARCH_INDEX = CatalogSearchIndex(db._connect, dialect=db.POOL.dialect)
+
+# Ingest publishes (serial, stand) change events; each app worker applies them to its caches
+INVALIDATIONS = InvalidationListener(db._connect)
+INVALIDATIONS.subscribe(db.BRONZE_CACHE.invalidate)
+INVALIDATIONS.subscribe(SEARCH_INDEX.request_refresh)
+
+# Complete result sets of recent searches, per stand filter; narrower queries filter them.
+# Cleared once the index has applied a change, not on the raw event: searches in
+# between still read the old index and would re-cache its results.
+SEARCH_CACHE = RefinementCache(name="search_refine")
+SEARCH_INDEX.subscribe(SEARCH_CACHE.invalidate)
+
+
+# Blocking work from async routes runs here. One DB thread per pooled connection,
+# so a DB call never waits on the pool while holding a thread.
+DB_EXECUTOR = register_executor(BoundedExecutor("db", workers=db.POOL_SIZE))
+# Parquet reads and CSV/zip streaming
+IO_EXECUTOR = register_executor(BoundedExecutor("io", workers=4))
+# Each query runs in its own limited child process; this caps how many run at once
+QUERY_EXECUTOR = register_executor(BoundedExecutor("query", workers=2, max_pending=8))
+# Identical searches in flight at the same time (several users, or a retyped query) share one lookup
+SEARCH_FLIGHTS = SingleFlight("search")
+
+
+def cache_stats() -> dict:
+    return {
+        "bronze_cache": db.BRONZE_CACHE.stats(),
+        "search_cache": SEARCH_CACHE.stats(),
+        "invalidations": INVALIDATIONS.stats(),
+    }
+
+
+# The LIKE fallback treats these as wildcards, so filtering a cached set by plain substring would differ
+_LIKE_WILDCARDS = frozenset("%_[")
+
+
+def _serial_matches(label: str, q: str) -> bool:
+    return q in db._split_serial_label(label)[0].lower()
+
+
+def _stand_matches(stand: str, q: str) -> bool:
+    return q in (stand or "").lower()
+
+
+def _search_serials_uncached(q: str, limit: int, test_stands: List[str] | None) -> List[str]:
+    hits = SEARCH_INDEX.search_serials(q, limit, test_stands)
+    if hits is not None:
+        return hits
+    # Index still loading (or unavailable): fall back to the LIKE scan
+    return _db_search_serials(q, limit, test_stands)
+
+
+def _search_teststand_uncached(q: str, limit: int) -> List[str]:
+    hits = SEARCH_INDEX.search_test_stands(q, limit)
+    if hits is not None:
+        return hits
+    return _db_search_teststand(q, limit)
 
 
 def search_serials(prefix: str = "", limit: int = 50, test_stands: List[str] | None = None) -> List[str]:
     q = (prefix or "").strip()
     if not q:
         return []
-    return _db_search_serials(q, limit, test_stands)
+    if _LIKE_WILDCARDS.intersection(q):
+        return _search_serials_uncached(q, limit, test_stands)
+    scope = ("serials", tuple(sorted(test_stands or ())))
+    hits = SEARCH_CACHE.lookup(scope, q, limit, _serial_matches)
+    if hits is None:
+        generation = SEARCH_CACHE.generation
+        hits = _search_serials_uncached(q, limit, test_stands)
+        SEARCH_CACHE.store(scope, q, limit, hits, generation)
+    return hits
 
 def search_teststand(prefix: str = "", limit: int = 50) -> List[str]:
     q = (prefix or "").strip()
     if not q:
         return []
-    return _db_search_teststand(q, limit)
+    if _LIKE_WILDCARDS.intersection(q):
+        return _search_teststand_uncached(q, limit)
+    hits = SEARCH_CACHE.lookup(("stands",), q, limit, _stand_matches)
+    if hits is None:
+        generation = SEARCH_CACHE.generation
+        hits = _search_teststand_uncached(q, limit)
+        SEARCH_CACHE.store(("stands",), q, limit, hits, generation)
+    return hits
     
 
 def bronze_paths_for_serial(serial: str, limit: int = 500) -> List[str]:
@@ -37,34 +117,174 @@ def filter_bronze_by_testtype(bronze_list: List[str], type_list: List[str]) -> L
     return db.filter_by_testtype(bronze_list, type_list)
 
 
+def bronze_paths_for_serials(serials: List[str], limit: int | None = 500) -> dict[str, List[str]]:
+    return db.bronze_paths_for_serials(serials, limit)
+
+
+def bronze_groups(serials: List[str], type_list: List[str] | None = None, limit: int | None = 500) -> dict[str, List[str]]:
+    """
+    Bronze paths for a whole selection, grouped by serial label.
+    One catalog query resolves every serial, and the test-type filter runs once
+    over the union instead of once per serial.
+    """
+    groups = bronze_paths_for_serials(serials, limit)
+    if not type_list:
+        return groups
+    keep = set(filter_bronze_by_testtype([p for paths in groups.values() for p in paths], type_list))
+    return {s: [p for p in paths if p in keep] for s, paths in groups.items()}
+
+
+def bronze_page(serial: str, type_list: List[str] | None = None,
+                offset: int = 0, limit: int = 100) -> tuple[List[str], bool]:
+    """One page of a serial's bronze paths after the test-type filter; returns (paths, has_more)."""
+    s = (serial or "").strip()
+    if not s:
+        return [], False
+    paths = list(db.bronze_paths_for_serial_cached(s))
+    if type_list:
+        paths = filter_bronze_by_testtype(paths, type_list)
+    offset = max(0, offset)
+    return paths[offset:offset + limit], len(paths) > offset + limit
+
+
 def zip_csv_from_parquets(paths: List[str]) -> bytes:
     """Read multiple parquet files and return a ZIP archive of CSVs as bytes."""
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, mode="w", compression=zipfile.ZIP_DEFLATED) as z:
-        name_counts = {}
-        for raw in paths:
-            p = str(raw).strip()
-            if not p:
-                continue
-            try:
-                df = pl.read_parquet(p)
-            except Exception as e:
-                # Include a tiny error note instead of failing the whole archive
-                err_name = f"FAILED_{Path(p).name}.txt"
-                z.writestr(err_name, f"Failed to read parquet {p}: {e}\n")
-                continue
-
-            # Generate a mostly-unique CSV name within the ZIP
-            base = Path(p).with_suffix(".csv").name
-            n = name_counts.get(base, 0)
-            name_counts[base] = n + 1
-            if n:
-                stem = Path(base).stem
-                base = f"{stem}_{n}.csv"
-
-            s_buf = io.StringIO()
-            df.write_csv(s_buf)
-            csv_bytes = s_buf.getvalue().encode("utf-8")
-            z.writestr(base, csv_bytes)
-
-    return buf.getvalue()
+    return _export.zip_csv_from_parquets(paths)
+
+
+def stream_csv_zip(paths: List[str]) -> Iterator[bytes]:
+    """Same archive as zip_csv_from_parquets, yielded chunk by chunk as it is built."""
+    return _export.iter_csv_zip(paths)
+
+
+def stream_zip(paths: List[str], fmt: str = "csv", locations: dict[str, CompactedLocation] | None = None) -> Iterator[bytes]:
+    """ZIP with one entry per parquet in an EXPORT_FORMATS format (csv, csv.gz, csv.zst, arrow, parquet)."""
+    if locations is None:
+        locations = db.compacted_locations(paths)
+    return _export.iter_zip(paths, fmt, locations=locations)
+
+
+def merged_sources(paths: List[str]) -> list[tuple[str, str | None, str | None, str | None]]:
+    """(path, serial, stand, compacted location) for each bronze path, from the catalog."""
+    owners = db.serials_for_bronze_paths(paths)
+    locations = db.compacted_locations(paths)
+    return [(p, *owners.get(p, (None, None)), locations.get(p)) for p in dict.fromkeys(paths)]
+
+
+def stream_merged(paths: List[str], fmt: str = "parquet") -> Iterator[bytes] | None:
+    """
+    All the given bronze files as one parquet/CSV, rows labelled with serial,
+    stand and source file. None if none of them can be read; raises
+    export.LabelConflict if a file has a column named like a label.
+    """
+    lf = _export.merged_frame(merged_sources(paths))
+    return None if lf is None else _export.iter_merged(lf, fmt)
+
+
+def query_sources(serials: List[str], stands: List[str] | None = None,
+                  type_list: List[str] | None = None) -> list[tuple[str, str | None, str | None, str | None]]:
+    """
+    Files a query runs over: every bronze file of the selected serials (or, with
+    no serials, of the selected stands) under the test-type filter, restricted to
+    the selected stands, as merged_sources tuples.
+    """
+    if serials:
+        paths = [p for ps in bronze_groups(serials, type_list, limit=None).values() for p in ps]
+    else:
+        paths = filter_bronze_by_testtype(db.bronze_paths_for_stands(stands or []), type_list or [])
+    sources = merged_sources(paths)
+    if stands:
+        keep = {s.casefold() for s in stands}
+        sources = [src for src in sources if (src[2] or "").casefold() in keep]
+    return sources
+
+
+# ---------- async entry points (app routes) ----------
+
+async def search_serials_async(prefix: str = "", limit: int = 50, test_stands: List[str] | None = None) -> List[str]:
+    q = (prefix or "").strip()
+    key = ("serials", q, limit, tuple(sorted(test_stands or ())))
+    return await SEARCH_FLIGHTS.do(key, lambda: DB_EXECUTOR.run(search_serials, q, limit, test_stands))
+
+
+async def search_teststand_async(prefix: str = "", limit: int = 50) -> List[str]:
+    q = (prefix or "").strip()
+    return await SEARCH_FLIGHTS.do(("stands", q, limit), lambda: DB_EXECUTOR.run(search_teststand, q, limit))
+
+
+async def bronze_page_async(serial: str, type_list: List[str] | None = None,
+                            offset: int = 0, limit: int = 100) -> tuple[List[str], bool]:
+    return await DB_EXECUTOR.run(bronze_page, serial, type_list, offset, limit)
+
+
+async def bronze_groups_async(serials: List[str], type_list: List[str] | None = None,
+                              limit: int | None = 500) -> dict[str, List[str]]:
+    return await DB_EXECUTOR.run(bronze_groups, serials, type_list, limit)
+
+
+async def preview_bronze_async(path: str, columns: List[str] | None = None, where: str = "",
+                               offset: int = 0, limit: int = PREVIEW_ROWS) -> dict:
+    location = (await DB_EXECUTOR.run(db.compacted_locations, [path])).get(path)
+    return await IO_EXECUTOR.run(preview_bronze, path, columns, where, offset, limit, location)
+
+
+def pruned_query_sources(serials: List[str], stands: List[str] | None, type_list: List[str] | None,
+                         where: str = "") -> tuple[list, list]:
+    """query_sources split into (kept, pruned): pruned files' catalog statistics rule out `where`."""
+    sources = query_sources(serials, stands, type_list)
+    columns = stats_columns(where)
+    if not sources or not columns:
+        return sources, []
+    kept = prune_sources(sources, where, db.column_stats([src[0] for src in sources], columns))
+    keep = {src[0] for src in kept}
+    return kept, [src for src in sources if src[0] not in keep]
+
+
+async def query_async(serials: List[str], stands: List[str] | None, type_list: List[str] | None,
+                      spec: QuerySpec) -> dict:
+    sources, pruned = await DB_EXECUTOR.run(pruned_query_sources, serials, stands, type_list, spec.where)
+    if not sources and pruned:
+        # Every file ruled out: plan over their schema without rows, so the result has the
+        # shape a full run would (count() -> [[0]]) and bad columns are still reported
+        result = await QUERY_EXECUTOR.run(run_query, pruned, spec, rows=False)
+    else:
+        result = await QUERY_EXECUTOR.run(run_query, sources, spec)
+    result["files_pruned"] = len(pruned)
+    return result
+
+
+async def bronze_file_stats_async(paths: List[str]) -> dict[str, tuple]:
+    return await DB_EXECUTOR.run(db.bronze_file_stats, paths)
+
+
+async def _iterate_on_io(chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """Pull each chunk of a blocking iterator on IO_EXECUTOR instead of the event loop."""
+    try:
+        while True:
+            chunk = await IO_EXECUTOR.run(next, chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        # Client gone or done: cancel queued conversions. Called inline since it only
+        # cancels futures, and awaiting here could be interrupted by the same cancellation.
+        try:
+            chunks.close()
+        except ValueError:
+            # next() still running on IO_EXECUTOR; the generator is closed when collected
+            pass
+
+
+async def stream_zip_async(paths: List[str], fmt: str = "csv") -> AsyncIterator[bytes]:
+    locations = await DB_EXECUTOR.run(db.compacted_locations, paths)
+    async for chunk in _iterate_on_io(stream_zip(paths, fmt, locations)):
+        yield chunk
+
+
+async def open_merged_async(paths: List[str], fmt: str = "parquet") -> AsyncIterator[bytes] | None:
+    """stream_merged for a route: footers are checked before this returns, the file is then sunk and sent on IO_EXECUTOR."""
+    sources = await DB_EXECUTOR.run(merged_sources, paths)
+    lf = await IO_EXECUTOR.run(_export.merged_frame, sources)
+    if lf is None:
+        return None
+    return _iterate_on_io(_export.iter_merged(lf, fmt))
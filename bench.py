@@ -0,0 +1,110 @@
+# bench.py
+# Micro-benchmarks for the catalog and export paths.
+# Catalog benchmarks run against the local SQLite stand-in (db_pool.SqliteBackend),
+# so they measure query shape and Python overhead, not SQL Server network latency.
+#
+#   python bench.py            # run everything
+#   python bench.py testtype   # run one benchmark
+import sys
+import tempfile
+import time
+from pathlib import Path
+import pyarrow as pa
+from pyarrow import parquet as pq
+import db
+import export
+import ingest_SQL
+from db_pool import SqliteBackend
+
+BENCH_DB = "file:bench?mode=memory&cache=shared"
+
+
+def _timeit(fn, *args, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _catalog(n_bronze: int):
+    """Point both pools at a fresh in-memory catalog holding n_bronze BronzeFiles rows."""
+    backend = SqliteBackend(BENCH_DB)
+    ingest_SQL.set_backend(backend)
+    db.set_backend(backend)
+    cn = ingest_SQL.get_connection()
+    cur = cn.cursor()
+    ingest_SQL.ensure_tables(cur)
+    cur.execute("DELETE FROM dbo.BronzeFiles")
+    types = ["Stability", "Final", "None", "Other"]
+    cur.executemany(
+        "INSERT INTO dbo.BronzeFiles(file_path, test_type) VALUES (?, ?)",
+        [(rf"C:\data\parquets\STAND{i % 40:02d}\run_{i:08d}.parquet", types[i % 4]) for i in range(n_bronze)],
+    )
+    cn.commit()
+    cn.close()
+    return [rf"C:\data\parquets\STAND{i % 40:02d}\run_{i:08d}.parquet" for i in range(n_bronze)]
+
+
+def bench_testtype(sizes=(10, 100, 1_000, 10_000, 50_000)):
+    """db.filter_by_testtype (one JSON parameter) vs the chunked IN-list it replaced."""
+    paths = _catalog(max(sizes) * 2)
+    print(f"{'paths':>8} {'json (ms)':>10} {'in-list (ms)':>13} {'kept':>7}")
+    for n in sizes:
+        subset = paths[:n]
+        t_json = _timeit(db.filter_by_testtype, subset, ["Stability", "Final"])
+        t_in = _timeit(db.filter_by_testtype_in_list, subset, ["Stability", "Final"])
+        kept = db.filter_by_testtype(subset, ["Stability", "Final"])
+        assert kept == db.filter_by_testtype_in_list(subset, ["Stability", "Final"])
+        print(f"{n:>8} {t_json * 1e3:>10.2f} {t_in * 1e3:>13.2f} {len(kept):>7}")
+
+
+def _bronze_files(root: Path, n_files: int, rows: int) -> list[str]:
+    """Synthetic bronze parquets shaped like test-stand logs (time, numeric channels, step label)."""
+    table = pa.table({
+        "time": pa.array([i * 0.01 for i in range(rows)]),
+        "temp": pa.array([20 + (i % 500) * 0.1 for i in range(rows)]),
+        "pressure": pa.array([101.3 + (i % 97) * 0.01 for i in range(rows)]),
+        "step": pa.array([f"step_{i % 12}" for i in range(rows)]),
+    })
+    paths = []
+    for i in range(n_files):
+        p = root / f"run_{i:03d}.parquet"
+        pq.write_table(table, p, compression="zstd")
+        paths.append(str(p))
+    return paths
+
+
+def bench_export(n_files: int = 8, rows: int = 200_000):
+    """Archive throughput and size per download format (export.EXPORT_FORMATS)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = _bronze_files(Path(tmp), n_files, rows)
+        src = sum(Path(p).stat().st_size for p in paths)
+        print(f"{n_files} files x {rows} rows, {src / 1e6:.1f} MB parquet")
+        print(f"{'format':>8} {'time (s)':>9} {'MB/s in':>8} {'zip (MB)':>9} {'x source':>9}")
+        for fmt in export.EXPORT_FORMATS:
+            size = 0
+
+            def run():
+                nonlocal size
+                size = sum(len(chunk) for chunk in export.iter_zip(paths, fmt))
+
+            t = _timeit(run, repeat=3)
+            print(f"{fmt:>8} {t:>9.3f} {src / 1e6 / t:>8.1f} {size / 1e6:>9.2f} {size / src:>9.2f}")
+
+
+BENCHMARKS = {
+    "testtype": bench_testtype,
+    "export": bench_export,
+}
+
+
+def main(names: list[str]) -> None:
+    for name in names or list(BENCHMARKS):
+        print(f"\n=== {name} ===")
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
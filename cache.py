@@ -0,0 +1,181 @@
+# cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a per-entry time-to-live and tag-based invalidation.
+
+    `tags(key)` returns a (serial, stand) pair for each key (stand may be None).
+    invalidate() uses it to drop every entry an ingest touched without having
+    to know the exact keys the app cached.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0,
+                 tags: Callable[[Hashable], tuple] | None = None, name: str = "cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._tags = tags
+        self._data: OrderedDict = OrderedDict()  # key -> (value, expires_at, tags)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires_at, _ = item
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value) -> None:
+        tags = self._tags(key) if self._tags else None
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl, tags)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, serial: str | None = None, stand: str | None = None) -> int:
+        """
+        Drop entries for a serial and/or stand (case-insensitive); with neither, drop everything.
+        An entry without a stand (all stands of a serial) is dropped whenever its serial,
+        or any stand, is invalidated.
+        """
+        serial_key = serial.casefold() if serial else None
+        stand_key = stand.casefold() if stand else None
+        with self._lock:
+            if serial_key is None and stand_key is None:
+                dropped = list(self._data)
+            else:
+                dropped = []
+                for key, (_, _, tags) in self._data.items():
+                    if tags is None:
+                        dropped.append(key)
+                        continue
+                    k_serial, k_stand = tags
+                    if serial_key is not None and k_serial != serial_key:
+                        continue
+                    if stand_key is not None and k_stand is not None and k_stand != stand_key:
+                        continue
+                    dropped.append(key)
+            for key in dropped:
+                del self._data[key]
+            self.invalidations += len(dropped)
+        return len(dropped)
+
+    def clear(self) -> None:
+        self.invalidate()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class RefinementCache:
+    """
+    Substring-search results keyed by (scope, query), e.g. scope = the stand filter.
+
+    A result list shorter than its limit holds every match, so a longer query
+    that contains the cached one ("AB12" after "AB1") is answered by filtering
+    it instead of searching again. invalidate() bumps the generation, which
+    drops every entry and makes results computed before the bump unstorable.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 60.0, name: str = "search_refine"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data: OrderedDict = OrderedDict()  # (scope, q) -> (results, limit, expires_at)
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.refined = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, scope: Hashable, query: str, limit: int,
+               matches: Callable[[str, str], bool]) -> list | None:
+        """Cached results for query, or None. matches(item, lowered_query) re-applies the search."""
+        q = query.lower()
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get((scope, q))
+            if item is not None and item[2] > now and (len(item[0]) < item[1] or limit <= item[1]):
+                self._data.move_to_end((scope, q))
+                self.hits += 1
+                return item[0][:limit]
+            # Longest cached substring first: its complete set is the smallest to filter
+            for size in range(len(q) - 1, 0, -1):
+                for start in range(len(q) - size + 1):
+                    key = (scope, q[start:start + size])
+                    item = self._data.get(key)
+                    if item is None or item[2] <= now or len(item[0]) >= item[1]:
+                        continue
+                    self._data.move_to_end(key)
+                    self.refined += 1
+                    return [r for r in item[0] if matches(r, q)][:limit]
+            self.misses += 1
+            return None
+
+    def store(self, scope: Hashable, query: str, limit: int, results: list, generation: int) -> None:
+        """Cache results computed while self.generation == generation (read it before searching)."""
+        with self._lock:
+            if generation != self.generation:
+                return
+            key = (scope, query.lower())
+            self._data[key] = (list(results), limit, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *_) -> None:
+        # Takes any arguments, so it can subscribe to CatalogSearchIndex or InvalidationListener
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "generation": self.generation,
+                "hits": self.hits,
+                "refined": self.refined,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
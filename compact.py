@@ -0,0 +1,330 @@
+# compact.py
+# Rewrites each serial's many small bronze parquets into one hive-partitioned dataset:
+#
+#   bronze_compacted/test_stand=<stand>/serial_number=<serial>/part-<ns>.parquet
+#
+# Every row keeps a source_file column, so any original can still be read or
+# rebuilt from its part (export.scan_bronze). dbo.CompactedFiles records where
+# each bronze file's rows live, with the file's own schema and row count.
+# Files go into the same part only if their shared columns have the same dtypes,
+# so no column is widened, and an original is only recorded as held (and so
+# deletable) once its rebuild from the part has exactly its columns and rows.
+#
+# Resumable: work is done and committed one serial at a time, and a serial whose
+# bronze files are unchanged since their last compaction is skipped.
+# Safe while the app serves: parts are written under a temp name and renamed,
+# the catalog switches to them in one transaction, and the parts it switched away
+# from are recorded in dbo.RetiredParts in that same transaction. They are only
+# deleted GRACE_SECONDS after that, so readers that resolved them can finish.
+import os
+import sys
+import time
+from pathlib import Path
+from urllib.parse import quote
+import polars as pl
+from pyarrow import parquet as pq
+from export import CompactedLocation, encode_schema, merged_frame, polars_schema, scan_bronze
+from ingest import BASE_DIR
+from ingest_SQL import get_connection, ensure_tables
+
+COMPACT_ROOT = BASE_DIR / "bronze_compacted"
+# Large enough for efficient scans, small enough that source_file statistics still prune
+ROW_GROUP_ROWS = 256_000
+GRACE_SECONDS = 3600
+
+
+def partition_dir(serial: str, stand: str, root: Path = COMPACT_ROOT) -> Path:
+    return root / f"test_stand={quote(stand, safe='')}" / f"serial_number={quote(serial, safe='')}"
+
+
+def _source_state(path: str) -> tuple[int, int] | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _is_stale(path: str, done: tuple) -> bool:
+    compacted_path, size, mtime_ns, _, schema = done
+    state = _source_state(path)
+    if state is None:
+        # Original already removed: its rows live on in the part, if that still exists
+        return not os.path.exists(compacted_path)
+    # Compacted before schemas were recorded: redo it while the original is there
+    return state != (size, mtime_ns) or schema is None
+
+
+def plan(cur) -> tuple[list[tuple[str, str, list[str], dict]], list[tuple[str, str]]]:
+    """
+    Serials to (re)compact as (serial, stand, bronze paths, {path: (part, size, mtime_ns, rows, schema)}),
+    plus the (serial, stand) pairs that are compacted but no longer mapped.
+    """
+    groups: dict[tuple[str, str], list[str]] = {}
+    for serial, stand, bronze_path in cur.execute(
+        "SELECT serial_number, test_stand, bronze_path FROM dbo.SerialBronzeMap "
+        "ORDER BY serial_number, test_stand, bronze_path"
+    ).fetchall():
+        if serial is None or stand is None:
+            continue
+        groups.setdefault((serial, stand), []).append(str(bronze_path))
+
+    done: dict[tuple[str, str], dict[str, tuple]] = {}
+    for bronze_path, compacted_path, serial, stand, *recorded in cur.execute(
+        "SELECT bronze_path, compacted_path, serial_number, test_stand, source_size, source_mtime_ns, "
+        "source_rows, source_schema FROM dbo.CompactedFiles"
+    ).fetchall():
+        done.setdefault((serial, stand), {})[str(bronze_path)] = (str(compacted_path), *recorded)
+
+    todo = []
+    for (serial, stand), paths in groups.items():
+        previous = done.get((serial, stand), {})
+        if set(paths) != set(previous) or any(_is_stale(p, previous[p]) for p in paths):
+            todo.append((serial, stand, paths, previous))
+    orphaned = [key for key in done if key not in groups]
+    return todo, orphaned
+
+
+def _legacy_schema(part: str):
+    # Compacted before schemas were recorded: all that is left is the part's union of columns
+    schema = pq.read_schema(part)
+    return schema.remove(schema.get_field_index("source_file"))
+
+
+def _schema_groups(schemas: dict[str, pl.Schema]) -> list[list[str]]:
+    """Split files so that within a group every shared column has one dtype."""
+    groups: list[tuple[dict, list[str]]] = []
+    for p, schema in schemas.items():
+        for merged, members in groups:
+            if all(merged.get(name, dtype) == dtype for name, dtype in schema.items()):
+                merged.update(schema)
+                members.append(p)
+                break
+        else:
+            groups.append((dict(schema), [p]))
+    return [members for _, members in groups]
+
+
+def _write_part(serial: str, stand: str, sources: list[tuple], out_dir: Path) -> Path:
+    lf = merged_frame(sources)
+    if lf is None:
+        raise RuntimeError(f"none of {len(sources)} bronze file(s) could be read")
+    # The partition directories carry serial_number and test_stand
+    lf = lf.drop("serial_number", "test_stand")
+    part = out_dir / f"part-{time.time_ns()}.parquet"
+    tmp = part.with_name(part.name + ".tmp")
+    try:
+        lf.sink_parquet(tmp, compression="zstd", row_group_size=ROW_GROUP_ROWS, statistics=True)
+        os.replace(tmp, part)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return part
+
+
+def compact_serial(cn, serial: str, stand: str, paths: list[str], previous: dict,
+                   root: Path = COMPACT_ROOT) -> tuple[list[Path], list[tuple]]:
+    """
+    Write a serial's bronze rows into parts (usually one) and point the catalog at them.
+    Returns (parts, [(bronze path, size, mtime_ns)] whose rebuild from them was checked);
+    ([], []) if nothing was readable.
+    """
+    found = {}  # path -> (source, (size, mtime_ns), rows, arrow schema)
+    for p in paths:
+        prev = previous.get(p)
+        location = CompactedLocation(prev[0], prev[4]) if prev else None
+        # Captured before reading: a file modified meanwhile looks stale on the next run
+        state = _source_state(p)
+        try:
+            if state is not None:
+                footer = pq.ParquetFile(p)
+                rows, schema = footer.metadata.num_rows, footer.schema_arrow
+            elif location is not None and os.path.exists(location.part):
+                # Original already removed: carry its rows over from the part they are in
+                state = prev[1:3]
+                rows = scan_bronze(p, location).select(pl.len()).collect().item()
+                schema = location.arrow_schema() or _legacy_schema(location.part)
+            else:
+                print(f"[SKIP] Bronze file not found: {p}")
+                continue
+        except Exception as e:
+            print(f"[WARN] {stand}/{serial}: skipping {p}: {e}")
+            continue
+        found[p] = ((p, serial, stand, location), state, rows, schema)
+    if not found:
+        return [], []
+
+    out_dir = partition_dir(serial, stand, root)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    parts, held, inserts = [], [], []
+    for group in _schema_groups({p: polars_schema(f[3]) for p, f in found.items()}):
+        part = _write_part(serial, stand, [found[p][0] for p in group], out_dir)
+        parts.append(part)
+        part_path = str(part.resolve())
+        written = pl.read_parquet_schema(part)
+        counts = dict(pl.scan_parquet(part, hive_partitioning=False)
+                      .group_by("source_file").len().collect().iter_rows())
+        for p in group:
+            _, (size, mtime_ns), rows, schema = found[p]
+            # Exactly its own columns as its own dtypes, and all of its rows, or it is not held
+            if (any(written.get(name) != dtype for name, dtype in polars_schema(schema).items())
+                    or counts.get(p, 0) != rows):
+                print(f"[WARN] {p} does not rebuild exactly from {part.name}; not recording it")
+                continue
+            held.append((p, size, mtime_ns))
+            inserts.append((p, part_path, serial, stand, size, mtime_ns, rows, encode_schema(schema)))
+
+    # An original that is gone and could not be carried over keeps its old row and part
+    recorded = {p for p, _, _ in held}
+    stranded = {p for p, prev in previous.items() if p not in recorded
+                and _source_state(p) is None and os.path.exists(prev[0])}
+    for p in sorted(stranded):
+        print(f"[WARN] {p}: original is gone; its rows stay in {previous[p][0]}")
+    cur = cn.cursor()
+    dropped = (set(previous) - stranded) | recorded
+    superseded = {prev[0] for p, prev in previous.items() if p in dropped}
+    for p in recorded - set(previous):
+        # Held by another serial's part until now
+        row = cur.execute("SELECT compacted_path FROM dbo.CompactedFiles WHERE bronze_path = ?", (p,)).fetchone()
+        if row is not None:
+            superseded.add(str(row[0]))
+    cur.executemany("DELETE FROM dbo.CompactedFiles WHERE bronze_path = ?", [(p,) for p in dropped])
+    cur.executemany(
+        "INSERT INTO dbo.CompactedFiles(bronze_path, compacted_path, serial_number, test_stand, "
+        "source_size, source_mtime_ns, source_rows, source_schema) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        inserts,
+    )
+    retire(cur, superseded)
+    cn.commit()
+    cur.close()
+    return parts, held
+
+
+def delete_originals(held: list[tuple]) -> int:
+    """
+    Remove originals compact_serial checked and recorded, if unchanged since they
+    were read. Only call after commit.
+    """
+    removed = 0
+    for p, size, mtime_ns in held:
+        if _source_state(p) != (size, mtime_ns):
+            continue
+        try:
+            os.remove(p)
+            removed += 1
+        except OSError as e:
+            print(f"[WARN] Could not remove {p}: {e}")
+    return removed
+
+
+def retire(cur, parts, now: float | None = None) -> None:
+    """
+    Record when parts stopped being referenced by dbo.CompactedFiles; collect_garbage
+    times their grace period from then. Call in the transaction that dropped the references.
+    """
+    now = time.time() if now is None else now
+    cur.executemany(
+        "INSERT INTO dbo.RetiredParts(compacted_path, retired_at) SELECT ?, ? "
+        "WHERE NOT EXISTS (SELECT 1 FROM dbo.CompactedFiles WHERE compacted_path = ?) "
+        "AND NOT EXISTS (SELECT 1 FROM dbo.RetiredParts WHERE compacted_path = ?)",
+        [(part, now, part, part) for part in parts],
+    )
+
+
+def collect_garbage(cn, root: Path = COMPACT_ROOT, grace_seconds: float = GRACE_SECONDS) -> int:
+    """
+    Delete parts retired more than grace_seconds ago. Files the catalog never knew
+    (.tmp leftovers, parts from a run that died before its commit, or ones retired by
+    an older compact.py) are judged by their own age: .tmp files are deleted, parts retired.
+    """
+    cur = cn.cursor()
+    cutoff = time.time() - grace_seconds
+    referenced = {str(Path(p).resolve()) for (p,) in
+                  cur.execute("SELECT DISTINCT compacted_path FROM dbo.CompactedFiles").fetchall()}
+    retired = {str(p): t for p, t in
+               cur.execute("SELECT compacted_path, retired_at FROM dbo.RetiredParts").fetchall()}
+
+    removed = 0
+    for part, retired_at in retired.items():
+        if retired_at >= cutoff:
+            continue
+        if part not in referenced:
+            try:
+                Path(part).unlink(missing_ok=True)
+                removed += 1
+            except OSError as e:
+                print(f"[WARN] Could not remove {part}: {e}")
+                continue
+        cur.execute("DELETE FROM dbo.RetiredParts WHERE compacted_path = ?", (part,))
+
+    unknown = []
+    for f in list(root.rglob("part-*.parquet*")):
+        path = str(f.resolve())
+        if path in referenced or path in retired:
+            continue
+        try:
+            if f.stat().st_mtime >= cutoff:
+                continue  # possibly a part another run is about to commit
+            if f.suffix == ".tmp":
+                f.unlink()
+                removed += 1
+            else:
+                unknown.append(path)
+        except OSError as e:
+            print(f"[WARN] Could not remove {f}: {e}")
+    retire(cur, unknown)
+    cn.commit()
+    cur.close()
+    return removed
+
+
+def main(delete: bool = False, root: Path = COMPACT_ROOT) -> None:
+    cn = get_connection()
+    cur = cn.cursor()
+
+    ensure_tables(cur)
+    cn.commit()
+
+    todo, orphaned = plan(cur)
+    print(f"Compacting {len(todo)} serial(s) into {root}")
+
+    files = parts = removed = 0
+    for i, (serial, stand, paths, previous) in enumerate(todo, start=1):
+        try:
+            new_parts, held = compact_serial(cn, serial, stand, paths, previous, root)
+        except Exception as e:
+            cn.rollback()
+            print(f"[ERROR] {stand}/{serial}: {e}")
+            continue
+        if not new_parts:
+            print(f"[SKIP] {stand}/{serial}: no readable bronze files")
+            continue
+        parts += len(new_parts)
+        files += len(held)
+        if delete:
+            removed += delete_originals(held)
+        print(f"  {i}/{len(todo)} {stand}/{serial}: {len(held)} file(s) -> "
+              f"{', '.join(part.name for part in new_parts)}")
+
+    if orphaned:
+        superseded = set()
+        for serial, stand in orphaned:
+            superseded.update(str(p) for (p,) in cur.execute(
+                "SELECT DISTINCT compacted_path FROM dbo.CompactedFiles WHERE serial_number = ? AND test_stand = ?",
+                (serial, stand)).fetchall())
+        cur.executemany("DELETE FROM dbo.CompactedFiles WHERE serial_number = ? AND test_stand = ?", orphaned)
+        retire(cur, superseded)
+        cn.commit()
+    collected = collect_garbage(cn, root)
+
+    cur.close()
+    cn.close()
+    print(f"[OK] compacted {files} bronze file(s) into {parts} part(s), "
+          f"dropped {len(orphaned)} unmapped serial(s), removed {collected} old part(s)")
+    if delete:
+        print(f"[OK] removed {removed} original bronze file(s)")
+
+
+if __name__ == "__main__":
+    # --delete-originals: remove each bronze file once its rows are committed to a part
+    main(delete="--delete-originals" in sys.argv[1:])
@@ -1,21 +1,39 @@
 # db.py
-import pyodbc
+import json
 import polars as pl
 from pyarrow import parquet as pq
 from typing import List
 from pathlib import Path
-from functools import lru_cache
+from cache import TTLCache
+from export import CompactedLocation
+from db_pool import ConnectionPool, PyodbcBackend, register_pool
 
 SERVER   = "server_here"
 DATABASE = "database_name_here"
 DRIVER   = "driver_name_here"
 
-def _connect():
-    return pyodbc.connect(
+POOL_SIZE = 8
+
+POOL = register_pool(ConnectionPool(
+    PyodbcBackend(
         f"DRIVER={{{DRIVER}}};SERVER={SERVER};DATABASE={DATABASE};"
         "Trusted_Connection=Yes;Encrypt=Yes;TrustServerCertificate=Yes;",
         timeout=5,
-    )
+    ),
+    max_size=POOL_SIZE,
+    name="app",
+))
+
+def set_backend(backend, max_size: int = POOL_SIZE) -> ConnectionPool:
+    """Point the app pool at another backend (e.g. db_pool.SqliteBackend for benchmarks)."""
+    global POOL
+    POOL.close()
+    POOL = register_pool(ConnectionPool(backend, max_size=max_size, name="app"))
+    return POOL
+
+def _connect():
+    # Pooled: leaving the `with` block returns the connection instead of closing it
+    return POOL.connection()
 
 def search_serial_numbers_contains(substring: str, limit: int = 50, test_stands: List[str] = None) -> List[str]:
     q = (substring or "").strip()
@@ -78,103 +96,293 @@ def _split_serial_label(label: str) -> tuple[str, str | None]:
     stand = stand.rstrip(")")
     return serial, stand or None
 
+# SQL Server caps a statement at 2100 parameters
+MAX_PARAMS = 2000
+
+def _chunks(seq: list, size: int = MAX_PARAMS):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+def _normalize_labels(labels: List[str]) -> list[str]:
+    return [l for l in dict.fromkeys((l or "").strip() for l in labels) if l]
+
+def bronze_paths_for_serials_uncached(labels: List[str]) -> dict[str, List[str]]:
+    """
+    Bronze paths for many 'serial (stand)' labels from dbo.SerialBronzeMap,
+    one indexed query per 2000 serials and no parquet reads.
+    Returns {label: de-duplicated, sorted bronze paths}.
+    """
+    labels = _normalize_labels(labels)
+    wanted = {label: _split_serial_label(label) for label in labels}
+    serials = sorted({sn for sn, _ in wanted.values() if sn})
+    out: dict[str, set[str]] = {label: set() for label in labels}
+    if not serials:
+        return {label: [] for label in labels}
+
+    rows = []
+    with _connect() as cn:
+        cur = cn.cursor()
+        for chunk in _chunks(serials):
+            sql = f"""
+                SELECT serial_number, test_stand, bronze_path
+                FROM dbo.SerialBronzeMap
+                WHERE serial_number IN ({",".join("?" for _ in chunk)})
+            """
+            rows.extend(cur.execute(sql, tuple(chunk)).fetchall())
+
+    # Collation is case-insensitive on the server; match the same way here
+    by_serial: dict[str, list[tuple[str, str]]] = {}
+    for sn, st, bp in rows:
+        by_serial.setdefault((sn or "").casefold(), []).append(((st or "").casefold(), bp))
+    for label, (sn, stand) in wanted.items():
+        for st, bp in by_serial.get(sn.casefold(), []):
+            if stand is None or st == stand.casefold():
+                out[label].add(str(bp))
+    return {label: sorted(paths) for label, paths in out.items()}
+
 def bronze_paths_for_serial_uncached(serial: str, limit: int = 500) -> List[str]:
     """
-    Given an exact serial, find its Silver file(s) then read their Bronze references.
-    Expects a column like 'bronze_path' in the Silver parquet; tries a couple fallbacks.
-    Returns a de-duplicated, sorted list.
+    Given an exact serial (optionally 'serial (stand)'), return its Bronze paths
+    from dbo.SerialBronzeMap. Returns a de-duplicated, sorted list.
     """
     serial = (serial or "").strip()
     if not serial:
         return []
-    
-    serial_number, stand = _split_serial_label(serial)
-
-    # 1) Get Silver parquet paths for the serial
-    if stand:
-        sql = """
-            SELECT file_path
-            FROM dbo.SilverFiles
-            WHERE serial_number = ? AND test_stand = ?
-            ORDER BY file_path
-        """
-        params = (serial_number, stand)
-    else:
-        sql = """
-            SELECT file_path
-            FROM dbo.SilverFiles
-            WHERE serial_number = ?
-            ORDER BY file_path
-        """
-        params = (serial_number,)
-        
-    silver_paths: List[str] = []
-    with _connect() as cn:
-        cur = cn.cursor()
-        silver_paths = [row[0] for row in cur.execute(sql, params).fetchall()]
+    return bronze_paths_for_serials_uncached([serial])[serial]
 
-    if not silver_paths:
-        return []
 
-    # 2) Collect bronze paths from the parquets
-    bronze: list[str] = []
-    for fp in silver_paths:
-        try:
-            # Try the common column name first (fast, column-pruned)
-            df = pl.read_parquet(fp, columns=["bronze_path"])
-            bronze.extend(df.get_column("bronze_path").drop_nulls().to_list())
-            continue
-        except Exception:
-            # Fallback: read schema & look for a plausible column
-            try:
-                df_all = pl.read_parquet(fp)
-                cand = None
-                for c in df_all.columns:
-                    lc = c.lower()
-                    if "bronze" in lc and ("path" in lc or "file" in lc or "ref" in lc):
-                        cand = c
-                        break
-                if cand:
-                    bronze.extend(df_all.get_column(cand).drop_nulls().to_list())
-            except Exception as e:
-                print(f"[WARN] Could not read bronze refs from {fp}: {e}")
-
-    # 3) Dedup & cap
-    dedup = sorted({str(p) for p in bronze})
-    return dedup
-
-
-@lru_cache(maxsize = 1024)
+def _label_tags(label: str) -> tuple[str, str | None]:
+    serial, stand = _split_serial_label(label)
+    return serial.casefold(), (stand.casefold() if stand else None)
+
+# label -> bronze paths. Entries expire after BRONZE_CACHE_TTL and are dropped
+# early when ingest reports the serial/stand changed (see invalidation.py).
+BRONZE_CACHE_TTL = 600.0
+BRONZE_CACHE = TTLCache(maxsize=1024, ttl=BRONZE_CACHE_TTL, tags=_label_tags, name="bronze_paths")
+
+def bronze_paths_for_serials_cached(labels: List[str]) -> dict[str, tuple[str, ...]]:
+    out: dict[str, tuple[str, ...]] = {}
+    misses = []
+    for label in _normalize_labels(labels):
+        hit = BRONZE_CACHE.get(label)
+        if hit is None:
+            misses.append(label)
+        else:
+            out[label] = hit
+    if misses:
+        for label, paths in bronze_paths_for_serials_uncached(misses).items():
+            out[label] = tuple(paths)
+            BRONZE_CACHE.put(label, out[label])
+    return out
+
 def bronze_paths_for_serial_cached(serial: str) -> tuple[str, ...]:
-    print(bronze_paths_for_serial_cached.cache_info().currsize)
-    return tuple(bronze_paths_for_serial_uncached(serial))
+    return bronze_paths_for_serials_cached([serial]).get((serial or "").strip(), ())
 
 def bronze_paths_for_serial(serial: str, limit: int = 500) -> List[str]:
     return list(bronze_paths_for_serial_cached(serial))[:limit]
 
+def bronze_paths_for_serials(labels: List[str], limit: int | None = 500) -> dict[str, List[str]]:
+    labels = _normalize_labels(labels)
+    found = bronze_paths_for_serials_cached(labels)
+    return {label: list(found[label])[:limit] for label in labels}
+
+# Paths and test types travel as one JSON parameter and are joined server-side,
+# so there is no per-path placeholder and no 2100-parameter ceiling.
+_FILTER_TESTTYPE_SQL = {
+    "mssql": """
+        SELECT b.file_path
+        FROM OPENJSON(?) WITH (file_path NVARCHAR(400) '$') AS p
+        JOIN dbo.BronzeFiles AS b ON b.file_path = p.file_path
+        WHERE b.test_type IN (SELECT t.value FROM OPENJSON(?) AS t)
+           OR b.test_type = 'None'
+        ORDER BY b.file_path
+    """,
+    "sqlite": """
+        SELECT b.file_path
+        FROM json_each(?) AS p
+        JOIN dbo.BronzeFiles AS b ON b.file_path = p.value
+        WHERE b.test_type IN (SELECT t.value FROM json_each(?) AS t)
+           OR b.test_type = 'None'
+        ORDER BY b.file_path
+    """,
+}
+
 def filter_by_testtype(bronze_list: List[str], type_list: List[str]) -> List[str]:
+    """Keep the bronze paths whose catalog test type is in type_list (or 'None'), in one round-trip."""
+    if not bronze_list:
+        return []
+
+    paths_json = json.dumps(list(dict.fromkeys(str(p) for p in bronze_list)))
+    types_json = json.dumps(list(type_list))
+    with _connect() as cn:
+        cur = cn.cursor()
+        rows = cur.execute(_FILTER_TESTTYPE_SQL[POOL.dialect], (paths_json, types_json)).fetchall()
+
+    return [row[0] for row in rows]
+
+def filter_by_testtype_in_list(bronze_list: List[str], type_list: List[str]) -> List[str]:
+    """Previous approach (one placeholder per path, chunked); kept for bench.py comparisons."""
     types = ",".join("?" for _ in type_list)
-    paths = ",".join("?" for _ in bronze_list)
 
-    if not paths:
+    if not bronze_list:
         return []
-    
-    sql = f"""
-        SELECT file_path
-        FROM dbo.BronzeFiles
-        WHERE file_path IN ({paths})
-        AND (
-            test_type IN ({types})
-            OR test_type = 'None'
-            )
-        ORDER BY file_path
+
+    rows = []
+    with _connect() as cn:
+        cur = cn.cursor()
+        # Keep each statement under the parameter cap
+        for chunk in _chunks(list(bronze_list), MAX_PARAMS - len(type_list)):
+            paths = ",".join("?" for _ in chunk)
+            sql = f"""
+                SELECT file_path
+                FROM dbo.BronzeFiles
+                WHERE file_path IN ({paths})
+                AND (
+                    test_type IN ({types})
+                    OR test_type = 'None'
+                    )
+            """
+            rows.extend(cur.execute(sql, (*chunk, *type_list)).fetchall())
+
+    return sorted(row[0] for row in rows)
+
+
+_SERIALS_FOR_BRONZE_SQL = {
+    "mssql": """
+        SELECT m.bronze_path, m.serial_number, m.test_stand
+        FROM OPENJSON(?) WITH (bronze_path NVARCHAR(400) '$') AS p
+        JOIN dbo.SerialBronzeMap AS m ON m.bronze_path = p.bronze_path
+    """,
+    "sqlite": """
+        SELECT m.bronze_path, m.serial_number, m.test_stand
+        FROM json_each(?) AS p
+        JOIN dbo.SerialBronzeMap AS m ON m.bronze_path = p.value
+    """,
+}
+
+def serials_for_bronze_paths(bronze_list: List[str]) -> dict[str, tuple[str | None, str | None]]:
+    """Reverse of bronze_paths_for_serials: {bronze path: (serial, stand)} from dbo.SerialBronzeMap."""
+    if not bronze_list:
+        return {}
+    paths_json = json.dumps(list(dict.fromkeys(str(p) for p in bronze_list)))
+    with _connect() as cn:
+        cur = cn.cursor()
+        rows = cur.execute(_SERIALS_FOR_BRONZE_SQL[POOL.dialect], (paths_json,)).fetchall()
+    return {str(bp): (sn, st) for bp, sn, st in rows}
+
+
+_BRONZE_FILE_STATS_SQL = {
+    "mssql": """
+        SELECT b.file_path, b.row_count, b.byte_size, b.column_count, b.first_ts, b.last_ts
+        FROM OPENJSON(?) WITH (file_path NVARCHAR(400) '$') AS p
+        JOIN dbo.BronzeFiles AS b ON b.file_path = p.file_path
+    """,
+    "sqlite": """
+        SELECT b.file_path, b.row_count, b.byte_size, b.column_count, b.first_ts, b.last_ts
+        FROM json_each(?) AS p
+        JOIN dbo.BronzeFiles AS b ON b.file_path = p.value
+    """,
+}
+
+def bronze_file_stats(bronze_list: List[str]) -> dict[str, tuple]:
+    """{bronze path: (row_count, byte_size, column_count, first_ts, last_ts)} as recorded at ingest."""
+    if not bronze_list:
+        return {}
+    paths_json = json.dumps(list(dict.fromkeys(str(p) for p in bronze_list)))
+    with _connect() as cn:
+        cur = cn.cursor()
+        rows = cur.execute(_BRONZE_FILE_STATS_SQL[POOL.dialect], (paths_json,)).fetchall()
+    return {str(fp): tuple(rest) for fp, *rest in rows}
+
+
+# Files with statistics (column_count set) come back even when none of the columns
+# match, so a column missing from a file can be told apart from a file never profiled
+_COLUMN_STATS_SQL = {
+    "mssql": """
+        SELECT b.file_path, s.column_name, s.null_count, s.min_value, s.max_value
+        FROM OPENJSON(?) WITH (file_path NVARCHAR(400) '$') AS p
+        JOIN dbo.BronzeFiles AS b ON b.file_path = p.file_path
+        LEFT JOIN dbo.BronzeColumnStats AS s
+          ON s.file_path = b.file_path
+         AND s.column_name IN (SELECT c.value FROM OPENJSON(?) AS c)
+        WHERE b.column_count IS NOT NULL
+    """,
+    "sqlite": """
+        SELECT b.file_path, s.column_name, s.null_count, s.min_value, s.max_value
+        FROM json_each(?) AS p
+        JOIN dbo.BronzeFiles AS b ON b.file_path = p.value
+        LEFT JOIN dbo.BronzeColumnStats AS s
+          ON s.file_path = b.file_path
+         AND s.column_name IN (SELECT c.value FROM json_each(?) AS c)
+        WHERE b.column_count IS NOT NULL
+    """,
+}
+
+def column_stats(bronze_list: List[str], columns: List[str]) -> dict[str, dict[str, tuple]]:
+    """
+    {bronze path: {column: (null_count, min, max)}} for the given columns. Files
+    without recorded statistics are left out; a column absent from a profiled
+    file is absent from its dict.
     """
+    if not bronze_list or not columns:
+        return {}
+    paths_json = json.dumps(list(dict.fromkeys(str(p) for p in bronze_list)))
+    with _connect() as cn:
+        cur = cn.cursor()
+        rows = cur.execute(_COLUMN_STATS_SQL[POOL.dialect], (paths_json, json.dumps(list(columns)))).fetchall()
+    out: dict[str, dict[str, tuple]] = {}
+    for fp, name, nulls, lo, hi in rows:
+        stats = out.setdefault(str(fp), {})
+        if name is not None:
+            stats[name] = (nulls, lo, hi)
+    return out
 
+
+def bronze_paths_for_stands(stands: List[str]) -> List[str]:
+    """Every bronze path mapped to a serial on these test stands, de-duplicated and sorted."""
+    stands = _normalize_labels(stands)
+    if not stands:
+        return []
+    rows = []
     with _connect() as cn:
         cur = cn.cursor()
-        rows = cur.execute(sql, *bronze_list, *type_list).fetchall()
+        for chunk in _chunks(stands):
+            sql = f"""
+                SELECT DISTINCT bronze_path
+                FROM dbo.SerialBronzeMap
+                WHERE test_stand IN ({",".join("?" for _ in chunk)})
+            """
+            rows.extend(cur.execute(sql, tuple(chunk)).fetchall())
+    return sorted({str(row[0]) for row in rows})
 
-    return [row[0] for row in rows]
+
+_COMPACTED_LOCATIONS_SQL = {
+    "mssql": """
+        SELECT c.bronze_path, c.compacted_path, c.source_schema
+        FROM OPENJSON(?) WITH (bronze_path NVARCHAR(400) '$') AS p
+        JOIN dbo.CompactedFiles AS c ON c.bronze_path = p.bronze_path
+    """,
+    "sqlite": """
+        SELECT c.bronze_path, c.compacted_path, c.source_schema
+        FROM json_each(?) AS p
+        JOIN dbo.CompactedFiles AS c ON c.bronze_path = p.value
+    """,
+}
+
+def compacted_locations(bronze_list: List[str]) -> dict[str, CompactedLocation]:
+    """{bronze path: part holding its rows, and its own schema} for files compact.py has rewritten."""
+    if not bronze_list:
+        return {}
+    paths_json = json.dumps(list(dict.fromkeys(str(p) for p in bronze_list)))
+    try:
+        with _connect() as cn:
+            cur = cn.cursor()
+            rows = cur.execute(_COMPACTED_LOCATIONS_SQL[POOL.dialect], (paths_json,)).fetchall()
+    except Exception as e:
+        # Catalog predates compaction (no CompactedFiles yet): originals are all there is
+        print(f"[WARN] Could not look up compacted locations: {e}")
+        return {}
+    return {str(bp): CompactedLocation(str(cp), schema) for bp, cp, schema in rows}
 
 
 def parquet_to_csv(path: Path):
@@ -0,0 +1,323 @@
+# db_pool.py
+import sqlite3
+import threading
+import time
+from collections import deque
+
+
+class PyodbcBackend:
+    """Opens SQL Server connections through pyodbc (the production catalog)."""
+
+    dialect = "mssql"
+
+    def __init__(self, conn_str: str, timeout: int | None = None):
+        self.conn_str = conn_str
+        self.timeout = timeout
+
+    def connect(self):
+        import pyodbc
+        if self.timeout is None:
+            return pyodbc.connect(self.conn_str)
+        return pyodbc.connect(self.conn_str, timeout=self.timeout)
+
+    def ping(self, raw) -> None:
+        cur = raw.cursor()
+        try:
+            cur.execute("SELECT 1").fetchone()
+        finally:
+            cur.close()
+
+
+class SqliteBackend:
+    """
+    Local SQLite stand-in for tests and benchmarks.
+    The database is attached as schema 'dbo' so statements that name
+    dbo.SilverFiles / dbo.BronzeFiles resolve the same way they do on SQL Server.
+    The default path is a shared in-memory database that lives as long as the pool
+    keeps at least one connection open.
+    """
+
+    dialect = "sqlite"
+
+    def __init__(self, path: str = "file:catalog?mode=memory&cache=shared"):
+        self.path = path
+
+    def connect(self):
+        raw = sqlite3.connect(":memory:", check_same_thread=False)
+        raw.execute("ATTACH DATABASE ? AS dbo", (self.path,))
+        return raw
+
+    def ping(self, raw) -> None:
+        raw.execute("SELECT 1").fetchone()
+
+
+class PoolTimeout(RuntimeError):
+    pass
+
+
+class PooledConnection:
+    """
+    Proxy handed out by ConnectionPool. Behaves like the underlying DB-API
+    connection, but close() (or leaving a `with` block) returns it to the pool.
+    `with` commits on success and rolls back on error, like a pyodbc connection.
+    """
+
+    def __init__(self, pool: "ConnectionPool", raw):
+        self._pool = pool
+        self._raw = raw
+
+    @property
+    def raw(self):
+        if self._raw is None:
+            raise RuntimeError("connection already returned to the pool")
+        return self._raw
+
+    def cursor(self):
+        return self.raw.cursor()
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._release(raw)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._raw is not None:
+            try:
+                if exc_type is None:
+                    self._raw.commit()
+                else:
+                    self._raw.rollback()
+            except Exception:
+                raw, self._raw = self._raw, None
+                self._pool._discard(raw)
+                raise
+        self.close()
+        return False
+
+    def __del__(self):
+        # Don't leak a checkout if a caller forgot to close()
+        if getattr(self, "_raw", None) is not None:
+            try:
+                self.close()
+            except Exception:
+                pass
+
+
+class ConnectionPool:
+    """
+    Bounded pool of DB connections.
+
+    - at most `max_size` connections are open at once; callers beyond that wait
+      up to `checkout_timeout` seconds for one to be returned
+    - idle connections older than `max_idle_seconds` are closed
+    - a connection that sat idle for `ping_after_seconds` or more is pinged on
+      checkout and replaced if the ping fails
+    - `backend` is anything with connect(), ping(raw) and a `dialect` name
+    """
+
+    def __init__(
+        self,
+        backend,
+        max_size: int = 8,
+        max_idle_seconds: float = 300.0,
+        checkout_timeout: float = 10.0,
+        ping_after_seconds: float = 2.0,
+        name: str = "default",
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be >= 1")
+        self.backend = backend
+        self.dialect = getattr(backend, "dialect", "mssql")
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.checkout_timeout = checkout_timeout
+        self.ping_after_seconds = ping_after_seconds
+        self.name = name
+
+        self._cond = threading.Condition()
+        self._idle: deque = deque()  # (raw, returned_at), most recently returned on the right
+        self._open = 0               # idle + checked out
+        self._closed = False
+
+        self._checkouts = 0
+        self._connects = 0
+        self._reuses = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._ping_failures = 0
+        self._connect_failures = 0
+        self._evicted_idle = 0
+        self._discarded = 0
+
+    # ---------- checkout / return ----------
+    def acquire(self) -> PooledConnection:
+        start = time.monotonic()
+        waited = False
+        while True:
+            raw = None
+            stamp = 0.0
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError(f"pool {self.name!r} is closed")
+                self._evict_idle_locked(time.monotonic())
+                if self._idle:
+                    raw, stamp = self._idle.pop()
+                elif self._open < self.max_size:
+                    self._open += 1
+                else:
+                    waited = True
+                    remaining = self.checkout_timeout - (time.monotonic() - start)
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"pool {self.name!r}: no connection available after {self.checkout_timeout:.1f}s"
+                        )
+                    self._cond.wait(remaining)
+                    continue
+
+            if raw is not None:
+                if time.monotonic() - stamp >= self.ping_after_seconds and not self._alive(raw):
+                    self._discard(raw)
+                    continue
+                self._record_checkout(start, waited, reused=True)
+                return PooledConnection(self, raw)
+
+            # A slot was reserved above; open outside the lock
+            try:
+                raw = self.backend.connect()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._connect_failures += 1
+                    self._cond.notify()
+                raise
+            self._record_checkout(start, waited, reused=False)
+            return PooledConnection(self, raw)
+
+    connection = acquire
+
+    def _alive(self, raw) -> bool:
+        try:
+            self.backend.ping(raw)
+            return True
+        except Exception:
+            with self._cond:
+                self._ping_failures += 1
+            return False
+
+    def _record_checkout(self, start: float, waited: bool, reused: bool) -> None:
+        elapsed = time.monotonic() - start
+        with self._cond:
+            self._checkouts += 1
+            if reused:
+                self._reuses += 1
+            else:
+                self._connects += 1
+            if waited:
+                self._waits += 1
+                self._wait_total += elapsed
+                self._wait_max = max(self._wait_max, elapsed)
+
+    def _release(self, raw) -> None:
+        try:
+            # Leave no open transaction (and no held locks) behind on an idle connection
+            raw.rollback()
+        except Exception:
+            self._discard(raw)
+            return
+        with self._cond:
+            if self._closed:
+                self._open -= 1
+                _close_quietly(raw)
+            else:
+                self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, raw) -> None:
+        _close_quietly(raw)
+        with self._cond:
+            self._open -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    # ---------- maintenance ----------
+    def _evict_idle_locked(self, now: float) -> None:
+        # Oldest returns sit on the left
+        while self._idle and now - self._idle[0][1] > self.max_idle_seconds:
+            raw, _ = self._idle.popleft()
+            self._open -= 1
+            self._evicted_idle += 1
+            _close_quietly(raw)
+
+    def evict_idle(self) -> None:
+        with self._cond:
+            self._evict_idle_locked(time.monotonic())
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                raw, _ = self._idle.popleft()
+                self._open -= 1
+                _close_quietly(raw)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "name": self.name,
+                "dialect": self.dialect,
+                "max_size": self.max_size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+                "checkouts": self._checkouts,
+                "connects": self._connects,
+                "reuses": self._reuses,
+                "waits": self._waits,
+                "wait_seconds_total": round(self._wait_total, 6),
+                "wait_seconds_max": round(self._wait_max, 6),
+                "wait_seconds_avg": round(self._wait_total / self._waits, 6) if self._waits else 0.0,
+                "timeouts": self._timeouts,
+                "ping_failures": self._ping_failures,
+                "connect_failures": self._connect_failures,
+                "evicted_idle": self._evicted_idle,
+                "discarded": self._discarded,
+            }
+
+
+def _close_quietly(raw) -> None:
+    try:
+        raw.close()
+    except Exception:
+        pass
+
+
+POOLS: dict[str, ConnectionPool] = {}
+
+
+def register_pool(pool: ConnectionPool) -> ConnectionPool:
+    """Make a pool visible to pool_stats() (and the /api/stats endpoint)."""
+    POOLS[pool.name] = pool
+    return pool
+
+
+def pool_stats() -> dict[str, dict]:
+    return {name: pool.stats() for name, pool in POOLS.items()}
@@ -0,0 +1,101 @@
+# executors.py
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorBusy(RuntimeError):
+    """Raised instead of queueing when an executor already has max_pending calls."""
+
+
+class BoundedExecutor:
+    """
+    Thread pool that async routes hand blocking work to (pyodbc, polars, file I/O),
+    so the event loop never blocks and each kind of work has its own thread budget.
+
+    At most `max_pending` calls may be queued or running; beyond that run() raises
+    ExecutorBusy rather than letting latency grow without limit. A call whose
+    awaiting request is cancelled before it starts is dropped from the queue.
+    """
+
+    def __init__(self, name: str, workers: int, max_pending: int | None = None):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending or workers * 16
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-exec")
+        self._lock = threading.Lock()
+        self.pending = 0  # queued + running
+        self.active = 0
+        self.submitted = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def run(self, fn, *args, **kwargs):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise ExecutorBusy(f"{self.name} executor is busy ({self.pending} calls pending)")
+            self.pending += 1
+            self.submitted += 1
+        enqueued = time.perf_counter()
+
+        def call():
+            waited = time.perf_counter() - enqueued
+            with self._lock:
+                self.active += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+
+        fut = self._pool.submit(call)
+        fut.add_done_callback(self._done)
+        # Cancelling the awaiting task cancels fut too, if it has not started yet
+        return await asyncio.wrap_future(fut)
+
+    def _done(self, fut) -> None:
+        with self._lock:
+            self.pending -= 1
+            if fut.cancelled():
+                self.cancelled += 1
+            else:
+                self.completed += 1
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self.completed + self.active
+            return {
+                "workers": self.workers,
+                "active": self.active,
+                "queued": self.pending - self.active,
+                "max_pending": self.max_pending,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.wait_seconds / started * 1e3, 3) if started else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1e3, 3),
+            }
+
+
+EXECUTORS: dict[str, BoundedExecutor] = {}
+
+
+def register_executor(ex: BoundedExecutor) -> BoundedExecutor:
+    """Make an executor visible to executor_stats() (and the /api/stats endpoint)."""
+    EXECUTORS[ex.name] = ex
+    return ex
+
+
+def executor_stats() -> dict[str, dict]:
+    return {name: ex.stats() for name, ex in EXECUTORS.items()}
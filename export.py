@@ -0,0 +1,461 @@
+# export.py
+import base64
+import io
+import os
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Iterable, Iterator, List
+import polars as pl
+import pyarrow as pa
+from pyarrow import parquet as pq
+
+# Rows converted per CSV write; bounds memory per file regardless of file size
+BATCH_ROWS = 64_000
+# Hand zip output to the response once this much is buffered
+CHUNK_BYTES = 1 << 20
+# Converted CSVs stay in memory up to this size, then spill to a temp file
+SPOOL_BYTES = 32 << 20
+
+# Shared by every export. polars/pyarrow release the GIL while converting, so
+# threads use real cores; the pool size caps how many cores exports can take
+# from the UI, and EXPORT_WINDOW caps how many of them one export can hold.
+EXPORT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+EXPORT_WINDOW = max(1, EXPORT_WORKERS // 2)
+_EXECUTOR = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+
+
+class _ZipSink:
+    """
+    Write-only, non-seekable target for zipfile. Because it has no seek/tell,
+    zipfile writes data descriptors after each entry instead of seeking back,
+    so finished bytes can be handed to the client straight away.
+    """
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self.size = 0
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        self.size += len(b)
+        return len(b)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return out
+
+
+class _ZipNames:
+    """Generate a mostly-unique entry name within the ZIP (same scheme as before: stem_1.csv, ...)."""
+
+    def __init__(self):
+        self._counts: dict[str, int] = {}
+
+    def claim(self, stem: str, suffix: str) -> str:
+        base = stem + suffix
+        n = self._counts.get(base, 0)
+        self._counts[base] = n + 1
+        if n:
+            return f"{stem}_{n}{suffix}"
+        return base
+
+
+class _KeepOpen:
+    """Lets pyarrow write to a spool or zip entry: pyarrow closes its sink when done, this keeps the target open."""
+
+    closed = False
+
+    def __init__(self, f):
+        self._f = f
+
+    def write(self, b) -> int:
+        return self._f.write(b)
+
+    def flush(self) -> None:
+        self._f.flush()
+
+    def close(self) -> None:
+        self._f.flush()
+
+
+def _failed_note(z: zipfile.ZipFile, p: str, what: str, e: Exception) -> None:
+    # Include a tiny error note instead of failing the whole archive
+    z.writestr(f"FAILED_{Path(p).name}.txt", f"Failed to {what} {p}: {e}\n")
+
+
+def _csv_bytes(df: pl.DataFrame, header: bool) -> bytes:
+    buf = io.BytesIO()
+    df.write_csv(buf, include_header=header)
+    return buf.getvalue()
+
+
+# ---------- reading bronze files (original or compacted) ----------
+
+@dataclass(frozen=True)
+class CompactedLocation:
+    """
+    Where compact.py put one bronze file's rows: the part, and the file's own
+    arrow schema (encode_schema), so readers rebuild exactly its columns and
+    dtypes rather than the part's union of the serial's files.
+    """
+    part: str
+    schema: str | None = None  # None: compacted before schemas were recorded
+
+    def arrow_schema(self) -> pa.Schema | None:
+        return decode_schema(self.schema) if self.schema else None
+
+
+def encode_schema(schema: pa.Schema) -> str:
+    return base64.b64encode(schema.serialize().to_pybytes()).decode("ascii")
+
+
+def decode_schema(text: str) -> pa.Schema:
+    return pa.ipc.read_schema(pa.py_buffer(base64.b64decode(text)))
+
+
+def polars_schema(schema: pa.Schema) -> pl.Schema:
+    """The polars dtypes a parquet file with this arrow schema reads as."""
+    return pl.from_arrow(schema.empty_table()).schema
+
+
+def scan_bronze(path: str, location: CompactedLocation | None = None) -> pl.LazyFrame:
+    """
+    Lazy frame over one bronze file: the original while it exists, otherwise
+    its rows in the compacted part `location` (see compact.py).
+    """
+    if location is None or os.path.exists(path):
+        return pl.scan_parquet(path)
+    lf = (pl.scan_parquet(location.part, hive_partitioning=False)
+          .filter(pl.col("source_file") == str(path)))
+    schema = location.arrow_schema()
+    if schema is None:
+        return lf.drop("source_file")
+    # Only the file's own columns, as the types it had (the part holds its siblings' too)
+    return lf.select([pl.col(name).cast(dtype) for name, dtype in polars_schema(schema).items()])
+
+
+class _CompactedSource:
+    """ParquetFile stand-in (schema_arrow, iter_batches) for one original file's rows in a compacted part."""
+
+    def __init__(self, location: CompactedLocation, path: str):
+        import pyarrow.dataset as ds
+        self._dataset = ds.dataset(location.part, format="parquet")
+        # source_file is clustered, so row-group statistics skip the other files' rows
+        self._filter = ds.field("source_file") == str(path)
+        schema = location.arrow_schema()
+        if schema is None:
+            schema = self._dataset.schema
+            schema = schema.remove(schema.get_field_index("source_file"))
+        # The original's schema, key-value metadata included, for the rebuilt file
+        self.schema_arrow = schema
+
+    def iter_batches(self, batch_size: int):
+        for batch in self._dataset.to_batches(
+            columns=self.schema_arrow.names, filter=self._filter, batch_size=batch_size
+        ):
+            yield from pa.Table.from_batches([batch]).cast(self.schema_arrow).to_batches()
+
+
+def _open_parquet(p: str, location: CompactedLocation | None = None):
+    try:
+        return pq.ParquetFile(p)
+    except FileNotFoundError:
+        if location is None:
+            raise
+        return _CompactedSource(location, p)
+
+
+# Writers render one source into `out` and yield after every batch, so a caller
+# streaming into a zip entry can hand finished bytes to the client in between.
+
+def _write_csv(pf: pq.ParquetFile, out, batch_rows: int) -> Iterator[None]:
+    header = True
+    for batch in pf.iter_batches(batch_size=batch_rows):
+        out.write(_csv_bytes(pl.from_arrow(batch), header))
+        header = False
+        yield
+    if header:
+        # No row groups: still emit the header line
+        out.write(_csv_bytes(pl.from_arrow(pf.schema_arrow.empty_table()), True))
+
+
+def _write_compressed_csv(pf: pq.ParquetFile, out, batch_rows: int, codec: str) -> Iterator[None]:
+    with pa.CompressedOutputStream(pa.PythonFile(_KeepOpen(out), mode="w"), codec) as stream:
+        yield from _write_csv(pf, stream, batch_rows)
+
+
+def _write_ipc(pf: pq.ParquetFile, out, batch_rows: int) -> Iterator[None]:
+    # Arrow IPC file (= Feather v2); buffers are zstd-compressed, types kept as-is
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.ipc.new_file(pa.PythonFile(_KeepOpen(out), mode="w"), pf.schema_arrow, options=options) as writer:
+        for batch in pf.iter_batches(batch_size=batch_rows):
+            writer.write_batch(batch)
+            yield
+
+
+def _write_parquet(pf: pq.ParquetFile, out, batch_rows: int) -> Iterator[None]:
+    with pq.ParquetWriter(pa.PythonFile(_KeepOpen(out), mode="w"), pf.schema_arrow, compression="zstd") as writer:
+        for batch in pf.iter_batches(batch_size=batch_rows):
+            writer.write_batch(batch)
+            yield
+
+
+def _convert(p: str, batch_rows: int, location: CompactedLocation | None = None, *, write: Callable):
+    """
+    Worker: render one parquet into a spooled temp file with `write`.
+    Returns (spool, None) or (None, (what, error)) so failures stay per file.
+    """
+    try:
+        pf = _open_parquet(p, location)
+    except Exception as e:
+        return None, ("read parquet", e)
+
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    try:
+        for _ in write(pf, spool, batch_rows):
+            pass
+        spool.seek(0)
+        return spool, None
+    except Exception as e:
+        spool.close()
+        return None, ("convert parquet", e)
+
+
+def _convert_to_csv(p: str, batch_rows: int, location: CompactedLocation | None = None):
+    return _convert(p, batch_rows, location, write=_write_csv)
+
+
+def _open_source(p: str, batch_rows: int, location: CompactedLocation | None = None):
+    """Worker for passthrough: the parquet itself is the entry, copied without decoding."""
+    try:
+        return open(p, "rb"), None
+    except FileNotFoundError as e:
+        if location is None:
+            return None, ("read parquet", e)
+        # Original removed after compaction: rebuild it from its compacted rows
+        return _convert(p, batch_rows, location, write=_write_parquet)
+    except Exception as e:
+        return None, ("read parquet", e)
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    suffix: str
+    prepare: Callable  # (path, batch_rows, location) -> (readable file, None) | (None, (what, error))
+    # Entries that are already compressed are stored, not deflated a second time
+    compress_type: int
+    write: Callable  # (parquet, out, batch_rows) -> batch-by-batch writer
+    # Existing source files are copied byte for byte rather than rewritten
+    passthrough: bool = False
+
+
+_WRITE_CSV_GZ = partial(_write_compressed_csv, codec="gzip")
+_WRITE_CSV_ZST = partial(_write_compressed_csv, codec="zstd")
+
+EXPORT_FORMATS = {
+    "csv": ExportFormat(".csv", _convert_to_csv, zipfile.ZIP_DEFLATED, _write_csv),
+    "csv.gz": ExportFormat(".csv.gz", partial(_convert, write=_WRITE_CSV_GZ), zipfile.ZIP_STORED, _WRITE_CSV_GZ),
+    "csv.zst": ExportFormat(".csv.zst", partial(_convert, write=_WRITE_CSV_ZST), zipfile.ZIP_STORED, _WRITE_CSV_ZST),
+    "arrow": ExportFormat(".arrow", partial(_convert, write=_write_ipc), zipfile.ZIP_STORED, _write_ipc),
+    "parquet": ExportFormat(".parquet", _open_source, zipfile.ZIP_STORED, _write_parquet, passthrough=True),
+}
+
+
+def _discard_result(fut) -> None:
+    spool, _ = fut.result()
+    if spool is not None:
+        spool.close()
+
+
+def _entry_info(name: str, compress_type: int) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    info.compress_type = compress_type
+    info.external_attr = 0o600 << 16
+    return info
+
+
+def _copy_entry(z: zipfile.ZipFile, sink: _ZipSink, name: str, spool,
+                compress_type: int = zipfile.ZIP_DEFLATED) -> Iterator[bytes]:
+    info = _entry_info(name, compress_type)
+    with spool:
+        # force_zip64: entry size is unknown up front and may pass 4GB
+        with z.open(info, mode="w", force_zip64=True) as entry:
+            while True:
+                block = spool.read(CHUNK_BYTES)
+                if not block:
+                    break
+                entry.write(block)
+                if sink.size >= CHUNK_BYTES:
+                    yield sink.drain()
+
+
+def _stream_entry(z: zipfile.ZipFile, sink: _ZipSink, names: _ZipNames, p: str, spec: ExportFormat,
+                  batch_rows: int, location: CompactedLocation | None = None) -> Iterator[bytes]:
+    """
+    Head-of-line file: convert it batch by batch straight into its zip entry,
+    handing out bytes as they are produced instead of spooling the whole file
+    first. A failure part-way leaves the entry truncated, with a FAILED note.
+    """
+    if spec.passthrough and (location is None or os.path.exists(p)):
+        src, err = spec.prepare(p, batch_rows, location)
+        if err is not None:
+            _failed_note(z, p, *err)
+        else:
+            yield from _copy_entry(z, sink, names.claim(Path(p).stem, spec.suffix), src, spec.compress_type)
+        return
+
+    try:
+        pf = _open_parquet(p, location)
+    except Exception as e:
+        _failed_note(z, p, "read parquet", e)
+        return
+    info = _entry_info(names.claim(Path(p).stem, spec.suffix), spec.compress_type)
+    try:
+        with z.open(info, mode="w", force_zip64=True) as entry:
+            for _ in spec.write(pf, entry, batch_rows):
+                if sink.size >= CHUNK_BYTES:
+                    yield sink.drain()
+    except Exception as e:
+        _failed_note(z, p, "convert parquet", e)
+
+
+def iter_zip(paths: Iterable[str], fmt: str = "csv", batch_rows: int = BATCH_ROWS,
+             window: int = EXPORT_WINDOW, locations: dict[str, CompactedLocation] | None = None) -> Iterator[bytes]:
+    """
+    Stream a ZIP with one entry per parquet, in EXPORT_FORMATS[fmt], as it is produced.
+    `locations` maps bronze paths to compacted parts, used for originals that are gone.
+
+    The file at the head of the line is converted straight into its entry, so
+    bytes go out as soon as its first batch is done. Up to `window` - 1 files
+    behind it convert in parallel on the shared export pool into spools, and
+    entries are written strictly in input order, so the archive layout is
+    deterministic. A queued file that has not started by the time it reaches
+    the head is streamed directly too. Each parquet is read row group by row
+    group, and memory is bounded by `window` - 1 spooled files plus one
+    output chunk.
+    """
+    spec = EXPORT_FORMATS[fmt]
+    locations = locations or {}
+    todo = deque(p for p in (str(raw).strip() for raw in paths) if p)
+    sink = _ZipSink()
+    names = _ZipNames()
+    in_flight: deque = deque()
+    try:
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as z:
+            while todo or in_flight:
+                p, fut = in_flight.popleft() if in_flight else (todo.popleft(), None)
+                while todo and len(in_flight) < max(1, window) - 1:
+                    q = todo.popleft()
+                    in_flight.append((q, _EXECUTOR.submit(spec.prepare, q, batch_rows, locations.get(q))))
+
+                if fut is None or fut.cancel():
+                    yield from _stream_entry(z, sink, names, p, spec, batch_rows, locations.get(p))
+                else:
+                    spool, err = fut.result()
+                    if err is not None:
+                        _failed_note(z, p, *err)
+                    else:
+                        name = names.claim(Path(p).stem, spec.suffix)
+                        yield from _copy_entry(z, sink, name, spool, spec.compress_type)
+                if sink.size >= CHUNK_BYTES:
+                    yield sink.drain()
+    finally:
+        # Client went away (or we failed): drop queued work and free spooled output
+        for _, fut in in_flight:
+            if not fut.cancel():
+                fut.add_done_callback(_discard_result)
+    tail = sink.drain()
+    if tail:
+        yield tail
+
+
+def iter_csv_zip(paths: Iterable[str], batch_rows: int = BATCH_ROWS, window: int = EXPORT_WINDOW) -> Iterator[bytes]:
+    return iter_zip(paths, "csv", batch_rows, window)
+
+
+def zip_csv_from_parquets(paths: List[str]) -> bytes:
+    """Read multiple parquet files and return a ZIP archive of CSVs as bytes."""
+    return b"".join(iter_csv_zip(paths))
+
+
+# ---------- merged export ----------
+
+# One file for the whole selection: format -> (suffix, media type)
+MERGED_FORMATS = {
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "csv": (".csv", "text/csv"),
+}
+# Added to every row by merged_frame to say where it came from
+LABEL_COLUMNS = frozenset({"serial_number", "test_stand", "source_file"})
+
+
+class LabelConflict(ValueError):
+    """A bronze file has its own column named like one of LABEL_COLUMNS; the message names it."""
+
+
+def merged_frame(sources: Iterable[tuple[str, str | None, str | None, str | None]]) -> pl.LazyFrame | None:
+    """
+    Lazy union of (path, serial, stand, compacted location) bronze files.
+    Columns are matched by name, missing ones become null and differing types
+    are widened (diagonal_relaxed). serial_number, test_stand and source_file
+    say where each row came from. Returns None if no file could be opened, and
+    raises LabelConflict if a file has a column of its own with one of those
+    names, rather than overwriting its data.
+    """
+    frames = []
+    for p, serial, stand, location in sources:
+        lf = scan_bronze(p, location)
+        try:
+            # Footer only; an unreadable file is left out instead of failing the whole export
+            schema = lf.collect_schema()
+        except Exception as e:
+            print(f"[WARN] merged export: skipping {p}: {e}")
+            continue
+        clash = sorted(LABEL_COLUMNS.intersection(schema))
+        if clash:
+            raise LabelConflict(f"{p} has its own {', '.join(clash)} column(s), which a merged "
+                                f"file uses to label every row; download it on its own instead")
+        frames.append(lf.with_columns(
+            pl.lit(serial, dtype=pl.Utf8).alias("serial_number"),
+            pl.lit(stand, dtype=pl.Utf8).alias("test_stand"),
+            pl.lit(str(p), dtype=pl.Utf8).alias("source_file"),
+        ))
+    if not frames:
+        return None
+    return pl.concat(frames, how="diagonal_relaxed")
+
+
+def iter_merged(lf: pl.LazyFrame, fmt: str = "parquet") -> Iterator[bytes]:
+    """
+    Stream a merged_frame as one parquet or CSV file. The streaming sink
+    writes it batch by batch to a temp file, so memory stays bounded however
+    large the selection is, then the file is sent in chunks. merged_frame is
+    called by the caller, so "nothing readable" is known before a response starts.
+    """
+    suffix, _ = MERGED_FORMATS[fmt]
+    fd, tmp = tempfile.mkstemp(prefix="merged_", suffix=suffix)
+    os.close(fd)
+    try:
+        if fmt == "parquet":
+            lf.sink_parquet(tmp, compression="zstd")
+        else:
+            lf.sink_csv(tmp)
+        with open(tmp, "rb") as f:
+            while True:
+                block = f.read(CHUNK_BYTES)
+                if not block:
+                    break
+                yield block
+    finally:
+        os.unlink(tmp)
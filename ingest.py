@@ -1,10 +1,14 @@
 import sys
 import os
+import math
+import re
+from datetime import datetime
 import pyarrow as pa
 import pyarrow.csv as csv
 from pyarrow import parquet as pq
 from pathlib import Path
 import polars as pl
+from dataclasses import dataclass, field
 import ingest_SQL
 
 test_stand_list = ["test_stand_list_here"]
@@ -13,6 +17,70 @@ BASE_DIR = Path(__file__).resolve().parent
 BRONZE_ROOT = BASE_DIR / "parquets"
 SILVER_ROOT = BASE_DIR / "silver_parquets"
 
+# Columns whose text values are parsed for a file's time span when it has no temporal column
+TIME_COLUMN = re.compile(r"time|date", re.IGNORECASE)
+
+@dataclass
+class ColumnStats:
+    name: str
+    dtype: str
+    null_count: int | None
+    # Numeric columns only; used to skip files a query filter rules out
+    min_value: float | None = None
+    max_value: float | None = None
+
+# What the catalog needs about each written file, captured while writing it so
+# ingest_SQL.sync_catalog never has to open the parquet footers again
+@dataclass
+class BronzeRecord:
+    path: Path
+    test_stand: str
+    test_type: str | None
+    row_count: int
+    byte_size: int
+    serial: str | None = None
+    first_ts: datetime | None = None
+    last_ts: datetime | None = None
+    columns: list[ColumnStats] = field(default_factory=list)
+
+def _finite(v) -> float | None:
+    return float(v) if v is not None and math.isfinite(v) else None
+
+def time_span(df: pl.DataFrame) -> tuple[datetime | None, datetime | None]:
+    """First/last timestamp: the first temporal column, else the first time-like text column that parses."""
+    candidates = [c for c, t in df.schema.items() if t.is_temporal() and t != pl.Duration and t != pl.Time]
+    exprs = [pl.col(c) for c in candidates[:1]]
+    if not exprs:
+        exprs = [pl.col(c).str.to_datetime(strict=False) for c, t in df.schema.items()
+                 if t == pl.Utf8 and TIME_COLUMN.search(c)]
+    for expr in exprs:
+        try:
+            lo, hi = df.select(expr.min().alias("lo"), expr.max().alias("hi")).row(0)
+        except Exception:
+            continue
+        if lo is not None:
+            return lo, hi
+    return None, None
+
+def frame_stats(df: pl.DataFrame) -> list[ColumnStats]:
+    """Per-column dtype, null count and numeric min/max, computed in one pass over the frame."""
+    numeric = [c for c, t in df.schema.items() if t.is_numeric()]
+    aggs = [pl.col(c).null_count().alias(f"n:{c}") for c in df.columns]
+    aggs += [pl.col(c).min().alias(f"lo:{c}") for c in numeric]
+    aggs += [pl.col(c).max().alias(f"hi:{c}") for c in numeric]
+    row = df.select(aggs).row(0, named=True) if aggs else {}
+    return [
+        ColumnStats(c, str(t), row.get(f"n:{c}"), _finite(row.get(f"lo:{c}")), _finite(row.get(f"hi:{c}")))
+        for c, t in df.schema.items()
+    ]
+
+@dataclass
+class SilverRecord:
+    path: Path
+    serial: str
+    test_stand: str
+    bronze_paths: list[Path] = field(default_factory=list)
+
 def build_silver(serial_dir: str, bronze_list: list[Path], test_stand: str) -> Path:
     files = []
     
@@ -37,60 +105,108 @@ def build_silver(serial_dir: str, bronze_list: list[Path], test_stand: str) -> P
     pq.write_table(table, out_path, compression="zstd")
     return out_path
 
+def build_silver_record(serial_dir: str, bronze_list: list[Path], test_stand: str) -> SilverRecord:
+    out_path = build_silver(serial_dir, bronze_list, test_stand)
+    return SilverRecord(out_path, serial_dir, test_stand, list(bronze_list))
+
 def read_serial_number(path: str | Path) -> str | None:
     kv = pq.ParquetFile(path).metadata.metadata or {}
     v = kv.get(b"Serial Number")
     return v.decode() if v is not None else None
 
+def bronze_path_for(csv_path: Path, test_stand: str, bronze_root: Path = BRONZE_ROOT) -> Path:
+    return bronze_root / test_stand / f"{csv_path.stem}.parquet"
+
+def convert_csv_to_bronze(csv_path: Path, test_stand: str, bronze_root: Path = BRONZE_ROOT) -> Path | None:
+    """Convert one CSV to its bronze parquet. Returns the parquet path, or None if it failed."""
+    record = write_bronze_record(csv_path, test_stand, bronze_root)
+    return record.path if record is not None else None
+
+def write_bronze_record(csv_path: Path, test_stand: str, bronze_root: Path = BRONZE_ROOT) -> BronzeRecord | None:
+    """convert_csv_to_bronze, returning the file's catalog record instead of just its path."""
+    try:
+        df = pl.read_csv(csv_path, ignore_errors=True, truncate_ragged_lines=True)
+        
+        test_type = "None"
+        if "example_test_here" in str(csv_path):
+            test_type = "example_test_here"
+        elif "example_test_here" in str(csv_path):
+            test_type = "example_test_here"
+        table = df.to_arrow()
+        schema = table.schema
+        existing_meta = schema.metadata or {}
+        new_meta = dict(existing_meta)
+        new_meta[b"example_test_here"] = test_type.encode("utf-8")
+        table = table.replace_schema_metadata(new_meta)
+    except Exception as e:
+        print(f"[WARN] Failed to read CSV: {csv_path} -> {e}")
+        return None
+
+
+    parquet_path = bronze_path_for(csv_path, test_stand, bronze_root)
+    parquet_path.parent.mkdir(parents=True, exist_ok=True) 
+    try:
+        # The sink's final offset is the file size, so no stat() on the share afterwards
+        with pa.OSFile(str(parquet_path), "wb") as sink:
+            pq.write_table(table, sink, compression="zstd")
+            byte_size = sink.tell()
+    except Exception as e:
+        print(f"[WARN] Failed to write Parquet: {parquet_path} -> {e}")
+        return None
+
+    record = BronzeRecord(parquet_path, test_stand, test_type, table.num_rows, byte_size)
+    try:
+        # From the frame already in memory; the catalog serves these so the app never opens the file
+        record.first_ts, record.last_ts = time_span(df)
+        record.columns = frame_stats(df)
+    except Exception as e:
+        print(f"[WARN] Could not compute statistics for {parquet_path}: {e}")
+    return record
+
+def read_bronze_record(parquet_path: Path, test_stand: str, serial: str | None = None) -> BronzeRecord | None:
+    """Catalog record for a bronze file written by an earlier run, rebuilt from its footer."""
+    test_type, row_count, byte_size = ingest_SQL.read_bronze_stats(parquet_path)
+    if row_count is None:
+        return None
+    first_ts, last_ts, columns = ingest_SQL.read_bronze_column_stats(parquet_path)
+    return BronzeRecord(parquet_path, test_stand, test_type, row_count, byte_size, serial,
+                        first_ts, last_ts, [ColumnStats(*c) for c in columns])
+
+def list_csvs(in_dir: Path) -> list[Path]:
+    # Sorted so silver contents don't depend on directory listing order
+    return sorted(p for p in in_dir.glob("*.csv") if p.suffix.lower() == ".csv")
+
 def write_bronze_parquets(in_dir: Path, test_stand: str, bronze_root: Path = BRONZE_ROOT) -> list[Path]:
     bronze_root.mkdir(parents=True, exist_ok=True)
     written: list[Path] = []
 
-    for csv_path in in_dir.glob("*.csv"):
-        if csv_path.suffix.lower() == ".csv":
-            try:
-                df = pl.read_csv(csv_path, ignore_errors=True, truncate_ragged_lines=True)
-                
-                test_type = "None"
-                if "example_test_here" in str(csv_path):
-                    test_type = "example_test_here"
-                elif "example_test_here" in str(csv_path):
-                    test_type = "example_test_here"
-                table = df.to_arrow()
-                schema = table.schema
-                existing_meta = schema.metadata or {}
-                new_meta = dict(existing_meta)
-                new_meta[b"example_test_here"] = test_type.encode("utf-8")
-                table = table.replace_schema_metadata(new_meta)
-            except Exception as e:
-                print(f"[WARN] Failed to read CSV: {csv_path} -> {e}")
-                continue
-
-
-            parquet_path = bronze_root / test_stand / f"{csv_path.stem}.parquet"
-            parquet_path.parent.mkdir(parents=True, exist_ok=True) 
-            try:
-                pq.write_table(table, parquet_path, compression="zstd")
-                written.append(parquet_path)
-            except Exception as e:
-                print(f"[WARN] Failed to write Parquet: {parquet_path} -> {e}")
-                continue
+    for csv_path in list_csvs(in_dir):
+        parquet_path = convert_csv_to_bronze(csv_path, test_stand, bronze_root)
+        if parquet_path is not None:
+            written.append(parquet_path)
     return written
 
-def main() -> None:
+def main(workers: int | None = None) -> None:
+    # Imported here: both modules build on the functions above
+    from ingest_parallel import INGEST_WORKERS, SerialJob, ingest_serial_dirs
+    from ingest_manifest import IngestManifest
+
+    jobs: list[SerialJob] = []
     for test_stand in test_stand_list:
         in_dir = Path(rf"\\{test_stand}path_here")
+        queued = 0
         for dir in os.listdir(in_dir):
-            silver_path = Path("silver_parquets") / Path(f"{dir}.parquet")
-            metadata = pq.ParquetFile(silver_path).metadata if silver_path.exists() else None
-            stand = metadata.metadata.get(b"Test Stand").decode() if metadata and metadata.metadata else "UNKNOWN"
             if os.path.isdir(Path(in_dir / dir)):
-                if silver_path.exists() and stand == test_stand:
-                    print(f"[SKIP] Already loaded files for {dir}: {silver_path}")
-                else:
-                    build_silver(dir, write_bronze_parquets(Path(in_dir / dir), test_stand), test_stand)
-        print(f"Completed parquet files for: {test_stand}")
-    ingest_SQL.main()
+                jobs.append(SerialJob(dir, test_stand, Path(in_dir / dir)))
+                queued += 1
+        print(f"Found {queued} serial folder(s) for: {test_stand}")
+
+    # The manifest decides per CSV whether anything changed since the last run,
+    # so new files in an already-loaded serial are picked up and nothing else is redone
+    with IngestManifest() as manifest:
+        result = ingest_serial_dirs(jobs, workers or INGEST_WORKERS, manifest=manifest)
+    print("Completed parquet files for: " + ", ".join(test_stand_list))
+    ingest_SQL.sync_catalog(result.silver, result.bronze)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,7 +1,12 @@
 # load_silver_paths.py
+import json
+import math
+import sys
+from datetime import datetime, timezone
 from pathlib import Path
+import polars as pl
 from pyarrow import parquet as pq 
-import pyodbc
+from db_pool import ConnectionPool, PyodbcBackend, register_pool
 
 # --- config ---
 SERVER   = "server_name_here"
@@ -11,13 +16,104 @@ SILVER_ROOT = r"silver_parquets"
 BRONZE_ROOT = r"parquets"
 
 
-def get_connection():
-    return pyodbc.connect(
+POOL = register_pool(ConnectionPool(
+    PyodbcBackend(
         f"DRIVER={{{DRIVER}}};SERVER={SERVER};DATABASE={DATABASE};"
         "Trusted_Connection=Yes;Encrypt=Yes;TrustServerCertificate=Yes;"
-    )
+    ),
+    max_size=4,
+    name="ingest",
+))
+
+
+def set_backend(backend, max_size: int = 4) -> ConnectionPool:
+    global POOL
+    POOL.close()
+    POOL = register_pool(ConnectionPool(backend, max_size=max_size, name="ingest"))
+    return POOL
+
+
+def get_connection():
+    # cn.close() hands the connection back to POOL
+    return POOL.acquire()
+
+# SQLite stand-in schema (db_pool.SqliteBackend attaches it as 'dbo').
+# Triggers emulate SQL Server's ROWVERSION so the search index deltas behave the same.
+_SQLITE_DDL = [
+    """CREATE TABLE IF NOT EXISTS dbo.SilverFiles(
+        file_path     TEXT NOT NULL PRIMARY KEY,
+        serial_number TEXT NULL,
+        test_stand    TEXT NULL,
+        row_ver       INTEGER NOT NULL DEFAULT 0
+    )""",
+    "CREATE INDEX IF NOT EXISTS dbo.IX_SilverFiles_row_ver ON SilverFiles(row_ver)",
+    """CREATE TRIGGER IF NOT EXISTS dbo.TR_SilverFiles_row_ver_ins AFTER INSERT ON SilverFiles
+    BEGIN
+        UPDATE SilverFiles SET row_ver = (SELECT MAX(row_ver) FROM SilverFiles) + 1 WHERE rowid = NEW.rowid;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS dbo.TR_SilverFiles_row_ver_upd AFTER UPDATE OF file_path, serial_number, test_stand ON SilverFiles
+    BEGIN
+        UPDATE SilverFiles SET row_ver = (SELECT MAX(row_ver) FROM SilverFiles) + 1 WHERE rowid = NEW.rowid;
+    END""",
+    """CREATE TABLE IF NOT EXISTS dbo.BronzeFiles(
+        file_path TEXT NOT NULL PRIMARY KEY,
+        test_type TEXT NULL,
+        row_count INTEGER NULL,
+        byte_size INTEGER NULL,
+        column_count INTEGER NULL,
+        first_ts  TEXT NULL,
+        last_ts   TEXT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS dbo.BronzeColumnStats(
+        file_path   TEXT NOT NULL,
+        column_name TEXT NOT NULL,
+        dtype       TEXT NULL,
+        null_count  INTEGER NULL,
+        min_value   REAL NULL,
+        max_value   REAL NULL,
+        PRIMARY KEY (file_path, column_name)
+    )""",
+    """CREATE TABLE IF NOT EXISTS dbo.SerialBronzeMap(
+        map_id        INTEGER PRIMARY KEY AUTOINCREMENT,
+        silver_path   TEXT NOT NULL,
+        bronze_path   TEXT NOT NULL,
+        serial_number TEXT NULL,
+        test_stand    TEXT NULL
+    )""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS dbo.UX_SerialBronzeMap_paths ON SerialBronzeMap(silver_path, bronze_path)",
+    "CREATE INDEX IF NOT EXISTS dbo.IX_SerialBronzeMap_serial ON SerialBronzeMap(serial_number, test_stand, bronze_path)",
+    "CREATE INDEX IF NOT EXISTS dbo.IX_SerialBronzeMap_bronze ON SerialBronzeMap(bronze_path, serial_number, test_stand)",
+    """CREATE TABLE IF NOT EXISTS dbo.CompactedFiles(
+        bronze_path     TEXT NOT NULL PRIMARY KEY,
+        compacted_path  TEXT NOT NULL,
+        serial_number   TEXT NULL,
+        test_stand      TEXT NULL,
+        source_size     INTEGER NULL,
+        source_mtime_ns INTEGER NULL,
+        source_rows     INTEGER NULL,
+        source_schema   TEXT NULL,
+        compacted_at    TEXT NOT NULL DEFAULT (datetime('now'))
+    )""",
+    "CREATE INDEX IF NOT EXISTS dbo.IX_CompactedFiles_serial ON CompactedFiles(serial_number, test_stand)",
+    """CREATE TABLE IF NOT EXISTS dbo.RetiredParts(
+        compacted_path TEXT NOT NULL PRIMARY KEY,
+        retired_at     REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS dbo.CatalogInvalidations(
+        event_id      INTEGER PRIMARY KEY AUTOINCREMENT,
+        serial_number TEXT NULL,
+        test_stand    TEXT NULL,
+        created_at    TEXT NOT NULL DEFAULT (datetime('now'))
+    )""",
+]
+
+
+def ensure_tables(cur, dialect: str | None = None):
+    if (dialect or POOL.dialect) == "sqlite":
+        for ddl in _SQLITE_DDL:
+            cur.execute(ddl)
+        return
 
-def ensure_tables(cur):
     # Silver files
     cur.execute("""
     IF OBJECT_ID(N'dbo.SilverFiles', N'U') IS NULL
@@ -33,6 +129,16 @@ def ensure_tables(cur):
     IF COL_LENGTH('dbo.SilverFiles','test_stand') IS NULL
         ALTER TABLE dbo.SilverFiles ADD test_stand NVARCHAR(128) NULL;
     """)
+    # row_ver lets the app's search index pull only rows changed since its last refresh
+    cur.execute("""
+    IF COL_LENGTH('dbo.SilverFiles','row_ver') IS NULL
+        ALTER TABLE dbo.SilverFiles ADD row_ver ROWVERSION;
+    """)
+    cur.execute("""
+    IF NOT EXISTS (SELECT 1 FROM sys.indexes
+                   WHERE name = N'IX_SilverFiles_row_ver' AND object_id = OBJECT_ID(N'dbo.SilverFiles'))
+        CREATE INDEX IX_SilverFiles_row_ver ON dbo.SilverFiles(row_ver);
+    """)
 
     # Bronze files
     cur.execute("""
@@ -45,6 +151,101 @@ def ensure_tables(cur):
     cur.execute("""
     IF COL_LENGTH('dbo.BronzeFiles','test_type') IS NULL
         ALTER TABLE dbo.BronzeFiles ADD test_type NVARCHAR(128) NULL;
+    IF COL_LENGTH('dbo.BronzeFiles','row_count') IS NULL
+        ALTER TABLE dbo.BronzeFiles ADD row_count BIGINT NULL;
+    IF COL_LENGTH('dbo.BronzeFiles','byte_size') IS NULL
+        ALTER TABLE dbo.BronzeFiles ADD byte_size BIGINT NULL;
+    IF COL_LENGTH('dbo.BronzeFiles','column_count') IS NULL
+        ALTER TABLE dbo.BronzeFiles ADD column_count INT NULL;
+    IF COL_LENGTH('dbo.BronzeFiles','first_ts') IS NULL
+        ALTER TABLE dbo.BronzeFiles ADD first_ts DATETIME2 NULL;
+    IF COL_LENGTH('dbo.BronzeFiles','last_ts') IS NULL
+        ALTER TABLE dbo.BronzeFiles ADD last_ts DATETIME2 NULL;
+    """)
+
+    # Per-column statistics of each bronze file: the column list, null counts and numeric
+    # min/max, so the app can describe and prune files without opening them
+    cur.execute("""
+    IF OBJECT_ID(N'dbo.BronzeColumnStats', N'U') IS NULL
+        CREATE TABLE dbo.BronzeColumnStats(
+            stat_id     BIGINT IDENTITY(1,1) NOT NULL PRIMARY KEY,
+            file_path   NVARCHAR(400) NOT NULL,
+            column_name NVARCHAR(256) NOT NULL,
+            dtype       NVARCHAR(64) NULL,
+            null_count  BIGINT NULL,
+            min_value   FLOAT NULL,
+            max_value   FLOAT NULL
+        );
+    -- Nonclustered: (file_path, column_name) is too wide for a clustered key
+    IF NOT EXISTS (SELECT 1 FROM sys.indexes
+                   WHERE name = N'UX_BronzeColumnStats_file' AND object_id = OBJECT_ID(N'dbo.BronzeColumnStats'))
+        CREATE UNIQUE INDEX UX_BronzeColumnStats_file ON dbo.BronzeColumnStats(file_path, column_name)
+            INCLUDE (null_count, min_value, max_value);
+    """)
+
+    # Serial -> bronze mapping, so the app never opens a silver parquet to find bronze files
+    cur.execute("""
+    IF OBJECT_ID(N'dbo.SerialBronzeMap', N'U') IS NULL
+        CREATE TABLE dbo.SerialBronzeMap(
+            map_id        BIGINT IDENTITY(1,1) NOT NULL PRIMARY KEY,
+            silver_path   NVARCHAR(400) NOT NULL,
+            bronze_path   NVARCHAR(400) NOT NULL,
+            serial_number NVARCHAR(128) NULL,
+            test_stand    NVARCHAR(128) NULL
+        );
+    """)
+    cur.execute("""
+    IF NOT EXISTS (SELECT 1 FROM sys.indexes
+                   WHERE name = N'UX_SerialBronzeMap_paths' AND object_id = OBJECT_ID(N'dbo.SerialBronzeMap'))
+        CREATE UNIQUE INDEX UX_SerialBronzeMap_paths ON dbo.SerialBronzeMap(silver_path, bronze_path);
+    IF NOT EXISTS (SELECT 1 FROM sys.indexes
+                   WHERE name = N'IX_SerialBronzeMap_serial' AND object_id = OBJECT_ID(N'dbo.SerialBronzeMap'))
+        CREATE INDEX IX_SerialBronzeMap_serial ON dbo.SerialBronzeMap(serial_number, test_stand) INCLUDE (bronze_path);
+    -- bronze -> serial, for exports that label rows with their serial
+    IF NOT EXISTS (SELECT 1 FROM sys.indexes
+                   WHERE name = N'IX_SerialBronzeMap_bronze' AND object_id = OBJECT_ID(N'dbo.SerialBronzeMap'))
+        CREATE INDEX IX_SerialBronzeMap_bronze ON dbo.SerialBronzeMap(bronze_path) INCLUDE (serial_number, test_stand);
+    """)
+
+    # Where compact.py moved each bronze file's rows (hive-partitioned dataset + source_file column)
+    cur.execute("""
+    IF OBJECT_ID(N'dbo.CompactedFiles', N'U') IS NULL
+        CREATE TABLE dbo.CompactedFiles(
+            bronze_path     NVARCHAR(400) NOT NULL PRIMARY KEY,
+            compacted_path  NVARCHAR(400) NOT NULL,
+            serial_number   NVARCHAR(128) NULL,
+            test_stand      NVARCHAR(128) NULL,
+            source_size     BIGINT NULL,
+            source_mtime_ns BIGINT NULL,
+            compacted_at    DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+        );
+    IF NOT EXISTS (SELECT 1 FROM sys.indexes
+                   WHERE name = N'IX_CompactedFiles_serial' AND object_id = OBJECT_ID(N'dbo.CompactedFiles'))
+        CREATE INDEX IX_CompactedFiles_serial ON dbo.CompactedFiles(serial_number, test_stand);
+    IF COL_LENGTH('dbo.CompactedFiles','source_rows') IS NULL
+        ALTER TABLE dbo.CompactedFiles ADD source_rows BIGINT NULL;
+    IF COL_LENGTH('dbo.CompactedFiles','source_schema') IS NULL
+        ALTER TABLE dbo.CompactedFiles ADD source_schema NVARCHAR(MAX) NULL;
+    """)
+
+    # Parts compact.py switched away from, with when (unix seconds); deleted a grace period later
+    cur.execute("""
+    IF OBJECT_ID(N'dbo.RetiredParts', N'U') IS NULL
+        CREATE TABLE dbo.RetiredParts(
+            compacted_path NVARCHAR(400) NOT NULL PRIMARY KEY,
+            retired_at     FLOAT NOT NULL
+        );
+    """)
+
+    # Change events that running app workers poll to drop stale cache entries
+    cur.execute("""
+    IF OBJECT_ID(N'dbo.CatalogInvalidations', N'U') IS NULL
+        CREATE TABLE dbo.CatalogInvalidations(
+            event_id      BIGINT IDENTITY(1,1) NOT NULL PRIMARY KEY,
+            serial_number NVARCHAR(128) NULL,
+            test_stand    NVARCHAR(128) NULL,
+            created_at    DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+        );
     """)
 
     
@@ -74,6 +275,62 @@ def read_bronze_metadata(path: Path):
         test_type = None
     return test_type
 
+def read_bronze_stats(path: Path):
+    """(test_type, row_count, byte_size) from a bronze parquet's footer; for reconciling old files."""
+    try:
+        pf = pq.ParquetFile(path)
+        md = pf.metadata.metadata or {}
+        tt = md.get(b"Test Type")
+        return (tt.decode() if tt else None), pf.metadata.num_rows, path.stat().st_size
+    except Exception as e:
+        print(f"[WARN] Could not read metadata from {path.name}: {e}")
+        return None, None, None
+
+def read_bronze_column_stats(path: Path):
+    """
+    (first_ts, last_ts, [(column, dtype, null_count, min, max)]) from a bronze
+    parquet's footer: row-group statistics, no data pages. For reconciling old
+    files; fresh ingests carry the same values in their BronzeRecord.
+    """
+    try:
+        pf = pq.ParquetFile(path)
+        schema = pl.read_parquet_schema(path)
+    except Exception as e:
+        print(f"[WARN] Could not read statistics from {path.name}: {e}")
+        return None, None, []
+    md = pf.metadata
+    first_ts = last_ts = None
+    rows = []
+    for i, (name, dtype) in enumerate(schema.items()):
+        nulls, lo, hi = 0, None, None
+        for rg in range(md.num_row_groups):
+            st = md.row_group(rg).column(i).statistics
+            if st is None or not st.has_null_count:
+                nulls = lo = hi = None
+                break
+            nulls += st.null_count
+            if st.has_min_max:
+                lo = st.min if lo is None else min(lo, st.min)
+                hi = st.max if hi is None else max(hi, st.max)
+            elif st.null_count < md.row_group(rg).num_rows:
+                # Values present but no min/max written: the range is unknown
+                lo = hi = None
+                break
+        if dtype.is_temporal() and first_ts is None and lo is not None:
+            first_ts, last_ts = lo, hi
+        numeric = dtype.is_numeric() and lo is not None and math.isfinite(lo) and math.isfinite(hi)
+        rows.append((name, str(dtype), nulls, float(lo) if numeric else None, float(hi) if numeric else None))
+    return first_ts, last_ts, rows
+
+def read_bronze_refs(path: Path) -> list[str]:
+    """Bronze paths listed in a silver parquet's 'bronze_path' column."""
+    try:
+        table = pq.read_table(path, columns=["bronze_path"])
+        return [str(p) for p in table.column("bronze_path").to_pylist() if p is not None]
+    except Exception as e:
+        print(f"[WARN] Could not read bronze refs from {path.name}: {e}")
+        return []
+
 def upsert_silver(cur, silver_paths):
     check_sql  = "SELECT serial_number, test_stand FROM dbo.SilverFiles WHERE file_path = ?"
     insert_sql = "INSERT INTO dbo.SilverFiles(file_path, serial_number, test_stand) VALUES (?, ?, ?)"
@@ -86,16 +343,16 @@ def upsert_silver(cur, silver_paths):
         fp = str(p.resolve())
         serial, test_stand = read_silver_metadata(p)
 
-        row = cur.execute(check_sql, fp).fetchone()
+        row = cur.execute(check_sql, (fp,)).fetchone()
         if row is None:
-            cur.execute(insert_sql, fp, serial, test_stand)
+            cur.execute(insert_sql, (fp, serial, test_stand))
             new_count += 1
         else:
             current_serial, current_stand = row
             if current_serial == serial and current_stand == test_stand:
                 skip_count += 1
             else:
-                cur.execute(update_sql, serial, test_stand, fp)
+                cur.execute(update_sql, (serial, test_stand, fp))
                 update_count += 1
 
     return new_count, update_count, skip_count
@@ -113,24 +370,293 @@ def upsert_bronze(cur, bronze_paths):
         fp = str(p.resolve())
         test_type = read_bronze_metadata(p)
 
-        row = cur.execute(check_sql, fp).fetchone()
+        row = cur.execute(check_sql, (fp,)).fetchone()
         if row is None:
-            cur.execute(insert_sql, fp, test_type)
+            cur.execute(insert_sql, (fp, test_type))
             new_count += 1
         else:
             (current_type,) = row
             if current_type == test_type:
                 skip_count += 1
             else:
-                cur.execute(update_sql, test_type, fp)
+                cur.execute(update_sql, (test_type, fp))
                 update_count += 1
 
     return new_count, update_count, skip_count
 
 
+def replace_serial_map(cur, silver_path: str, serial, test_stand, bronze_refs):
+    """Make dbo.SerialBronzeMap hold exactly `bronze_refs` for one silver file."""
+    current = {
+        row[0]: (row[1], row[2])
+        for row in cur.execute(
+            "SELECT bronze_path, serial_number, test_stand FROM dbo.SerialBronzeMap WHERE silver_path = ?",
+            (silver_path,),
+        ).fetchall()
+    }
+    wanted = set(bronze_refs)
+    if set(current) == wanted and all(v == (serial, test_stand) for v in current.values()):
+        return 0, 0, len(wanted)
+
+    # Small per-serial sets: rewriting them whole is simpler than diffing rows
+    cur.execute("DELETE FROM dbo.SerialBronzeMap WHERE silver_path = ?", (silver_path,))
+    if wanted:
+        cur.executemany(
+            "INSERT INTO dbo.SerialBronzeMap(silver_path, bronze_path, serial_number, test_stand) VALUES (?, ?, ?, ?)",
+            [(silver_path, bp, serial, test_stand) for bp in sorted(wanted)],
+        )
+    return len(wanted - set(current)), len(set(current) - wanted), 0
+
+
+def upsert_serial_map(cur, silver_paths):
+    """Refresh the serial -> bronze rows for each silver parquet; returns (added, removed, unchanged)."""
+    added = removed = unchanged = 0
+    for p in silver_paths:
+        p = Path(p)
+        serial, test_stand = read_silver_metadata(p)
+        a, r, u = replace_serial_map(cur, str(p.resolve()), serial, test_stand, read_bronze_refs(p))
+        added += a
+        removed += r
+        unchanged += u
+    return added, removed, unchanged
+
+
+# ---------- bulk (set-based) sync ----------
+
+# Rows per executemany batch into the staging table
+STAGE_BATCH = 10_000
+
+_STAGE = {
+    "mssql": {
+        "name": "#stage_{table}",
+        "drop": "IF OBJECT_ID(N'tempdb..#stage_{table}') IS NOT NULL DROP TABLE #stage_{table}",
+        "create": "CREATE TABLE #stage_{table}({cols}, PRIMARY KEY (file_path))",
+        "type": "NVARCHAR(400)",
+        "meta_type": "NVARCHAR(128)",
+    },
+    "sqlite": {
+        "name": "temp.stage_{table}",
+        "drop": "DROP TABLE IF EXISTS temp.stage_{table}",
+        "create": "CREATE TEMP TABLE stage_{table}({cols}, PRIMARY KEY (file_path))",
+        "type": "TEXT",
+        "meta_type": "TEXT",
+    },
+}
+
+
+def _bulk_merge(cur, dialect: str, table: str, cols: list[str], rows: list[tuple],
+                types: dict[str, str] | None = None):
+    """
+    Upsert rows keyed on file_path (cols[0]) into dbo.<table> with one staged,
+    set-based statement. Returns (inserted, updated, skipped) with the same
+    meaning as the row-by-row upserts. `types` overrides the staging column
+    type for non-text columns.
+    """
+    types = types or {}
+    # Last value wins for duplicate paths, like repeated single upserts
+    rows = list({r[0]: r for r in rows}.values())
+    if not rows:
+        return 0, 0, 0
+
+    st = _STAGE[dialect]
+    stage = st["name"].format(table=table)
+    col_defs = ", ".join(
+        f"{c} {st['type']} NOT NULL" if i == 0 else f"{c} {types.get(c, st['meta_type'])} NULL"
+        for i, c in enumerate(cols)
+    )
+    cur.execute(st["drop"].format(table=table))
+    cur.execute(st["create"].format(table=table, cols=col_defs))
+
+    if hasattr(cur, "fast_executemany"):
+        # pyodbc: send each batch as one parameter array instead of a round-trip per row
+        cur.fast_executemany = True
+    insert_sql = f"INSERT INTO {stage}({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)})"
+    for i in range(0, len(rows), STAGE_BATCH):
+        cur.executemany(insert_sql, rows[i:i + STAGE_BATCH])
+
+    key, vals = cols[0], cols[1:]
+    if dialect == "mssql":
+        sql = f"""
+            MERGE dbo.{table} AS t
+            USING {stage} AS s ON t.{key} = s.{key}
+            WHEN MATCHED AND EXISTS (SELECT {', '.join(f's.{c}' for c in vals)}
+                                     EXCEPT
+                                     SELECT {', '.join(f't.{c}' for c in vals)})
+                THEN UPDATE SET {', '.join(f'{c} = s.{c}' for c in vals)}
+            WHEN NOT MATCHED BY TARGET
+                THEN INSERT ({', '.join(cols)}) VALUES ({', '.join(f's.{c}' for c in cols)})
+            OUTPUT $action;
+        """
+        actions = [r[0] for r in cur.execute(sql).fetchall()]
+        inserted = actions.count("INSERT")
+        updated = actions.count("UPDATE")
+    else:
+        changed = " OR ".join(f"t.{c} IS NOT s.{c}" for c in vals)
+        inserted = cur.execute(
+            f"SELECT COUNT(*) FROM {stage} s WHERE NOT EXISTS (SELECT 1 FROM dbo.{table} t WHERE t.{key} = s.{key})"
+        ).fetchone()[0]
+        updated = cur.execute(
+            f"SELECT COUNT(*) FROM {stage} s JOIN dbo.{table} t ON t.{key} = s.{key} WHERE {changed}"
+        ).fetchone()[0]
+        cur.execute(f"""
+            INSERT INTO dbo.{table}({', '.join(cols)})
+            SELECT {', '.join(cols)} FROM {stage} WHERE true
+            ON CONFLICT({key}) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in vals)}
+            WHERE {' OR '.join(f'{c} IS NOT excluded.{c}' for c in vals)}
+        """)
+
+    cur.execute(st["drop"].format(table=table))
+    return inserted, updated, len(rows) - inserted - updated
+
+
+def silver_rows(silver_paths) -> list[tuple]:
+    rows = []
+    for p in silver_paths:
+        p = Path(p)
+        serial, test_stand = read_silver_metadata(p)
+        rows.append((str(p.resolve()), serial, test_stand))
+    return rows
+
+
+def merge_silver_rows(cur, rows, dialect: str | None = None):
+    return _bulk_merge(cur, dialect or POOL.dialect, "SilverFiles", ["file_path", "serial_number", "test_stand"], rows)
+
+
+def bulk_upsert_silver(cur, silver_paths, dialect: str | None = None):
+    return merge_silver_rows(cur, silver_rows(silver_paths), dialect)
+
+
+# Invalidation events older than this are pruned; app workers poll every few seconds
+INVALIDATION_RETENTION_DAYS = 1
+
+_PRUNE_INVALIDATIONS_SQL = {
+    "mssql": "DELETE FROM dbo.CatalogInvalidations WHERE created_at < DATEADD(day, ?, SYSUTCDATETIME())",
+    "sqlite": "DELETE FROM dbo.CatalogInvalidations WHERE created_at < datetime('now', ? || ' days')",
+}
+
+
+def publish_invalidations(cur, pairs, dialect: str | None = None) -> int:
+    """
+    Tell running app workers that these (serial, stand) pairs changed.
+    (None, None) means "anything may have changed" and clears their caches.
+    """
+    pairs = sorted(set(pairs), key=lambda p: (p[0] or "", p[1] or ""))
+    cur.execute(_PRUNE_INVALIDATIONS_SQL[dialect or POOL.dialect], (-INVALIDATION_RETENTION_DAYS,))
+    if pairs:
+        cur.executemany("INSERT INTO dbo.CatalogInvalidations(serial_number, test_stand) VALUES (?, ?)", pairs)
+    return len(pairs)
+
+
+_BRONZE_COLS = ["file_path", "test_type", "row_count", "byte_size", "column_count", "first_ts", "last_ts"]
+_BRONZE_TYPES = {"row_count": "BIGINT", "byte_size": "BIGINT", "column_count": "INT",
+                 "first_ts": "DATETIME2", "last_ts": "DATETIME2"}
+
+
+def _ts_param(v) -> str | None:
+    """Timestamps travel as ISO text (naive UTC), which both DATETIME2 and SQLite TEXT accept."""
+    if v is None:
+        return None
+    if isinstance(v, datetime) and v.tzinfo is not None:
+        v = v.astimezone(timezone.utc).replace(tzinfo=None)
+    return v.isoformat(sep=" ") if isinstance(v, datetime) else v.isoformat()
+
+
+def merge_bronze_rows(cur, rows, dialect: str | None = None):
+    return _bulk_merge(cur, dialect or POOL.dialect, "BronzeFiles", _BRONZE_COLS, rows, _BRONZE_TYPES)
+
+
+_DELETE_COLUMN_STATS_SQL = {
+    "mssql": """
+        DELETE s FROM dbo.BronzeColumnStats AS s
+        JOIN OPENJSON(?) WITH (file_path NVARCHAR(400) '$') AS p ON s.file_path = p.file_path
+    """,
+    "sqlite": "DELETE FROM dbo.BronzeColumnStats WHERE file_path IN (SELECT value FROM json_each(?))",
+}
+
+
+def replace_column_stats(cur, file_paths, rows, dialect: str | None = None) -> int:
+    """
+    Replace the column statistics of these files with rows of
+    (file_path, column, dtype, null_count, min, max). Returns the rows written.
+    """
+    paths = list(dict.fromkeys(file_paths))
+    if not paths:
+        return 0
+    cur.execute(_DELETE_COLUMN_STATS_SQL[dialect or POOL.dialect], (json.dumps(paths),))
+    if hasattr(cur, "fast_executemany"):
+        cur.fast_executemany = True
+    insert_sql = ("INSERT INTO dbo.BronzeColumnStats(file_path, column_name, dtype, null_count, min_value, max_value) "
+                  "VALUES (?, ?, ?, ?, ?, ?)")
+    for i in range(0, len(rows), STAGE_BATCH):
+        cur.executemany(insert_sql, rows[i:i + STAGE_BATCH])
+    return len(rows)
+
+
+def bulk_upsert_bronze(cur, bronze_paths, dialect: str | None = None):
+    """Reconcile path: reads each footer. Fresh ingests go through sync_catalog's records instead."""
+    rows, stat_rows = [], []
+    for p in bronze_paths:
+        p = Path(p)
+        fp = str(p.resolve())
+        first_ts, last_ts, columns = read_bronze_column_stats(p)
+        rows.append((fp, *read_bronze_stats(p), len(columns) or None, _ts_param(first_ts), _ts_param(last_ts)))
+        stat_rows.extend((fp, *c) for c in columns)
+    result = merge_bronze_rows(cur, rows, dialect)
+    replace_column_stats(cur, [r[0] for r in rows], stat_rows, dialect)
+    return result
+
+
+def sync_catalog(silver_records, bronze_records):
+    """
+    Bulk-upsert what one ingest run just wrote, from the ingest.SilverRecord /
+    ingest.BronzeRecord values it produced. Nothing is re-read from disk; use
+    main() to reconcile files written by earlier runs.
+    """
+    if not silver_records and not bronze_records:
+        print("[OK] catalog: nothing changed")
+        return
+
+    cn = get_connection()
+    cur = cn.cursor()
+
+    ensure_tables(cur)
+    silver = [(str(Path(r.path).resolve()), r.serial, r.test_stand) for r in silver_records]
+    bronze = [
+        (str(Path(r.path).resolve()), r.test_type, r.row_count, r.byte_size,
+         len(r.columns) or None, _ts_param(r.first_ts), _ts_param(r.last_ts))
+        for r in bronze_records
+    ]
+    stat_rows = [
+        (fp, c.name, c.dtype, c.null_count, c.min_value, c.max_value)
+        for (fp, *_), r in zip(bronze, bronze_records) for c in r.columns
+    ]
+    new_s, upd_s, skip_s = merge_silver_rows(cur, silver)
+    new_b, upd_b, skip_b = merge_bronze_rows(cur, bronze)
+    n_stats = replace_column_stats(cur, [row[0] for row in bronze], stat_rows)
+    add_m = del_m = same_m = 0
+    for (fp, serial, stand), r in zip(silver, silver_records):
+        # Same strings build_silver writes to the silver's bronze_path column
+        a, d, u = replace_serial_map(cur, fp, serial, stand, [str(p) for p in r.bronze_paths])
+        add_m += a
+        del_m += d
+        same_m += u
+    sent = publish_invalidations(cur, [(serial, stand) for _, serial, stand in silver])
+
+    cn.commit()
+    cur.close()
+    cn.close()
+
+    print(f"[OK] inserted {new_s}, updated {upd_s}, skipped {skip_s}")
+    print(f"[OK] bronze: inserted {new_b}, updated {upd_b}, skipped {skip_b}")
+    print(f"[OK] column statistics: {n_stats} row(s) for {len(bronze)} file(s)")
+    print(f"[OK] serial map: added {add_m}, removed {del_m}, unchanged {same_m}")
+    print(f"[OK] published {sent} cache invalidation(s)")
+
+
 # ---------- original behavior preserved ----------
 
-def main(silver_root: str = SILVER_ROOT, bronze_root: str = BRONZE_ROOT):
+# Full reconcile: reads every footer, so it also picks up files written outside sync_catalog
+def main(silver_root: str = SILVER_ROOT, bronze_root: str = BRONZE_ROOT, bulk: bool = True):
 
     cn = get_connection()
     cur = cn.cursor()
@@ -141,8 +667,15 @@ def main(silver_root: str = SILVER_ROOT, bronze_root: str = BRONZE_ROOT):
     silver_paths = sorted(Path(silver_root).rglob("*.parquet"))
     bronze_paths = sorted(Path(bronze_root).rglob("*.parquet"))
 
-    new_s, upd_s, skip_s = upsert_silver(cur, silver_paths)
-    new_b, upd_b, skip_b = upsert_bronze(cur, bronze_paths)
+    if bulk:
+        new_s, upd_s, skip_s = bulk_upsert_silver(cur, silver_paths)
+        new_b, upd_b, skip_b = bulk_upsert_bronze(cur, bronze_paths)
+    else:
+        new_s, upd_s, skip_s = upsert_silver(cur, silver_paths)
+        new_b, upd_b, skip_b = upsert_bronze(cur, bronze_paths)
+    add_m, del_m, same_m = upsert_serial_map(cur, silver_paths)
+    # A full reconcile can touch anything: have app workers drop all cached lookups
+    publish_invalidations(cur, [(None, None)])
 
     cn.commit()
     cur.close()
@@ -150,7 +683,9 @@ def main(silver_root: str = SILVER_ROOT, bronze_root: str = BRONZE_ROOT):
 
     print(f"[OK] inserted {new_s}, updated {upd_s}, skipped {skip_s}")
     print(f"[OK] bronze: inserted {new_b}, updated {upd_b}, skipped {skip_b}")
+    print(f"[OK] serial map: added {add_m}, removed {del_m}, unchanged {same_m}")
 
 
 if __name__ == "__main__":
-    main()
+    # --rowwise: the original SELECT-then-INSERT/UPDATE per file
+    main(bulk="--rowwise" not in sys.argv[1:])
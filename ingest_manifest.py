@@ -0,0 +1,131 @@
+# ingest_manifest.py
+import hashlib
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from ingest import BASE_DIR
+
+MANIFEST_PATH = BASE_DIR / "ingest_manifest.sqlite"
+HASH_CHUNK = 1 << 20
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    size: int
+    mtime_ns: int
+    content_hash: str | None = None
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(HASH_CHUNK)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+class IngestManifest:
+    """
+    Persistent record of every source CSV the ingest has converted: size,
+    mtime and (optionally) a content hash, plus the bronze parquet it produced.
+    A file is reconverted only when its fingerprint changes, so a re-run over
+    an unchanged archive only pays for listing and stat() calls.
+
+    hash_content=True also hashes files whose size/mtime changed, so a file
+    that was only touched or re-copied with the same bytes is not reconverted.
+    """
+
+    def __init__(self, path: Path | str = MANIFEST_PATH, hash_content: bool = False):
+        self.path = Path(path)
+        self.hash_content = hash_content
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._cn = sqlite3.connect(str(self.path))
+        self._cn.execute("""
+            CREATE TABLE IF NOT EXISTS sources(
+                source_path  TEXT NOT NULL PRIMARY KEY,
+                serial       TEXT NOT NULL,
+                test_stand   TEXT NOT NULL,
+                size         INTEGER NOT NULL,
+                mtime_ns     INTEGER NOT NULL,
+                content_hash TEXT NULL,
+                output_path  TEXT NULL,
+                ingested_at  REAL NOT NULL
+            )
+        """)
+        self._cn.execute("CREATE INDEX IF NOT EXISTS ix_sources_serial ON sources(test_stand, serial)")
+        self._cn.commit()
+
+    def close(self) -> None:
+        self._cn.commit()
+        self._cn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    # ---------- lookups ----------
+    def entries_for(self, serial: str, test_stand: str) -> dict[str, tuple]:
+        rows = self._cn.execute(
+            "SELECT source_path, size, mtime_ns, content_hash, output_path FROM sources WHERE test_stand = ? AND serial = ?",
+            (test_stand, serial),
+        ).fetchall()
+        return {r[0]: r[1:] for r in rows}
+
+    def changed(self, csv_path: Path, entry: tuple | None, expected_output: Path) -> tuple[bool, Fingerprint]:
+        """Compare a CSV against its manifest entry. Returns (needs conversion, current fingerprint)."""
+        st = csv_path.stat()
+        fp = Fingerprint(st.st_size, st.st_mtime_ns)
+        if entry is None:
+            # Not seen before. An output newer than the CSV was written by a run
+            # that predates the manifest, so adopt it rather than reconvert.
+            try:
+                if expected_output.stat().st_mtime_ns >= st.st_mtime_ns:
+                    return False, self._with_hash(csv_path, fp)
+            except OSError:
+                pass
+            return True, self._with_hash(csv_path, fp)
+
+        size, mtime_ns, content_hash, output_path = entry
+        if output_path is not None and not Path(output_path).exists():
+            return True, self._with_hash(csv_path, fp)
+        # A CSV that failed to convert (no output) is retried only once it changes
+        if size == fp.size and mtime_ns == fp.mtime_ns:
+            return False, Fingerprint(size, mtime_ns, content_hash)
+        if self.hash_content and content_hash is not None:
+            fp = self._with_hash(csv_path, fp)
+            return fp.content_hash != content_hash, fp
+        return True, self._with_hash(csv_path, fp)
+
+    def _with_hash(self, csv_path: Path, fp: Fingerprint) -> Fingerprint:
+        if not self.hash_content:
+            return fp
+        return Fingerprint(fp.size, fp.mtime_ns, file_hash(csv_path))
+
+    # ---------- updates ----------
+    def record(self, csv_path: Path, serial: str, test_stand: str, fp: Fingerprint, output_path: Path | None) -> None:
+        self._cn.execute(
+            """
+            INSERT INTO sources(source_path, serial, test_stand, size, mtime_ns, content_hash, output_path, ingested_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(source_path) DO UPDATE SET
+                serial = excluded.serial, test_stand = excluded.test_stand,
+                size = excluded.size, mtime_ns = excluded.mtime_ns,
+                content_hash = excluded.content_hash, output_path = excluded.output_path,
+                ingested_at = excluded.ingested_at
+            """,
+            (str(csv_path), serial, test_stand, fp.size, fp.mtime_ns, fp.content_hash,
+             str(output_path) if output_path is not None else None, time.time()),
+        )
+
+    def forget(self, source_paths) -> None:
+        self._cn.executemany("DELETE FROM sources WHERE source_path = ?", [(str(p),) for p in source_paths])
+
+    def commit(self) -> None:
+        self._cn.commit()
@@ -0,0 +1,173 @@
+# ingest_parallel.py
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from ingest import (BRONZE_ROOT, BronzeRecord, SilverRecord, bronze_path_for, build_silver_record,
+                    list_csvs, read_bronze_record, write_bronze_record)
+
+# Worker processes for CSV -> parquet conversion (override with INGEST_WORKERS)
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", 0)) or (os.cpu_count() or 1)
+# Tasks queued per worker; bounds memory when a run covers millions of files
+QUEUE_PER_WORKER = 4
+# Fresh pools to try after a worker dies mid-run (OOM, crash in a native reader)
+POOL_RESTARTS = 2
+
+
+@dataclass
+class SerialJob:
+    serial: str
+    test_stand: str
+    in_dir: Path
+
+
+@dataclass
+class IngestResult:
+    silver: list[SilverRecord] = field(default_factory=list)
+    bronze: list[BronzeRecord] = field(default_factory=list)
+    failed: list[Path] = field(default_factory=list)
+
+
+def _convert(csv_path: Path, test_stand: str, bronze_root: Path):
+    # Top-level so it pickles into worker processes. write_bronze_record already
+    # logs and returns None on bad input; this also contains anything unexpected.
+    try:
+        return write_bronze_record(csv_path, test_stand, bronze_root), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def _run_tasks(tasks: list[tuple], workers: int) -> dict[int, BronzeRecord | None]:
+    """Run (csv, stand, bronze_root) tasks on a process pool; returns {task index: record or None}."""
+    results: dict[int, BronzeRecord | None] = {}
+    if len(tasks) == 1:
+        # One file (an event-driven update): starting a pool would cost more than the conversion
+        out, err = _convert(*tasks[0])
+        if err:
+            print(f"[WARN] Conversion failed on {tasks[0][0]}: {err}")
+        results[0] = out
+        return results
+    pending = list(range(len(tasks)))
+    restarts = 0
+
+    while pending:
+        todo = list(reversed(pending))
+        in_flight = {}
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                while todo or in_flight:
+                    while todo and len(in_flight) < workers * QUEUE_PER_WORKER:
+                        i = todo.pop()
+                        in_flight[ex.submit(_convert, *tasks[i])] = i
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        i = in_flight.pop(fut)
+                        out, err = fut.result()
+                        if err:
+                            print(f"[WARN] Worker failed on {tasks[i][0]}: {err}")
+                        results[i] = out
+            pending = []
+        except BrokenProcessPool as e:
+            pending = sorted(i for i in range(len(tasks)) if i not in results)
+            restarts += 1
+            if restarts > POOL_RESTARTS:
+                print(f"[ERROR] Worker pool broke {restarts} times ({e}); giving up on {len(pending)} file(s)")
+                for i in pending:
+                    results[i] = None
+                pending = []
+            else:
+                print(f"[WARN] Worker pool broke ({e}); restarting for {len(pending)} remaining file(s)")
+    return results
+
+
+def ingest_serial_dirs(jobs: list[SerialJob], workers: int = INGEST_WORKERS,
+                       bronze_root: Path = BRONZE_ROOT, manifest=None) -> IngestResult:
+    """
+    Convert the CSVs under the given serial directories on `workers` processes,
+    then build each serial's silver parquet in the parent.
+
+    Output is the same as running write_bronze_parquets + build_silver serially
+    over the jobs in order. When two CSVs map to the same bronze path, only the
+    later one is converted, which is the one a serial run would have left on disk.
+
+    With an ingest_manifest.IngestManifest only new or changed CSVs are
+    converted, and only serials with converted, adopted or deleted CSVs get a
+    new silver file. IngestResult then lists just those silver files and the
+    bronze files written or adopted in this run, as records ready for
+    ingest_SQL.sync_catalog.
+    """
+    bronze_root.mkdir(parents=True, exist_ok=True)
+    plan: list[tuple[SerialJob, list[tuple], bool]] = []
+    owner: dict[Path, int] = {}
+    tasks: list[tuple] = []
+    unchanged = 0
+    for job in jobs:
+        known = manifest.entries_for(job.serial, job.test_stand) if manifest is not None else {}
+        dirty = manifest is None
+        files = []
+        for csv_path in list_csvs(job.in_dir):
+            target = bronze_path_for(csv_path, job.test_stand, bronze_root)
+            entry = known.pop(str(csv_path), None)
+            if manifest is None:
+                need, fp = True, None
+            else:
+                need, fp = manifest.changed(csv_path, entry, target)
+            adopted = False
+            if need:
+                if target in owner:
+                    tasks[owner[target]] = (csv_path, job.test_stand, bronze_root)
+                else:
+                    owner[target] = len(tasks)
+                    tasks.append((csv_path, job.test_stand, bronze_root))
+                dirty = True
+                output = None
+            elif entry is None:
+                # Output from before the manifest existed: adopt it as-is
+                manifest.record(csv_path, job.serial, job.test_stand, fp, target)
+                dirty = True
+                adopted = True
+                output = target
+            else:
+                unchanged += 1
+                output = Path(entry[3]) if entry[3] is not None else None
+            files.append((csv_path, target, need, fp, output, adopted))
+        if known:
+            # CSVs that disappeared from the source folder
+            manifest.forget(known)
+            dirty = True
+        plan.append((job, files, dirty))
+
+    results = _run_tasks(tasks, max(1, workers)) if tasks else {}
+
+    out = IngestResult()
+    for job, files, dirty in plan:
+        if not dirty:
+            continue
+        bronze_list = []
+        for csv_path, target, need, fp, output, adopted in files:
+            if adopted:
+                # Never catalogued by a run that kept records: take its row from the footer
+                record = read_bronze_record(output, job.test_stand, job.serial)
+                if record is not None:
+                    out.bronze.append(record)
+            if need:
+                record = results.get(owner[target])
+                output = record.path if record is not None else None
+                if manifest is not None:
+                    manifest.record(csv_path, job.serial, job.test_stand, fp, output)
+                if record is None:
+                    out.failed.append(csv_path)
+                    continue
+                record.serial = job.serial
+                out.bronze.append(record)
+            if output is not None and output not in bronze_list:
+                bronze_list.append(output)
+        out.silver.append(build_silver_record(job.serial, bronze_list, job.test_stand))
+    if manifest is not None:
+        manifest.commit()
+
+    converted = len(tasks) - sum(1 for r in results.values() if r is None)
+    print(f"[OK] converted {converted}/{len(tasks)} CSVs ({unchanged} unchanged), "
+          f"rebuilt {len(out.silver)}/{len(jobs)} silver file(s) on {workers} worker(s)")
+    return out
@@ -1,13 +1,25 @@
 import os
+import queue
+import sys
+import threading
+import time
 from pathlib import Path
-from ingest import build_silver, read_serial_number, write_bronze_parquets
-from ingest_SQL import get_connection, ensure_tables, upsert_silver, upsert_bronze
+from ingest_parallel import INGEST_WORKERS, SerialJob, ingest_serial_dirs
+from ingest_manifest import IngestManifest
+from ingest_SQL import sync_catalog
 
+STAGE_DIR = "input_directory_here"
+# Events arriving this soon after the first one are ingested in the same batch
+SETTLE_SECONDS = 1.0
+QUEUE_POLL_SECONDS = 1.0
+# A fully ingested queue file this big is rotated away instead of growing forever
+QUEUE_ROTATE_BYTES = 1 << 20
+# Event batches touch a few serials; keep most cores for the app
+CONSUMER_WORKERS = 2
 
-def ingest_stage():
-    in_dir = "input_directory_here"
-    silver_list = []
-    bronze_all = []
+
+def ingest_stage(workers: int = INGEST_WORKERS, in_dir: str = STAGE_DIR):
+    jobs: list[SerialJob] = []
     for test_stand_dir in os.listdir(in_dir):
         test_stand = str(test_stand_dir)
         stand_path = os.path.join(in_dir, test_stand)
@@ -18,30 +30,248 @@ def ingest_stage():
             if not os.path.isdir(serial_path):
                 continue
 
-            serial_path = Path(serial_path)
-            bronze_list = write_bronze_parquets(serial_path, test_stand)
-            silver = build_silver(serial_dir, bronze_list, test_stand)
-            silver_list.append(silver)
-            bronze_all.extend(bronze_list)
+            jobs.append(SerialJob(serial_dir, test_stand, Path(serial_path)))
 
-            
+    # Convert only new/changed CSVs on a process pool, then upsert what changed in one batch
+    with IngestManifest() as manifest:
+        result = ingest_serial_dirs(jobs, workers, manifest=manifest)
+    sync_catalog(result.silver, result.bronze)
 
-    cn = get_connection()
-    cur = cn.cursor()
+    #for object in os.listdir(in_dir):
+    #    shutil.rmtree(os.path.join(in_dir, object), ignore_errors=True)
 
-    ensure_tables(cur)
-    new_s, upd_s, skip_s = upsert_silver(cur, silver_list)
-    new_b, upd_b, skip_b = upsert_bronze(cur, bronze_all)
 
-    cn.commit()
-    cur.close()
-    cn.close()
+class StagingConsumer:
+    """
+    Long-running alternative to ingest_stage: takes file-ready events
+    (paths of CSVs under <in_dir>/<test stand>/<serial>/) and re-ingests only
+    the serial folders they belong to. The manifest limits that to the CSVs
+    that actually changed; the serial's silver file, catalog rows and app
+    cache invalidations follow through sync_catalog as in a batch run.
+    """
+
+    def __init__(self, in_dir: str = STAGE_DIR, workers: int = CONSUMER_WORKERS,
+                 settle_seconds: float = SETTLE_SECONDS):
+        self.in_dir = Path(in_dir).resolve()
+        self.workers = workers
+        self.settle_seconds = settle_seconds
+        self._events: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.events = 0
+        self.ignored = 0
+        self.batches = 0
+        self.serials = 0
+        self.failed_batches = 0
+        self.last_lag_seconds: float | None = None
+
+    def job_for(self, path) -> SerialJob | None:
+        p = Path(path).resolve()
+        try:
+            rel = p.relative_to(self.in_dir)
+        except ValueError:
+            return None
+        # ingest only lists CSVs directly inside a serial folder
+        if len(rel.parts) != 3 or p.suffix.lower() != ".csv":
+            return None
+        test_stand, serial = rel.parts[0], rel.parts[1]
+        return SerialJob(serial, test_stand, self.in_dir / test_stand / serial)
+
+    def ingest_paths(self, paths) -> int:
+        """Ingest the serial folders these CSV paths belong to. Returns the number of serials."""
+        jobs: dict[tuple[str, str], SerialJob] = {}
+        for p in paths:
+            job = self.job_for(p)
+            if job is None:
+                self.ignored += 1
+                continue
+            jobs[(job.test_stand, job.serial)] = job
+        if not jobs:
+            return 0
+        with IngestManifest() as manifest:
+            result = ingest_serial_dirs(list(jobs.values()), self.workers, manifest=manifest)
+        sync_catalog(result.silver, result.bronze)
+        self.batches += 1
+        self.serials += len(jobs)
+        return len(jobs)
+
+    # ---------- in-process events (watchdog mirror on_ready) ----------
+    def notify(self, path) -> None:
+        """Queue a file-ready event; safe to call from any thread and never blocks."""
+        self.events += 1
+        self._events.put((str(path), time.monotonic()))
+
+    def start(self) -> "StagingConsumer":
+        self._thread = threading.Thread(target=self._run, name="staging-consumer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the consumer thread once the events already queued are ingested."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                batch = [self._events.get(timeout=0.5)]
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            # A test usually writes several files at once: take the burst as one batch
+            deadline = time.monotonic() + self.settle_seconds
+            while True:
+                try:
+                    if self._stop.is_set():
+                        # Stopping: take what is queued without waiting for more
+                        batch.append(self._events.get_nowait())
+                        continue
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        break
+                    batch.append(self._events.get(timeout=left))
+                except queue.Empty:
+                    break
+            first = min(t for _, t in batch)
+            try:
+                n = self.ingest_paths([p for p, _ in batch])
+            except Exception as e:
+                # The next event for the serial, or a batch ingest_stage run, picks it up
+                self.failed_batches += 1
+                print(f"[ERROR] staging batch of {len(batch)} event(s) failed: {e}")
+                continue
+            if n:
+                self.last_lag_seconds = time.monotonic() - first
+                print(f"[OK] staged {n} serial(s) {self.last_lag_seconds:.1f}s after the first event")
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._events.qsize(),
+            "events": self.events,
+            "ignored": self.ignored,
+            "batches": self.batches,
+            "serials": self.serials,
+            "failed_batches": self.failed_batches,
+            "last_lag_seconds": self.last_lag_seconds,
+        }
+
+
+# ---------- queue file (mirror and consumer in different processes) ----------
+_APPEND_LOCK = threading.Lock()
+
+
+def append_ready_event(queue_file: str, path: str) -> None:
+    """Producer side: one ready file per line. Opened per event, so rotation needs no coordination."""
+    with _APPEND_LOCK, open(queue_file, "a", encoding="utf-8") as f:
+        f.write(f"{path}\n")
+
+
+def _ingest_lines(consumer: StagingConsumer, path: Path, offset: int) -> int:
+    """Ingest the complete lines of `path` after byte `offset`; returns the offset past them."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    # Only complete lines; a half-written one is read on the next pass
+    end = data.rfind(b"\n") + 1
+    if end:
+        lines = data[:end].decode("utf-8").splitlines()
+        consumer.events += len(lines)
+        consumer.ingest_paths([line.strip() for line in lines if line.strip()])
+    return offset + end
+
+
+def _finish_rotated(consumer: StagingConsumer, rotated: Path, offset: int, offset_file: Path,
+                    poll_seconds: float) -> None:
+    """
+    Ingest what was appended to a rotated queue file after `offset` (a producer that
+    opened it just before the rename), then remove it. The offset is reset first, so
+    a crash in between replays the rotated file instead of skipping the new one.
+    """
+    time.sleep(poll_seconds)
+    while True:
+        try:
+            _ingest_lines(consumer, rotated, offset)
+            break
+        except Exception as e:
+            consumer.failed_batches += 1
+            print(f"[ERROR] staging batch from {rotated.name} failed, retrying: {e}")
+            time.sleep(poll_seconds)
+    offset_file.write_text("0")
+    rotated.unlink()
+
+
+def follow_queue_file(consumer: StagingConsumer, queue_file: str, poll_seconds: float = QUEUE_POLL_SECONDS,
+                      rotate_bytes: int = QUEUE_ROTATE_BYTES):
+    """
+    Tail `queue_file` and ingest new lines batch by batch. The read offset is
+    saved next to it only after a batch is in the catalog, so a restart
+    replays at most the batch in progress (harmless: the manifest skips
+    CSVs that are already converted). Once everything in the file is
+    ingested and it has reached `rotate_bytes`, it is renamed aside and
+    removed, and producers start a new one.
+    """
+    queue_file = Path(queue_file)
+    offset_file = queue_file.with_name(queue_file.name + ".offset")
+    rotated = queue_file.with_name(queue_file.name + ".rotated")
+    offset = int(offset_file.read_text() or 0) if offset_file.exists() else 0
+    if rotated.exists():
+        # Stopped while finishing a rotation: the saved offset is into the rotated file
+        _finish_rotated(consumer, rotated, offset, offset_file, poll_seconds)
+        offset = 0
+    print(f"Following {queue_file} from byte {offset}")
+    while True:
+        size = queue_file.stat().st_size if queue_file.exists() else 0
+        if size < offset:
+            print(f"[WARN] {queue_file} shrank; starting over from the beginning")
+            offset = 0
+        if size > offset:
+            try:
+                end = _ingest_lines(consumer, queue_file, offset)
+            except Exception as e:
+                consumer.failed_batches += 1
+                print(f"[ERROR] staging batch from {queue_file.name} failed, retrying: {e}")
+                time.sleep(poll_seconds)
+                continue
+            if end > offset:
+                offset = end
+                offset_file.write_text(str(offset))
+                continue
+        elif offset >= rotate_bytes:
+            try:
+                os.replace(queue_file, rotated)
+            except OSError as e:
+                # Windows: a producer has it open right now; try on a later pass
+                print(f"[WARN] Could not rotate {queue_file}: {e}")
+            else:
+                _finish_rotated(consumer, rotated, offset, offset_file, poll_seconds)
+                offset = 0
+                continue
+        time.sleep(poll_seconds)
 
-    #for object in os.listdir(in_dir):
-    #    shutil.rmtree(os.path.join(in_dir, object), ignore_errors=True)
 
 def main():
-    ingest_stage()
+    args = sys.argv[1:]
+    if "--follow" in args:
+        # Events appended by a mirror running elsewhere (watchdog_test.py --queue-file)
+        i = args.index("--follow") + 1
+        if i >= len(args):
+            print("usage: ingest_staging_dir.py --follow QUEUE_FILE")
+            return
+        follow_queue_file(StagingConsumer(), args[i])
+    elif "--mirror" in args:
+        # Mirror and consumer in one process: each completed copy is queued directly
+        import watchdog_test
+        consumer = StagingConsumer(watchdog_test.destination).start()
+        try:
+            watchdog_test.main(watchdog_test.watch_dirs, watchdog_test.destination,
+                               on_ready=lambda src, dest: consumer.notify(dest))
+        finally:
+            consumer.stop()
+            print(f"[OK] staging: {consumer.stats()}")
+    else:
+        ingest_stage()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
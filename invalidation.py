@@ -0,0 +1,102 @@
+# invalidation.py
+import threading
+from typing import Callable
+
+# How often app workers poll dbo.CatalogInvalidations
+POLL_SECONDS = 5.0
+# event_id comes from an IDENTITY, which is assigned at insert, not at commit:
+# with two ingest writers (or RCSI) a lower id can become visible after a
+# higher one. Each poll re-reads this many ids below the watermark and skips
+# the ones already handled, so a late commit is still delivered.
+REREAD_EVENTS = 1000
+
+_LATEST_SQL = "SELECT COALESCE(MAX(event_id), 0) FROM dbo.CatalogInvalidations"
+_EVENTS_SQL = """
+    SELECT event_id, serial_number, test_stand
+    FROM dbo.CatalogInvalidations
+    WHERE event_id > ?
+    ORDER BY event_id
+"""
+
+
+class InvalidationListener:
+    """
+    Receives "serial/stand changed" events that ingest writes to
+    dbo.CatalogInvalidations. The ingest usually runs on another host, so the
+    catalog database is the channel every app worker can see. Each worker
+    polls for events past its own watermark (minus a re-read window for
+    out-of-order commits) and calls its subscribers once per event with
+    (serial, stand).
+    """
+
+    def __init__(self, connect: Callable, poll_seconds: float = POLL_SECONDS):
+        self._connect = connect
+        self.poll_seconds = poll_seconds
+        self._subscribers: list[Callable[[str | None, str | None], object]] = []
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.watermark: int | None = None
+        self._seen: set[int] = set()  # handled ids within REREAD_EVENTS of the watermark
+        self.received = 0
+        self.late = 0
+        self.errors = 0
+
+    def subscribe(self, fn: Callable[[str | None, str | None], object]) -> None:
+        self._subscribers.append(fn)
+
+    def poll(self) -> int:
+        """Fetch and dispatch new events; returns how many were handled."""
+        with self._lock:
+            with self._connect() as cn:
+                cur = cn.cursor()
+                if self.watermark is None:
+                    # Nothing is cached before the first poll, so start from "now"
+                    self.watermark = cur.execute(_LATEST_SQL).fetchone()[0] or 0
+                    self._seen = {row[0] for row in cur.execute(
+                        _EVENTS_SQL, (self.watermark - REREAD_EVENTS,)).fetchall()}
+                    return 0
+                rows = cur.execute(_EVENTS_SQL, (self.watermark - REREAD_EVENTS,)).fetchall()
+            rows = [row for row in rows if row[0] not in self._seen]
+            for event_id, serial, stand in rows:
+                self._seen.add(event_id)
+                if event_id < self.watermark:
+                    self.late += 1
+                self.watermark = max(self.watermark, event_id)
+                for fn in self._subscribers:
+                    try:
+                        fn(serial, stand)
+                    except Exception as e:
+                        print(f"[WARN] invalidation subscriber failed for {serial} ({stand}): {e}")
+            floor = self.watermark - REREAD_EVENTS
+            self._seen = {i for i in self._seen if i > floor}
+            self.received += len(rows)
+            return len(rows)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                self.errors += 1
+                print(f"[WARN] invalidation poll failed: {e}")
+            self._stop.wait(self.poll_seconds)
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="invalidations", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> dict:
+        return {
+            "watermark": self.watermark,
+            "received": self.received,
+            "late": self.late,
+            "errors": self.errors,
+            "poll_seconds": self.poll_seconds,
+            "running": bool(self._thread and self._thread.is_alive()),
+        }
@@ -0,0 +1,50 @@
+# migrate_serial_bronze_map.py
+# One-shot backfill of dbo.SerialBronzeMap from the silver parquets already in dbo.SilverFiles.
+# Safe to re-run: silver files whose mapping already matches are skipped.
+from pathlib import Path
+from ingest_SQL import get_connection, ensure_tables, read_silver_metadata, read_bronze_refs, replace_serial_map
+
+COMMIT_EVERY = 500
+
+
+def main() -> None:
+    cn = get_connection()
+    cur = cn.cursor()
+
+    ensure_tables(cur)
+    cn.commit()
+
+    rows = cur.execute(
+        "SELECT file_path, serial_number, test_stand FROM dbo.SilverFiles ORDER BY file_path"
+    ).fetchall()
+    print(f"Backfilling serial map from {len(rows)} silver files")
+
+    added = removed = unchanged = missing = 0
+    for i, (file_path, serial, test_stand) in enumerate(rows, start=1):
+        p = Path(file_path)
+        if not p.exists():
+            print(f"[SKIP] Silver file not found: {file_path}")
+            missing += 1
+            continue
+        # Prefer the catalog's serial/stand; fall back to the parquet metadata
+        if serial is None or test_stand is None:
+            meta_serial, meta_stand = read_silver_metadata(p)
+            serial = serial or meta_serial
+            test_stand = test_stand or meta_stand
+
+        a, r, u = replace_serial_map(cur, file_path, serial, test_stand, read_bronze_refs(p))
+        added += a
+        removed += r
+        unchanged += u
+        if i % COMMIT_EVERY == 0:
+            cn.commit()
+            print(f"  {i}/{len(rows)} silver files")
+
+    cn.commit()
+    cur.close()
+    cn.close()
+    print(f"[OK] serial map: added {added}, removed {removed}, unchanged {unchanged}, missing silver {missing}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+# preview.py
+import math
+import re
+from datetime import date, datetime
+import polars as pl
+from export import CompactedLocation, scan_bronze
+
+PREVIEW_ROWS = 50
+MAX_PREVIEW_ROWS = 1000
+
+
+class PreviewError(ValueError):
+    """Bad column list or filter expression; the message is safe to show to the user."""
+
+
+# ---------- filter expressions ----------
+#
+#   time >= 10 and time < 20
+#   `Step Name` == 'Soak' or (temp > 85.5 and not valid == false)
+#   comment is not null
+#
+# Columns are bare names or `backquoted`; literals are numbers, quoted strings,
+# true/false. Nothing is evaluated: the text is parsed straight into a polars
+# expression, so it can only compare columns that exist in the file.
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<num>-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)
+      | '(?P<sq>(?:[^'\\]|\\.)*)'
+      | "(?P<dq>(?:[^"\\]|\\.)*)"
+      | `(?P<bq>[^`]+)`
+      | (?P<op>==|!=|<=|>=|=|<|>|\(|\))
+      | (?P<word>[A-Za-z_][A-Za-z0-9_.]*)
+    )""", re.VERBOSE)
+
+_COMPARE = {
+    "==": lambda c, v: c == v, "=": lambda c, v: c == v, "!=": lambda c, v: c != v,
+    "<": lambda c, v: c < v, "<=": lambda c, v: c <= v,
+    ">": lambda c, v: c > v, ">=": lambda c, v: c >= v,
+}
+
+
+def _tokenize(text: str) -> list[tuple[str, str]]:
+    tokens, pos = [], 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if m is None or m.end() == pos:
+            raise PreviewError(f"Unexpected input at position {pos}: {text[pos:pos + 12]!r}")
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind in ("sq", "dq"):
+            kind, value = "str", re.sub(r"\\(.)", r"\1", value)
+        elif kind == "bq":
+            kind = "ident"
+        elif kind == "word":
+            low = value.lower()
+            kind, value = ("kw", low) if low in ("and", "or", "not", "is", "null", "true", "false") else ("ident", value)
+        tokens.append((kind, value))
+        pos = m.end()
+    return tokens
+
+
+class _Parser:
+    """Builds a polars expression; _StatsParser reuses the grammar to evaluate file statistics."""
+
+    def __init__(self, tokens: list[tuple[str, str]], schema: pl.Schema | None):
+        self.tokens = tokens
+        self.i = 0
+        self.schema = schema
+
+    def peek(self) -> tuple[str, str] | None:
+        return self.tokens[self.i] if self.i < len(self.tokens) else None
+
+    def take(self, kind: str | None = None, value: str | None = None) -> tuple[str, str]:
+        tok = self.peek()
+        if tok is None or (kind and tok[0] != kind) or (value and tok[1] != value):
+            want = value or kind or "more input"
+            raise PreviewError(f"Expected {want}, got {tok[1] if tok else 'end of filter'!r}")
+        self.i += 1
+        return tok
+
+    def accept(self, kind: str, value: str) -> bool:
+        if self.peek() == (kind, value):
+            self.i += 1
+            return True
+        return False
+
+    def parse(self) -> pl.Expr:
+        expr = self.expr()
+        if self.peek() is not None:
+            raise PreviewError(f"Unexpected {self.peek()[1]!r}")
+        return expr
+
+    def expr(self) -> pl.Expr:
+        out = self.term()
+        while self.accept("kw", "or"):
+            out = self.either(out, self.term())
+        return out
+
+    def term(self) -> pl.Expr:
+        out = self.factor()
+        while self.accept("kw", "and"):
+            out = self.both(out, self.factor())
+        return out
+
+    def factor(self) -> pl.Expr:
+        if self.accept("kw", "not"):
+            return self.negate(self.factor())
+        if self.accept("op", "("):
+            inner = self.expr()
+            self.take("op", ")")
+            return inner
+        return self.comparison()
+
+    def comparison(self) -> pl.Expr:
+        name = self.take("ident")[1]
+        if self.schema is not None and name not in self.schema:
+            raise PreviewError(f"Unknown column {name!r}")
+        if self.accept("kw", "is"):
+            negate = self.accept("kw", "not")
+            self.take("kw", "null")
+            return self.is_null(name, negate)
+        op = self.take("op")[1]
+        if op not in _COMPARE:
+            raise PreviewError(f"Expected a comparison after {name!r}, got {op!r}")
+        return self.compare(name, op, self.take())
+
+    # Building blocks; _StatsParser overrides them
+
+    def either(self, a: pl.Expr, b: pl.Expr) -> pl.Expr:
+        return a | b
+
+    def both(self, a: pl.Expr, b: pl.Expr) -> pl.Expr:
+        return a & b
+
+    def negate(self, a: pl.Expr) -> pl.Expr:
+        return ~a
+
+    def is_null(self, name: str, negate: bool) -> pl.Expr:
+        return pl.col(name).is_not_null() if negate else pl.col(name).is_null()
+
+    def compare(self, name: str, op: str, token: tuple[str, str]) -> pl.Expr:
+        return _COMPARE[op](pl.col(name), self.literal(token, self.schema[name]))
+
+    def literal(self, token: tuple[str, str], dtype) -> pl.Expr:
+        kind, value = token
+        if kind == "num":
+            return pl.lit(float(value) if any(ch in value for ch in ".eE") else int(value))
+        if kind == "kw" and value in ("true", "false"):
+            return pl.lit(value == "true")
+        if kind == "str":
+            # Time windows: compare temporal columns against parsed timestamps, not text.
+            # Parsed here, so a malformed one is a bad filter rather than a failed read.
+            if dtype == pl.Date:
+                try:
+                    return pl.lit(date.fromisoformat(value))
+                except ValueError:
+                    raise PreviewError(f"Expected a date like 2024-01-31, got {value!r}") from None
+            if isinstance(dtype, pl.Datetime):
+                try:
+                    return pl.lit(datetime.fromisoformat(value)).cast(dtype)
+                except ValueError:
+                    raise PreviewError(f"Expected a timestamp like 2024-01-31 12:00:00, got {value!r}") from None
+            return pl.lit(value)
+        raise PreviewError(f"Expected a value, got {value!r}")
+
+
+def parse_filter(text: str, schema: pl.Schema) -> pl.Expr | None:
+    tokens = _tokenize(text or "")
+    return _Parser(tokens, schema).parse() if tokens else None
+
+
+# ---------- pruning by catalog statistics ----------
+
+class _StatsParser(_Parser):
+    """
+    Same grammar, evaluated against one file's column statistics
+    {column: (null_count, min, max)}: False only if no row of the file can match.
+    """
+
+    def __init__(self, tokens: list[tuple[str, str]], stats: dict[str, tuple], keep: frozenset):
+        super().__init__(tokens, None)
+        self.stats = stats
+        self.keep = keep
+
+    def either(self, a: bool, b: bool) -> bool:
+        return a or b
+
+    def both(self, a: bool, b: bool) -> bool:
+        return a and b
+
+    def negate(self, a: bool) -> bool:
+        # "might match" does not invert into anything definite
+        return True
+
+    def is_null(self, name: str, negate: bool) -> bool:
+        if name in self.keep:
+            return True
+        if name not in self.stats:
+            # Missing from this file: null in every row of a merged scan
+            return not negate
+        nulls = self.stats[name][0]
+        return negate or nulls is None or nulls > 0
+
+    def compare(self, name: str, op: str, token: tuple[str, str]) -> bool:
+        if name in self.keep:
+            return True
+        if name not in self.stats:
+            # Comparisons with null never match
+            return False
+        _, lo, hi = self.stats[name]
+        kind, value = token
+        if kind != "num" or lo is None or hi is None:
+            return True
+        v = float(value)
+        if op in ("==", "="):
+            return lo <= v <= hi
+        if op == "!=":
+            return not (lo == hi == v)
+        if op == "<":
+            return lo < v
+        if op == "<=":
+            return lo <= v
+        if op == ">":
+            return hi > v
+        return hi >= v
+
+
+def filter_columns(text: str) -> list[str]:
+    """Column names a filter expression refers to."""
+    return list(dict.fromkeys(v for k, v in _tokenize(text or "") if k == "ident"))
+
+
+def may_match(text: str, stats: dict[str, tuple], keep: frozenset = frozenset()) -> bool:
+    """
+    False if a file with these column statistics cannot contain a row matching
+    `text`. Columns in `keep` (added by the reader, not in the file) are never
+    used to rule a file out.
+    """
+    tokens = _tokenize(text or "")
+    return _StatsParser(tokens, stats, keep).parse() if tokens else True
+
+
+# ---------- preview ----------
+
+def jsonable(v):
+    if v is None or isinstance(v, (bool, int, str)):
+        return v
+    if isinstance(v, float):
+        return v if math.isfinite(v) else None
+    return str(v)
+
+
+def preview_bronze(path: str, columns: list[str] | None = None, where: str = "",
+                   offset: int = 0, limit: int = PREVIEW_ROWS, location: CompactedLocation | None = None) -> dict:
+    """
+    Schema, row count and one slice of rows of a bronze parquet, read lazily:
+    only the requested columns are decoded, and the filter is pushed into the
+    parquet scan so row groups whose statistics rule it out are skipped.
+    `location` is where compact.py put the file's rows, read if the original is gone.
+    """
+    lf = scan_bronze(path, location)
+    schema = lf.collect_schema()
+    columns = [c for c in (columns or []) if c]
+    unknown = [c for c in columns if c not in schema]
+    if unknown:
+        raise PreviewError(f"Unknown column(s): {', '.join(unknown)}")
+    predicate = parse_filter(where, schema)
+    offset = max(0, offset)
+    limit = max(0, min(limit, MAX_PREVIEW_ROWS))
+
+    # Answered from the footer, no data pages read
+    row_count = lf.select(pl.len()).collect().item()
+    if predicate is not None:
+        lf = lf.filter(predicate)
+        matched = lf.select(pl.len()).collect().item()
+    else:
+        matched = row_count
+    page = lf.select(columns or list(schema)).slice(offset, limit).collect()
+
+    return {
+        "path": str(path),
+        "schema": {name: str(dtype) for name, dtype in schema.items()},
+        "row_count": row_count,
+        "matched_rows": matched,
+        "offset": offset,
+        "limit": limit,
+        "columns": page.columns,
+        "rows": [[jsonable(v) for v in row] for row in page.iter_rows()],
+    }
@@ -0,0 +1,241 @@
+# query.py
+import multiprocessing as mp
+import re
+import time
+from dataclasses import dataclass, field
+import polars as pl
+from export import LABEL_COLUMNS, LabelConflict, merged_frame
+from preview import PreviewError, filter_columns, jsonable, may_match, parse_filter
+
+try:
+    import resource
+except ImportError:  # Windows: no memory cap, the timeout still applies
+    resource = None
+
+QUERY_ROWS = 1000
+MAX_QUERY_ROWS = 10_000
+MAX_QUERY_FILES = 5000
+QUERY_TIMEOUT_SECONDS = 60
+# Address-space cap for the query process; 0 disables it
+QUERY_MEMORY_BYTES = 4 << 30
+
+
+class QueryError(PreviewError):
+    """Bad query (unknown column, filter or aggregation); the message is safe to show to the user."""
+
+
+class QueryLimitExceeded(RuntimeError):
+    """The query ran past its time or memory limit, or selected too many files."""
+
+
+# ---------- aggregations ----------
+#
+#   count()   max(temp)   mean(`Supply V`) as avg_v   n_unique(serial_number)
+
+_AGGS = {
+    "count": lambda c: c.count(),
+    "sum": lambda c: c.sum(),
+    "mean": lambda c: c.mean(),
+    "median": lambda c: c.median(),
+    "std": lambda c: c.std(),
+    "min": lambda c: c.min(),
+    "max": lambda c: c.max(),
+    "first": lambda c: c.first(),
+    "last": lambda c: c.last(),
+    "n_unique": lambda c: c.n_unique(),
+}
+
+_AGG_SPEC = re.compile(
+    r"^\s*(?P<fn>\w+)\s*\(\s*(?:`(?P<bq>[^`]+)`|(?P<col>[^()`]*?))\s*\)\s*(?:as\s+(?P<alias>\w+))?\s*$",
+    re.IGNORECASE,
+)
+
+
+def split_list(text: str) -> list[str]:
+    """Split on commas that are not inside parentheses or `backquotes`: "count(), max(`a,b`)"."""
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, ch in enumerate(text or ""):
+        if ch == "`":
+            quoted = not quoted
+        elif not quoted and ch in "()":
+            depth += 1 if ch == "(" else -1
+        elif not quoted and depth == 0 and ch == ",":
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append((text or "")[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def parse_agg(text: str, schema: pl.Schema) -> pl.Expr:
+    m = _AGG_SPEC.match(text or "")
+    if m is None:
+        raise QueryError(f"Expected an aggregation like max(column), got {text!r}")
+    fn = m["fn"].lower()
+    if fn not in _AGGS:
+        raise QueryError(f"Unknown aggregation {m['fn']!r}; use one of {', '.join(_AGGS)}")
+    name = m["bq"] or m["col"]
+    if fn == "count" and name in ("", "*"):
+        return pl.len().alias(m["alias"] or "count")
+    if name not in schema:
+        raise QueryError(f"Unknown column {name!r}")
+    return _AGGS[fn](pl.col(name)).alias(m["alias"] or f"{fn}_{name}")
+
+
+# ---------- plan ----------
+
+@dataclass
+class QuerySpec:
+    where: str = ""
+    columns: list[str] = field(default_factory=list)  # projection when there are no aggregations
+    group_by: list[str] = field(default_factory=list)
+    aggs: list[str] = field(default_factory=list)
+    sort: list[str] = field(default_factory=list)  # "-col" sorts descending
+    limit: int = QUERY_ROWS
+
+
+def _check_columns(names: list[str], schema: pl.Schema) -> None:
+    unknown = [c for c in names if c not in schema]
+    if unknown:
+        raise QueryError(f"Unknown column(s): {', '.join(unknown)}")
+
+
+def build_plan(sources, spec: QuerySpec, rows: bool = True) -> pl.LazyFrame:
+    """
+    Lazy plan over the merged (path, serial, stand, location) sources. The
+    filter and the columns it needs are pushed down into every parquet scan,
+    so only those columns are decoded and row groups the statistics rule out
+    are skipped. serial_number, test_stand and source_file can be used like
+    any other column. rows=False plans over the sources' schema but none of
+    their rows, for when statistics already ruled every file out.
+    """
+    try:
+        lf = merged_frame(sources)
+    except LabelConflict as e:
+        raise QueryError(str(e)) from None
+    if lf is None:
+        raise QueryError("None of the selected files could be read")
+    schema = lf.collect_schema()
+    if not rows:
+        lf = pl.LazyFrame(schema=schema)
+    _check_columns(spec.columns + spec.group_by + [s.removeprefix("-") for s in spec.sort], schema)
+
+    predicate = parse_filter(spec.where, schema)
+    if predicate is not None:
+        lf = lf.filter(predicate)
+
+    if spec.aggs:
+        aggs = [parse_agg(a, schema) for a in spec.aggs]
+        lf = lf.group_by(spec.group_by).agg(aggs) if spec.group_by else lf.select(aggs)
+    elif spec.group_by:
+        raise QueryError("group_by needs at least one aggregation")
+    else:
+        lf = lf.select(spec.columns or list(schema))
+
+    out = lf.collect_schema()
+    sort = spec.sort or spec.group_by
+    if sort:
+        # Aggregates can be sorted by their alias too, so check against the output
+        _check_columns([s.removeprefix("-") for s in sort], out)
+        lf = lf.sort([s.removeprefix("-") for s in sort], descending=[s.startswith("-") for s in sort])
+    return lf
+
+
+def stats_columns(where: str) -> list[str]:
+    """File columns whose catalog statistics can rule files out for this filter."""
+    return [c for c in filter_columns(where) if c not in LABEL_COLUMNS]
+
+
+def prune_sources(sources, where: str, stats: dict[str, dict[str, tuple]]) -> list:
+    """
+    Drop sources whose column statistics (db.column_stats) show no row can
+    match `where`. Files without statistics are always kept.
+    """
+    if not where or not stats:
+        return list(sources)
+    return [src for src in sources
+            if src[0] not in stats or may_match(where, stats[src[0]], LABEL_COLUMNS)]
+
+
+def execute(sources, spec: QuerySpec, rows: bool = True) -> dict:
+    """Run the query in this process; see run_query for the limited version."""
+    started = time.perf_counter()
+    limit = max(0, min(spec.limit, MAX_QUERY_ROWS))
+    # One extra row says whether the result was cut off
+    df = build_plan(sources, spec, rows).head(limit + 1).collect(engine="streaming")
+    return {
+        "columns": df.columns,
+        "dtypes": [str(t) for t in df.dtypes],
+        "rows": [[jsonable(v) for v in row] for row in df.head(limit).iter_rows()],
+        "truncated": df.height > limit,
+        "files": len(sources) if rows else 0,
+        "elapsed_ms": round((time.perf_counter() - started) * 1e3, 1),
+    }
+
+
+# ---------- limited execution ----------
+
+def _child(conn, sources, spec: QuerySpec, rows: bool, memory_bytes: int) -> None:
+    if resource is not None and memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    try:
+        conn.send(("ok", execute(sources, spec, rows)))
+    except PreviewError as e:
+        conn.send(("bad", str(e)))
+    except MemoryError:
+        conn.send(("limit", f"Query exceeded its {memory_bytes >> 20} MiB memory limit"))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+# forkserver children start from a clean process with polars already imported:
+# no fork of the threaded app process, and no interpreter start-up per query.
+# Each child still re-imports the parent's main module, which is why the app
+# is started from serve.py rather than app.py.
+if "forkserver" in mp.get_all_start_methods():
+    _MP = mp.get_context("forkserver")
+    _MP.set_forkserver_preload(["query"])
+else:
+    _MP = mp.get_context("spawn")
+
+
+def run_query(sources, spec: QuerySpec, timeout: float = QUERY_TIMEOUT_SECONDS,
+              memory_bytes: int = QUERY_MEMORY_BYTES, rows: bool = True) -> dict:
+    """
+    execute() in a child process that is killed after `timeout` seconds and
+    whose address space is capped at `memory_bytes`, so a runaway query
+    cannot stall or exhaust the app. Raises QueryError for bad queries and
+    QueryLimitExceeded when a limit is hit. rows=False: see build_plan.
+    """
+    if len(sources) > MAX_QUERY_FILES:
+        raise QueryLimitExceeded(f"Query selects {len(sources)} files; the limit is {MAX_QUERY_FILES}")
+    recv, send = _MP.Pipe(duplex=False)
+    proc = _MP.Process(target=_child, args=(send, sources, spec, rows, memory_bytes), daemon=True)
+    proc.start()
+    send.close()
+    try:
+        if not recv.poll(timeout):
+            raise QueryLimitExceeded(f"Query took longer than {timeout:g} s and was stopped")
+        try:
+            status, payload = recv.recv()
+        except EOFError:
+            # Allocation failures inside polars abort the process instead of raising
+            proc.join(1)
+            raise QueryLimitExceeded(
+                f"Query process died (exit code {proc.exitcode}); "
+                f"it most likely exceeded its {memory_bytes >> 20} MiB memory limit"
+            ) from None
+    finally:
+        if proc.is_alive():
+            proc.kill()
+        proc.join()
+        recv.close()
+
+    if status == "ok":
+        return payload
+    if status == "bad":
+        raise QueryError(payload)
+    if status == "limit":
+        raise QueryLimitExceeded(payload)
+    raise RuntimeError(payload)
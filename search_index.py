@@ -0,0 +1,292 @@
+# search_index.py
+import heapq
+import threading
+import time
+from array import array
+from typing import Callable, List
+
+# Every substring of length 1..GRAM is a posting key, so short queries are a
+# single dict lookup and longer ones only verify the shortest posting list.
+GRAM = 3
+REFRESH_SECONDS = 30.0
+# Deleted catalog rows never show up in a delta, so reload from scratch this often
+REBUILD_SECONDS = 3600.0
+
+# Rows changed since the last refresh. row_ver is a ROWVERSION on SQL Server,
+# compared as binary so IX_SilverFiles_row_ver can be used. Rows at or past
+# MIN_ACTIVE_ROWVERSION() may belong to transactions that are still open (and
+# lower versions could still commit), so they wait for the next refresh instead
+# of moving the watermark past rows that are not visible yet.
+_DELTA_SQL = {
+    "mssql": """
+        SELECT file_path, serial_number, test_stand, CAST(row_ver AS BIGINT)
+        FROM dbo.SilverFiles
+        WHERE row_ver > CAST(CAST(? AS BIGINT) AS BINARY(8))
+          AND row_ver < MIN_ACTIVE_ROWVERSION()
+        ORDER BY row_ver
+    """,
+    "sqlite": """
+        SELECT file_path, serial_number, test_stand, row_ver
+        FROM dbo.SilverFiles
+        WHERE row_ver > ?
+        ORDER BY row_ver
+    """,
+}
+
+
+class NgramIndex:
+    """
+    Case-insensitive substring index over a growing list of strings.
+    Postings are array('I') of doc ids in insertion order; removed docs are
+    tombstoned and dropped the next time the index is compacted.
+    """
+
+    def __init__(self):
+        self._text: list[str] = []
+        self._alive = bytearray()
+        self._postings: dict[str, array] = {}
+        self.dead = 0
+
+    def __len__(self) -> int:
+        return len(self._text) - self.dead
+
+    def add(self, text: str) -> int:
+        doc = len(self._text)
+        low = text.lower()
+        self._text.append(low)
+        self._alive.append(1)
+        grams = set()
+        for n in range(1, GRAM + 1):
+            for i in range(len(low) - n + 1):
+                grams.add(low[i:i + n])
+        for g in grams:
+            post = self._postings.get(g)
+            if post is None:
+                post = self._postings[g] = array("I")
+            post.append(doc)
+        return doc
+
+    def remove(self, doc: int) -> None:
+        if self._alive[doc]:
+            self._alive[doc] = 0
+            self.dead += 1
+
+    def find(self, query: str):
+        """Yield live doc ids whose text contains `query`."""
+        q = query.lower()
+        if not q:
+            return
+        if len(q) <= GRAM:
+            post = self._postings.get(q)
+            if post is None:
+                return
+            for doc in post:
+                if self._alive[doc]:
+                    yield doc
+            return
+
+        shortest = None
+        for i in range(len(q) - GRAM + 1):
+            post = self._postings.get(q[i:i + GRAM])
+            if post is None:
+                return
+            if shortest is None or len(post) < len(shortest):
+                shortest = post
+        text = self._text
+        for doc in shortest:
+            if self._alive[doc] and q in text[doc]:
+                yield doc
+
+
+class CatalogSearchIndex:
+    """
+    In-process replacement for the LIKE '%q%' scans over dbo.SilverFiles.
+
+    Holds one row per silver file (serial, stand) plus the distinct stands.
+    refresh() pulls only rows whose row_ver moved past the last watermark, so
+    keeping up with ingest costs one small indexed query rather than a rebuild.
+    Deletes are picked up by a full rebuild every rebuild_seconds, or right
+    after a flush-all invalidation (a reconcile may have removed rows).
+    Until the first load finishes the search methods return None and callers
+    fall back to SQL.
+    """
+
+    def __init__(self, connect: Callable, dialect: str = "mssql", refresh_seconds: float = REFRESH_SECONDS,
+                 rebuild_seconds: float = REBUILD_SECONDS):
+        self._connect = connect
+        self.dialect = dialect
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self._lock = threading.RLock()
+        self._refreshing = threading.Lock()
+        self._next_refresh = 0.0
+        self._next_rebuild = time.monotonic() + rebuild_seconds
+        self._subscribers: list[Callable[[], object]] = []
+        self._reset()
+
+    def _reset(self) -> None:
+        self._serials = NgramIndex()
+        self._row_serial: list[str] = []
+        self._row_stand = array("I")
+        self._row_path: list[str] = []
+        self._by_path: dict[str, int] = {}
+
+        self._stand_names: list[str | None] = []
+        self._stand_ids: dict[str | None, int] = {}
+        self._stand_rows = array("I")   # live rows per stand id
+        self._stands = NgramIndex()
+        self._stand_doc: dict[int, int] = {}  # stand id -> doc in self._stands
+
+        self.watermark = 0
+        self.ready = False
+
+    def subscribe(self, fn: Callable[[], object]) -> None:
+        """Call fn() after every refresh that changed the index (e.g. to drop cached search results)."""
+        self._subscribers.append(fn)
+
+    # ---------- maintenance ----------
+    def _stand_id(self, stand: str | None) -> int:
+        sid = self._stand_ids.get(stand)
+        if sid is None:
+            sid = self._stand_ids[stand] = len(self._stand_names)
+            self._stand_names.append(stand)
+            self._stand_rows.append(0)
+        if self._stand_rows[sid] == 0 and stand is not None:
+            self._stand_doc[sid] = self._stands.add(stand)
+        self._stand_rows[sid] += 1
+        return sid
+
+    def _drop_row(self, row: int) -> None:
+        self._serials.remove(row)
+        sid = self._row_stand[row]
+        self._stand_rows[sid] -= 1
+        if self._stand_rows[sid] == 0 and sid in self._stand_doc:
+            self._stands.remove(self._stand_doc.pop(sid))
+
+    def apply(self, rows) -> int:
+        """Apply (file_path, serial_number, test_stand, row_ver) rows; returns rows changed."""
+        changed = 0
+        with self._lock:
+            for file_path, serial, stand, ver in rows:
+                if ver is not None and ver > self.watermark:
+                    self.watermark = ver
+                row = self._by_path.get(file_path)
+                if row is not None:
+                    if self._row_serial[row] == serial and self._stand_names[self._row_stand[row]] == stand:
+                        continue
+                    self._drop_row(row)
+                    del self._by_path[file_path]
+                changed += 1
+                if serial is None:
+                    # LIKE never matches NULL, so there is nothing to index
+                    continue
+                row = self._serials.add(serial)
+                self._row_serial.append(serial)
+                self._row_stand.append(self._stand_id(stand))
+                self._row_path.append(file_path)
+                self._by_path[file_path] = row
+
+            if self._serials.dead > max(1024, len(self._serials)):
+                self._compact()
+        return changed
+
+    def _compact(self) -> None:
+        live = [
+            (self._row_path[r], self._row_serial[r], self._stand_names[self._row_stand[r]], None)
+            for r in self._by_path.values()
+        ]
+        watermark = self.watermark
+        self._reset()
+        self.apply(live)
+        self.watermark = watermark
+        self.ready = True
+
+    def refresh(self) -> int:
+        """Pull catalog changes since the last watermark. Safe to call from any thread."""
+        with self._refreshing:
+            with self._connect() as cn:
+                cur = cn.cursor()
+                rows = cur.execute(_DELTA_SQL[self.dialect], (self.watermark,)).fetchall()
+            changed = self.apply(rows)
+            self.ready = True
+        if changed:
+            print(f"[INDEX] applied {changed} catalog change(s), {len(self._serials)} serial rows")
+            for fn in self._subscribers:
+                try:
+                    fn()
+                except Exception as e:
+                    print(f"[WARN] search index subscriber failed: {e}")
+        return changed
+
+    def rebuild(self) -> int:
+        """Drop everything and reload; the only way deleted catalog rows leave the index."""
+        with self._refreshing:
+            with self._lock:
+                self._reset()
+        self._next_rebuild = time.monotonic() + self.rebuild_seconds
+        return self.refresh()
+
+    def _refresh_in_background(self, rebuild: bool = False) -> None:
+        try:
+            if rebuild:
+                self.rebuild()
+            else:
+                self.refresh()
+        except Exception as e:
+            print(f"[WARN] search index {'rebuild' if rebuild else 'refresh'} failed: {e}")
+
+    def request_refresh(self, serial: str | None = None, stand: str | None = None) -> None:
+        """
+        Refresh now instead of waiting out refresh_seconds (e.g. on an ingest
+        invalidation). A flush-all event (None, None) asks for a full rebuild.
+        """
+        if serial is None and stand is None:
+            self._next_rebuild = 0.0
+        self._next_refresh = 0.0
+        self.maybe_refresh()
+
+    def maybe_refresh(self) -> None:
+        """Kick off a background refresh (or rebuild) once refresh_seconds (rebuild_seconds) have passed."""
+        now = time.monotonic()
+        if now < self._next_refresh or self._refreshing.locked():
+            return
+        self._next_refresh = now + self.refresh_seconds
+        rebuild = now >= self._next_rebuild
+        if rebuild:
+            # Pushed back here so searches in the meantime don't start a second one
+            self._next_rebuild = now + self.rebuild_seconds
+        threading.Thread(target=self._refresh_in_background, args=(rebuild,), daemon=True).start()
+
+    # ---------- queries ----------
+    def search_serials(self, substring: str, limit: int = 50, test_stands: List[str] | None = None) -> List[str] | None:
+        self.maybe_refresh()
+        if not self.ready:
+            return None
+        q = (substring or "").strip()
+        if not q:
+            return []
+        with self._lock:
+            stand_filter = None
+            if test_stands:
+                stand_filter = {self._stand_ids[s] for s in test_stands if s in self._stand_ids}
+                if not stand_filter:
+                    return []
+            hits = (
+                (self._row_serial[r], self._stand_names[self._row_stand[r]] or "")
+                for r in self._serials.find(q)
+                if stand_filter is None or self._row_stand[r] in stand_filter
+            )
+            top = heapq.nsmallest(limit, hits)
+        return [f"{serial} ({stand or None})" for serial, stand in top]
+
+    def search_test_stands(self, substring: str, limit: int = 50) -> List[str] | None:
+        self.maybe_refresh()
+        if not self.ready:
+            return None
+        q = (substring or "").strip()
+        if not q:
+            return []
+        with self._lock:
+            docs = set(self._stands.find(q))
+            names = (name for sid, name in enumerate(self._stand_names) if self._stand_doc.get(sid) in docs)
+            return heapq.nsmallest(limit, names)
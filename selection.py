@@ -0,0 +1,182 @@
+# selection.py
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+# Selections idle longer than this are dropped; a new one is started on the next request
+SELECTION_IDLE_SECONDS = 8 * 3600
+MAX_SELECTIONS = 10_000
+
+
+# Every process start gets a new epoch, and IDs in pages are "<epoch>.<n>".
+# An ID from a page rendered before a restart or redeploy is then recognised
+# as stale, instead of resolving to whatever string now has number n.
+EPOCH = secrets.token_hex(3)
+# Strings kept per table; the least recently rendered are forgotten first
+MAX_INTERNED = 200_000
+
+
+class StaleId(LookupError):
+    """The ID was issued by another process or has been evicted; the page has to be reloaded."""
+
+
+class Interner:
+    """
+    Two-way map between strings (serial labels, bronze paths) and short IDs.
+    Pages carry the IDs, so a toggle request is a few bytes no matter how
+    long the path is. Numbers are never reused; the table is an LRU bounded
+    at `maxsize`, and selections hold the strings, not the IDs.
+    """
+
+    def __init__(self, maxsize: int = MAX_INTERNED, epoch: str = EPOCH):
+        self.maxsize = maxsize
+        self.epoch = epoch
+        self._ids: dict[str, int] = {}
+        self._values: OrderedDict[int, str] = OrderedDict()
+        self._next = 0
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def id(self, value: str) -> str:
+        with self._lock:
+            i = self._ids.get(value)
+            if i is None:
+                i = self._next
+                self._next += 1
+                self._ids[value] = i
+                self._values[i] = value
+                while len(self._values) > self.maxsize:
+                    _, old = self._values.popitem(last=False)
+                    del self._ids[old]
+                    self.evicted += 1
+            else:
+                self._values.move_to_end(i)
+        return f"{self.epoch}.{i}"
+
+    def value(self, key: str) -> str | None:
+        """
+        The string behind an ID from id(). None if it was never issued;
+        raises StaleId if it comes from another process or was evicted.
+        """
+        epoch, _, n = (key or "").partition(".")
+        if not n.isdigit():
+            return None
+        if epoch != self.epoch:
+            raise StaleId(key)
+        i = int(n)
+        with self._lock:
+            value = self._values.get(i)
+            if value is None and i < self._next:
+                raise StaleId(key)
+        return value
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+SERIAL_IDS = Interner()
+FILE_IDS = Interner()
+
+
+def _toggle(d: dict, key) -> bool:
+    """Add or remove key; returns True if it is now present. Insertion order = selection order."""
+    if key in d:
+        del d[key]
+        return False
+    d[key] = None
+    return True
+
+
+@dataclass
+class Selection:
+    token: str
+    # Strings rather than interned IDs, so evicting an ID never drops a selection
+    serials: dict[str, None] = field(default_factory=dict)
+    stands: dict[str, None] = field(default_factory=dict)
+    files: dict[str, None] = field(default_factory=dict)
+    touched: float = field(default_factory=time.monotonic)
+
+    def toggle_serial(self, label: str) -> bool:
+        return _toggle(self.serials, label)
+
+    def toggle_stand(self, stand: str) -> bool:
+        return _toggle(self.stands, stand)
+
+    def toggle_file(self, path: str) -> bool:
+        return _toggle(self.files, path)
+
+    # Most recently selected first, like the old move-to-top lists
+    def serial_labels(self) -> list[str]:
+        return list(reversed(self.serials))
+
+    def stand_names(self) -> list[str]:
+        return list(reversed(self.stands))
+
+    def file_paths(self) -> list[str]:
+        return list(reversed(self.files))
+
+
+class SelectionStore:
+    """
+    Per-browser selection state, keyed by a random token kept in the session
+    cookie. Lives in process memory, so the app must run as a single worker
+    process (as app.py's uvicorn.run does).
+    """
+
+    def __init__(self, maxsize: int = MAX_SELECTIONS, idle_seconds: float = SELECTION_IDLE_SECONDS):
+        self.maxsize = maxsize
+        self.idle_seconds = idle_seconds
+        self._data: OrderedDict[str, Selection] = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, token: str | None) -> Selection | None:
+        if not token:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            sel = self._data.get(token)
+            if sel is None:
+                return None
+            if now - sel.touched > self.idle_seconds:
+                del self._data[token]
+                self.expired += 1
+                return None
+            sel.touched = now
+            self._data.move_to_end(token)
+            return sel
+
+    def create(self) -> Selection:
+        sel = Selection(secrets.token_urlsafe(16))
+        with self._lock:
+            self._data[sel.token] = sel
+            self.created += 1
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evicted += 1
+        return sel
+
+    def get_or_create(self, token: str | None) -> Selection:
+        return self.get(token) or self.create()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "active": len(self._data),
+                "maxsize": self.maxsize,
+                "idle_seconds": self.idle_seconds,
+                "created": self.created,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "epoch": EPOCH,
+                "serial_ids": len(SERIAL_IDS),
+                "file_ids": len(FILE_IDS),
+                "ids_evicted": SERIAL_IDS.evicted + FILE_IDS.evicted,
+            }
+
+
+SELECTIONS = SelectionStore()
@@ -0,0 +1,17 @@
+# serve.py
+# Starts the web app. Kept apart from app.py on purpose: multiprocessing
+# re-imports the main module in every worker it starts (the query processes,
+# see query.py), and this file costs nothing to import while app.py builds the
+# whole app.
+import uvicorn
+
+HOST = "0.0.0.0"
+PORT = 8000
+
+
+def main():
+    uvicorn.run("app:app", host=HOST, port=PORT, reload=False)
+
+
+if __name__ == "__main__":
+    main()
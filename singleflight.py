@@ -0,0 +1,98 @@
+# singleflight.py
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
+
+class Superseded(Exception):
+    """The request's work was cancelled because the same client sent a newer one."""
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: the first caller for a key runs it,
+    later callers with the same key await the same result. The shared call is
+    cancelled only when every caller waiting on it has been cancelled.
+    stats()["shared"] is the number of calls saved.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._inflight: dict[Hashable, list] = {}  # key -> [task, waiters]
+        self.calls = 0
+        self.shared = 0
+        self.cancelled = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        entry = self._inflight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(fn())
+            entry = self._inflight[key] = [task, 0]
+            task.add_done_callback(lambda _t, k=key, e=entry: self._forget(k, e))
+            self.calls += 1
+        else:
+            self.shared += 1
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            if entry[1] == 1 and not entry[0].done():
+                entry[0].cancel()
+                # Unlist it now so a new caller doesn't join a call that is being cancelled
+                self._forget(key, entry)
+                self.cancelled += 1
+            raise
+        finally:
+            entry[1] -= 1
+
+    def _forget(self, key, entry) -> None:
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "calls": self.calls,
+            "shared": self.shared,
+            "cancelled": self.cancelled,
+        }
+
+
+class LatestOnly:
+    """
+    Keeps one piece of work per key (e.g. per client and search box). Starting
+    new work for a key cancels the older one, whose caller gets Superseded.
+    """
+
+    def __init__(self, name: str = "latest"):
+        self.name = name
+        self._current: dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.superseded = 0
+
+    async def run(self, key: Hashable, coro: Awaitable):
+        prev = self._current.get(key)
+        if prev is not None and not prev.done():
+            prev.cancel()
+            self.superseded += 1
+        task = asyncio.ensure_future(coro)
+        self._current[key] = task
+        self.started += 1
+        try:
+            # wait() rather than await: cancelling `task` must not look like our own cancellation
+            await asyncio.wait({task})
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            if self._current.get(key) is task:
+                del self._current[key]
+        if task.cancelled():
+            raise Superseded(key)
+        return task.result()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._current),
+            "started": self.started,
+            "superseded": self.superseded,
+        }
@@ -2,6 +2,8 @@ import sys
 import time
 import os
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import pyarrow.parquet as pq
@@ -14,11 +16,186 @@ DATABASE = "database_here"
 watch_dirs = ["list_of_dirs_to_watch_here"
              ]
 
+# A file is copied once it has had no events for this long
+QUIET_SECONDS = 2.0
+COPY_WORKERS = 4
+COPY_ATTEMPTS = 6
+RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 30.0
+STATS_EVERY = 60
+
+
+def _discard(part: str) -> None:
+    try:
+        os.remove(part)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"    [WARN] Could not remove partial copy {part}: {e}")
+
+
+class CopyPipeline:
+    """
+    Debounced, batched file copies for the mirror.
+
+    submit() only records the event and returns, so the observer thread never
+    waits on I/O. Events for the same path are merged until the file has been
+    quiet for `quiet_seconds`, then a scheduler thread hands it to a pool of
+    `workers` copy threads. A file still being written (locked, or changed
+    while copying) is retried with exponential backoff instead of sleeping a
+    worker. Each copy goes to a .part file and is renamed into place, so
+    `on_ready(src, dest)` only ever sees complete files.
+    """
+
+    def __init__(self, quiet_seconds: float = QUIET_SECONDS, workers: int = COPY_WORKERS,
+                 max_attempts: int = COPY_ATTEMPTS, on_ready=None):
+        self.quiet_seconds = quiet_seconds
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.on_ready = on_ready
+        self._pending: dict[str, list] = {}  # src -> [dest, due, attempt]
+        self._copying: set[str] = set()
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mirror-copy")
+        self._closed = False
+        self.events = 0
+        self.coalesced = 0
+        self.copies = 0
+        self.retries = 0
+        self.failed = 0
+        self.dropped = 0
+        self._scheduler = threading.Thread(target=self._schedule, name="mirror-scheduler", daemon=True)
+        self._scheduler.start()
+
+    def submit(self, src: str, dest: str) -> None:
+        with self._cond:
+            self.events += 1
+            entry = self._pending.get(src)
+            if entry is not None:
+                # Another write to a file already waiting: one copy covers both
+                self.coalesced += 1
+                entry[0] = dest
+                entry[1] = time.monotonic() + self.quiet_seconds
+            else:
+                self._pending[src] = [dest, time.monotonic() + self.quiet_seconds, 1]
+            self._cond.notify()
+
+    def discard(self, src: str) -> None:
+        """Forget a pending copy (the source was deleted or moved away)."""
+        with self._cond:
+            if self._pending.pop(src, None) is not None:
+                self.dropped += 1
+
+    def _schedule(self) -> None:
+        with self._cond:
+            while not (self._closed and not self._pending and not self._copying):
+                now = time.monotonic()
+                # A path being copied waits for that copy to finish (_finish wakes us)
+                waiting = sorted((at, src) for src, (_, at, _) in self._pending.items()
+                                 if src not in self._copying)
+                timeout = None
+                for at, src in waiting:
+                    if len(self._copying) >= self.workers:
+                        break
+                    if at > now:
+                        timeout = at - now
+                        break
+                    dest, _, attempt = self._pending.pop(src)
+                    self._copying.add(src)
+                    self._pool.submit(self._copy, src, dest, attempt)
+                self._cond.wait(timeout)
+
+    def _copy(self, src: str, dest: str, attempt: int) -> None:
+        part = dest + ".part"
+        try:
+            before = os.stat(src)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.copy2(src, part)
+            after = os.stat(src)
+            if (before.st_size, before.st_mtime_ns) != (after.st_size, after.st_mtime_ns):
+                os.remove(part)
+                raise BlockingIOError("source changed while copying")
+            os.replace(part, dest)
+        except FileNotFoundError:
+            # Deleted or renamed before it settled; a move event submits the new path
+            _discard(part)
+            with self._cond:
+                self.dropped += 1
+            self._finish(src)
+            return
+        except OSError as e:
+            # A partial copy must not stay in the staging tree if no retry ever succeeds
+            _discard(part)
+            self._retry(src, dest, attempt, e)
+            return
+        except Exception as e:
+            _discard(part)
+            print(f"    [ERROR] Failed to copy {src} -> {dest}: {e}")
+            with self._cond:
+                self.failed += 1
+            self._finish(src)
+            return
+
+        with self._cond:
+            self.copies += 1
+        print(f"    Copied to: {dest}")
+        self._finish(src)
+        if self.on_ready is not None:
+            try:
+                self.on_ready(src, dest)
+            except Exception as e:
+                print(f"    [WARN] on_ready failed for {dest}: {e}")
+
+    def _retry(self, src: str, dest: str, attempt: int, error: Exception) -> None:
+        with self._cond:
+            if attempt >= self.max_attempts:
+                self.failed += 1
+                print(f"    [ERROR] Failed to copy {src} -> {dest} after {attempt} attempts: {error}")
+            elif src not in self._pending:
+                # Locked by the writer (WinError 32) or still growing: back off without holding a worker
+                delay = min(RETRY_DELAY * 2 ** (attempt - 1), MAX_RETRY_DELAY)
+                self.retries += 1
+                print(f"    [WARN] {src} not ready ({error}), retrying in {delay:.1f}s "
+                      f"({attempt}/{self.max_attempts})...")
+                self._pending[src] = [dest, time.monotonic() + delay, attempt + 1]
+            # else: a newer event already re-queued it with a fresh quiet period
+        self._finish(src)
+
+    def _finish(self, src: str) -> None:
+        with self._cond:
+            self._copying.discard(src)
+            self._cond.notify()
+
+    def close(self) -> None:
+        """Copy what is still pending without waiting out the quiet period, then stop."""
+        with self._cond:
+            self._closed = True
+            for entry in self._pending.values():
+                entry[1] = 0.0
+            self._cond.notify()
+        self._scheduler.join()
+        self._pool.shutdown()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "queued": len(self._pending),
+                "copying": len(self._copying),
+                "events": self.events,
+                "copies": self.copies,
+                "copies_saved": self.coalesced,
+                "retries": self.retries,
+                "failed": self.failed,
+                "dropped": self.dropped,
+            }
+
+
 class MirrorEventHandler(FileSystemEventHandler):
-    def __init__(self, src_root: str, dest_root: str):
+    def __init__(self, src_root: str, dest_root: str, pipeline: CopyPipeline | None = None):
         super().__init__()
         self.src_root = os.path.abspath(src_root)
         self.dest_root = os.path.abspath(dest_root)
+        self.pipeline = pipeline or CopyPipeline()
 
     def _relative_dest_path(self, src_path: str) -> str:
         rel = os.path.relpath(src_path, self.src_root)
@@ -33,35 +210,8 @@ class MirrorEventHandler(FileSystemEventHandler):
         return "unknown_test_stand"
 
     def _copy_file(self, src_path: str):
-        dest_path = self._relative_dest_path(src_path)
-        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-
-        max_attempts = 5
-        delay = 0.2  
-
-        for attempt in range(1, max_attempts + 1):
-            try:
-                shutil.copy2(src_path, dest_path)
-                print(f"    Copied to: {dest_path}")
-                return  
-            except PermissionError as e:
-                winerr = getattr(e, "winerror", None)
-                if winerr == 32 and attempt < max_attempts:
-                    print(
-                        f"    [WARN] {src_path} is in use (WinError 32), "
-                        f"retrying {attempt}/{max_attempts}..."
-                    )
-                    time.sleep(delay)
-                    continue
-                else:
-                    print(
-                        f"    [ERROR] Failed to copy {src_path} -> {dest_path} "
-                        f"after {attempt} attempts: {e}"
-                    )
-                    return
-            except Exception as e:
-                print(f"    [ERROR] Failed to copy {src_path} -> {dest_path}: {e}")
-                return
+        # Queued, not copied here: the observer thread must keep draining events
+        self.pipeline.submit(src_path, self._relative_dest_path(src_path))
 
 
     def _ensure_dir(self, src_path: str):
@@ -100,6 +250,7 @@ class MirrorEventHandler(FileSystemEventHandler):
                     print(f"    [ERROR] Failed to delete directory {dest_path}: {e}")
         else:
             print(f"[FILE DELETED] {event.src_path}")
+            self.pipeline.discard(event.src_path)
             if os.path.isfile(dest_path):
                 try:
                     os.remove(dest_path)
@@ -115,6 +266,7 @@ class MirrorEventHandler(FileSystemEventHandler):
             print(f"[DIR MOVED]   {event.src_path} -> {event.dest_path}")
         else:
             print(f"[FILE MOVED]  {event.src_path} -> {event.dest_path}")
+            self.pipeline.discard(event.src_path)
 
         os.makedirs(os.path.dirname(new_dest), exist_ok=True)
 
@@ -136,14 +288,16 @@ def copy_file(src_path: str, dest_root: str, src_root: str):
     os.makedirs(os.path.dirname(dest_path), exist_ok=True)
     shutil.copy2(src_path, dest_path)
 
-def main(src_dirs, dest_dir: str):
+def main(src_dirs, dest_dir: str, on_ready=None):
     observer = Observer()
+    # One copy queue and worker pool shared by every watched directory
+    pipeline = CopyPipeline(on_ready=on_ready)
 
     if isinstance(src_dirs, str):
         src_dirs = [src_dirs]
 
     for src in src_dirs:
-        handler = MirrorEventHandler(src, dest_dir)
+        handler = MirrorEventHandler(src, dest_dir, pipeline)
         observer.schedule(handler, path=src, recursive=True)
         print(f"Watching: {os.path.abspath(src)}")
 
@@ -152,12 +306,25 @@ def main(src_dirs, dest_dir: str):
 
     observer.start()
     try:
+        ticks = 0
         while True:
             time.sleep(1)
+            ticks += 1
+            if ticks % STATS_EVERY == 0:
+                print(f"[OK] mirror: {pipeline.stats()}")
     except KeyboardInterrupt:
         print("\nStopping watcher...")
         observer.stop()
     observer.join()
+    pipeline.close()
+    print(f"[OK] mirror: {pipeline.stats()}")
 
 if __name__ == "__main__":
-    main(watch_dirs, destination)
\ No newline at end of file
+    args = sys.argv[1:]
+    on_ready = None
+    if "--queue-file" in args and args.index("--queue-file") + 1 < len(args):
+        # Tell a separate staging consumer (ingest_staging_dir.py --follow) about each finished copy
+        from ingest_staging_dir import append_ready_event
+        queue_file = args[args.index("--queue-file") + 1]
+        on_ready = lambda src, dest: append_ready_event(queue_file, dest)
+    main(watch_dirs, destination, on_ready=on_ready)
\ No newline at end of file